@@ -0,0 +1,222 @@
+"""
+Analítica global precalculada
+Tablas de rollup (marco ético por dilema, por categoría y ranking de jugadores) que se
+refrescan de forma incremental a partir de las decisiones nuevas, para que los
+endpoints globales no recorran toda la tabla decisions en cada petición.
+
+Uso como tarea programada (cron):
+    python analytics.py
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+ROLLUP_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS rollup_dilemma_frameworks (
+        dilemma_id INTEGER NOT NULL,
+        ethical_framework TEXT NOT NULL,
+        decisions INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (dilemma_id, ethical_framework)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS rollup_category_frameworks (
+        dilemma_category TEXT NOT NULL,
+        ethical_framework TEXT NOT NULL,
+        decisions INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (dilemma_category, ethical_framework)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS rollup_player_decisions (
+        player_name TEXT PRIMARY KEY,
+        decisions INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_rollup_player_decisions ON rollup_player_decisions (decisions DESC)',
+    # Marca de agua por fuente (shard): última decisión ya agregada
+    '''
+    CREATE TABLE IF NOT EXISTS rollup_state (
+        source INTEGER PRIMARY KEY,
+        last_decision_id INTEGER NOT NULL DEFAULT 0,
+        refreshed_at TEXT
+    )
+    ''',
+]
+
+
+def init_rollups(repository):
+    """Crea las tablas de rollup junto a los logs y la cache de dilemas"""
+    with repository.logs() as conn:
+        cursor = conn.cursor()
+        for statement in ROLLUP_TABLES:
+            repository.execute(cursor, statement)
+        for index in range(repository.source_count()):
+            repository.execute(cursor, '''
+                INSERT INTO rollup_state (source, last_decision_id) VALUES (?, 0)
+                ON CONFLICT (source) DO NOTHING
+            ''', (index,))
+
+
+def _read_deltas(repository, index, since_id):
+    """Agrega las decisiones de una fuente con id > since_id; devuelve (hasta_id, deltas)"""
+    with repository.source(index) as conn:
+        cursor = conn.cursor()
+        upper_id = repository.execute(cursor, 'SELECT MAX(id) FROM decisions').fetchone()[0] or 0
+        if upper_id <= since_id:
+            return since_id, None
+        bounds = (since_id, upper_id)
+        by_dilemma = repository.execute(cursor, '''
+            SELECT dilemma_id, ethical_framework, COUNT(*) FROM decisions
+            WHERE id > ? AND id <= ? AND ethical_framework IS NOT NULL
+            GROUP BY dilemma_id, ethical_framework
+        ''', bounds).fetchall()
+        by_category = repository.execute(cursor, '''
+            SELECT COALESCE(dilemma_category, 'general'), ethical_framework, COUNT(*) FROM decisions
+            WHERE id > ? AND id <= ? AND ethical_framework IS NOT NULL
+            GROUP BY COALESCE(dilemma_category, 'general'), ethical_framework
+        ''', bounds).fetchall()
+        by_player = repository.execute(cursor, '''
+            SELECT g.player_name, COUNT(*) FROM decisions d
+            JOIN games g ON d.game_id = g.id
+            WHERE d.id > ? AND d.id <= ?
+            GROUP BY g.player_name
+        ''', bounds).fetchall()
+    return upper_id, (by_dilemma, by_category, by_player)
+
+
+def refresh_rollups(repository):
+    """Suma a los rollups las decisiones nuevas de cada fuente. Devuelve las filas agregadas.
+
+    La marca de agua se avanza con compare-and-set en la misma transacción que los
+    UPSERT, así dos refrescos simultáneos (varios workers) nunca cuentan dos veces.
+    En SQLite los ids se confirman en orden (un único escritor); en PostgreSQL una
+    transacción aún abierta con id menor que la marca quedaría fuera del rollup.
+    """
+    aggregated = 0
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    for index in range(repository.source_count()):
+        with repository.logs() as conn:
+            row = repository.execute(conn.cursor(), 'SELECT last_decision_id FROM rollup_state WHERE source = ?',
+                                     (index,)).fetchone()
+        since_id = row[0] if row else 0
+
+        upper_id, deltas = _read_deltas(repository, index, since_id)
+
+        with repository.logs() as conn:
+            cursor = conn.cursor()
+            repository.execute(cursor, '''
+                UPDATE rollup_state SET last_decision_id = ?, refreshed_at = ?
+                WHERE source = ? AND last_decision_id = ?
+            ''', (upper_id, now, index, since_id))
+            if cursor.rowcount != 1 or deltas is None:
+                continue
+
+            by_dilemma, by_category, by_player = deltas
+            for dilemma_id, framework, count in by_dilemma:
+                repository.execute(cursor, '''
+                    INSERT INTO rollup_dilemma_frameworks (dilemma_id, ethical_framework, decisions)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT (dilemma_id, ethical_framework)
+                    DO UPDATE SET decisions = rollup_dilemma_frameworks.decisions + excluded.decisions
+                ''', (dilemma_id, framework, count))
+            for category, framework, count in by_category:
+                repository.execute(cursor, '''
+                    INSERT INTO rollup_category_frameworks (dilemma_category, ethical_framework, decisions)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT (dilemma_category, ethical_framework)
+                    DO UPDATE SET decisions = rollup_category_frameworks.decisions + excluded.decisions
+                ''', (category, framework, count))
+            for player_name, count in by_player:
+                repository.execute(cursor, '''
+                    INSERT INTO rollup_player_decisions (player_name, decisions)
+                    VALUES (?, ?)
+                    ON CONFLICT (player_name)
+                    DO UPDATE SET decisions = rollup_player_decisions.decisions + excluded.decisions
+                ''', (player_name, count))
+            aggregated += sum(count for _, count in by_player)
+    return aggregated
+
+
+def get_refreshed_at(cursor, repository):
+    """Momento del refresco más antiguo entre fuentes (frescura garantizada de los datos)"""
+    return repository.execute(cursor, 'SELECT MIN(refreshed_at) FROM rollup_state').fetchone()[0]
+
+
+def get_dilemma_frameworks(repository):
+    """Distribución de marcos por dilema y marco más elegido en cada uno"""
+    with repository.logs() as conn:
+        cursor = conn.cursor()
+        rows = repository.execute(cursor, '''
+            SELECT dilemma_id, ethical_framework, decisions FROM rollup_dilemma_frameworks
+            ORDER BY dilemma_id, decisions DESC, ethical_framework
+        ''').fetchall()
+        refreshed_at = get_refreshed_at(cursor, repository)
+
+    dilemmas = {}
+    for dilemma_id, framework, count in rows:
+        entry = dilemmas.setdefault(dilemma_id, {
+            'dilemma_id': dilemma_id,
+            'top_framework': framework,
+            'total': 0,
+            'frameworks': {}
+        })
+        entry['frameworks'][framework] = count
+        entry['total'] += count
+    return {'dilemmas': list(dilemmas.values()), 'refreshed_at': refreshed_at}
+
+
+def get_category_frameworks(repository):
+    """Distribución de marcos éticos por categoría"""
+    with repository.logs() as conn:
+        cursor = conn.cursor()
+        rows = repository.execute(cursor, '''
+            SELECT dilemma_category, ethical_framework, decisions FROM rollup_category_frameworks
+        ''').fetchall()
+        refreshed_at = get_refreshed_at(cursor, repository)
+
+    categories = {}
+    for category, framework, count in rows:
+        categories.setdefault(category, {})[framework] = count
+    return {'categories': categories, 'refreshed_at': refreshed_at}
+
+
+def get_leaderboard(repository, limit=10):
+    """Jugadores con más decisiones (el índice por decisions solo lee `limit` filas)"""
+    with repository.logs() as conn:
+        cursor = conn.cursor()
+        rows = repository.execute(cursor, '''
+            SELECT player_name, decisions FROM rollup_player_decisions
+            ORDER BY decisions DESC LIMIT ?
+        ''', (limit,)).fetchall()
+        refreshed_at = get_refreshed_at(cursor, repository)
+
+    return {
+        'players': [{'player_name': name, 'decisions': count} for name, count in rows],
+        'refreshed_at': refreshed_at
+    }
+
+
+def start_refresher(repository, interval):
+    """Refresca los rollups cada `interval` segundos en un hilo daemon"""
+    def _loop():
+        while True:
+            try:
+                refresh_rollups(repository)
+            except Exception as e:
+                print(f"⚠️ Error refrescando rollups de analítica: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=_loop, name='analytics-refresher', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    from app import repository
+
+    init_rollups(repository)
+    start = time.perf_counter()
+    rows = refresh_rollups(repository)
+    print(f"[OK] {rows} decisiones agregadas en {time.perf_counter() - start:.3f}s")
@@ -1,12 +1,35 @@
 import os
+import atexit
 import json
+import hashlib
+import functools
 import sqlite3
 import random
 import tempfile
+import threading
+import time
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, has_request_context, redirect, render_template, request, jsonify, send_file, stream_with_context
 from dotenv import load_dotenv
-import google.generativeai as genai
+from storage import SCHEMA_VERSION, SQLiteRepository, PostgresRepository
+import analytics
+import bandit
+import caching
+import compression
+import dilemma_index
+import dilemma_schema
+import export_data
+import group_commit
+import hedging
+import idempotency
+import image_proxy
+import jobs
+import maintenance
+import query_profiler
+import rate_limit
+import serving_policy
+import sessions
+import warm_analyses
 
 load_dotenv()
 
@@ -29,9 +52,423 @@ def _determine_database_path():
 DATABASE = _determine_database_path()
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY', '')
 
-# Configurar Gemini 
-if GOOGLE_API_KEY:
-    genai.configure(api_key=GOOGLE_API_KEY)
+# ==================== SISTEMA DE ALMACENAMIENTO ====================
+# STORAGE_BACKEND=sqlite (por defecto) o postgres (DATABASE_URL, pool PG_POOL_MIN/PG_POOL_MAX).
+# Con SQLite, STORAGE_MODE=sharded reparte logs/cache y datos de juego en varios archivos
+# junto a DATABASE (ver storage.SQLiteRepository).
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite').lower()
+STORAGE_MODE = os.getenv('STORAGE_MODE', 'single').lower()
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '4'))
+
+if STORAGE_BACKEND == 'postgres':
+    repository = PostgresRepository(
+        os.getenv('DATABASE_URL', ''),
+        min_connections=int(os.getenv('PG_POOL_MIN', '1')),
+        max_connections=int(os.getenv('PG_POOL_MAX', '10'))
+    )
+else:
+    repository = SQLiteRepository(DATABASE, mode=STORAGE_MODE, shard_count=SHARD_COUNT)
+
+# Perfilado de consultas SQLite por endpoint (opt-in, ver query_profiler.py)
+QUERY_PROFILE = os.getenv('QUERY_PROFILE', '0') == '1' and STORAGE_BACKEND != 'postgres'
+if QUERY_PROFILE:
+    repository.connection_factory = query_profiler.ProfiledConnection
+    query_profiler.profiler.slow_ms = float(os.getenv('QUERY_PROFILE_SLOW_MS', '50'))
+
+# Intervalo de refresco de los rollups de analítica global (0 = solo vía `python analytics.py`)
+ANALYTICS_REFRESH_SECONDS = int(os.getenv('ANALYTICS_REFRESH_SECONDS', '60'))
+
+# Intervalo del mantenimiento de logs y cache (retención, compactación y vacuum; 0 = solo vía `python maintenance.py`)
+MAINTENANCE_INTERVAL_SECONDS = int(os.getenv('MAINTENANCE_INTERVAL_SECONDS', '3600'))
+
+# Cierre de partidas abandonadas (sin end_game): sin actividad en GAME_IDLE_MINUTES, revisadas
+# cada GAME_REAPER_INTERVAL_SECONDS (0 = solo vía `python maintenance.py --reap-games`)
+GAME_IDLE_MINUTES = int(os.getenv('GAME_IDLE_MINUTES', '30'))
+GAME_REAPER_INTERVAL_SECONDS = int(os.getenv('GAME_REAPER_INTERVAL_SECONDS', '300'))
+
+# ==================== FIN SISTEMA DE ALMACENAMIENTO ====================
+
+# ==================== SESIONES DE PARTIDA ====================
+# GAME_SESSIONS=memory guarda por partida el jugador y los recuentos por marco y categoría
+# (sessions.py): make_decision, el limitador de IA y get_stats dejan de leer `games` en
+# cada petición. Las escrituras siguen yendo a la base; las sesiones caducan tras
+# GAME_SESSION_TTL_SECONDS sin uso y se recargan de la base si faltan.
+
+GAME_SESSIONS = os.getenv('GAME_SESSIONS', 'off').lower()
+
+game_sessions = sessions.GameSessionStore(
+    repository,
+    ttl_seconds=int(os.getenv('GAME_SESSION_TTL_SECONDS', '1800')),
+    max_sessions=int(os.getenv('GAME_SESSION_MAX', '100000'))
+) if GAME_SESSIONS == 'memory' else None
+
+def game_player(game_id):
+    """Jugador de una partida (desde la sesión si está activada) o None"""
+    if not game_id:
+        return None
+    if game_sessions is not None:
+        return game_sessions.player_name(game_id)
+    return repository.get_game_player(game_id)
+
+@app.route('/api/session_stats', methods=['GET'])
+def session_stats():
+    """Aciertos, fallos y recargas de las sesiones de partida"""
+    if game_sessions is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(game_sessions.stats(), enabled=True))
+
+# ==================== FIN SESIONES DE PARTIDA ====================
+
+# ==================== ESCRITURA AGRUPADA DE DECISIONES ====================
+# DECISION_WRITE_MODE=group encola las decisiones para un hilo escritor que las confirma
+# en grupos (group_commit.py): un commit/fsync cada GROUP_COMMIT_MAX_DELAY_MS o cada
+# GROUP_COMMIT_MAX_ROWS decisiones. make_decision responde cuando su grupo es durable;
+# si el escritor no la toma en GROUP_COMMIT_TIMEOUT_SECONDS se guarda directamente.
+
+DECISION_WRITE_MODE = os.getenv('DECISION_WRITE_MODE', 'direct').lower()
+
+decision_writer = group_commit.GroupCommitWriter(
+    repository,
+    max_delay_ms=float(os.getenv('GROUP_COMMIT_MAX_DELAY_MS', '5')),
+    max_rows=int(os.getenv('GROUP_COMMIT_MAX_ROWS', '64')),
+    timeout=float(os.getenv('GROUP_COMMIT_TIMEOUT_SECONDS', '5'))
+) if DECISION_WRITE_MODE == 'group' else None
+
+def record_decision(game_id, dilemma_id, dilemma_text, dilemma_category, chosen_option, ethical_framework, analysis):
+    """Guarda una decisión (directa o agrupada) y devuelve el jugador de la partida"""
+    decision = (game_id, dilemma_id, dilemma_text, dilemma_category, chosen_option, ethical_framework, analysis)
+    player_name = game_player(game_id) if game_sessions is not None else None
+    if decision_writer is not None:
+        player_name = decision_writer.record_decision(*decision)
+    elif player_name:
+        repository.record_decision(*decision, fetch_player=False)
+    else:
+        player_name = repository.record_decision(*decision)
+    if game_sessions is not None:
+        game_sessions.record(game_id, ethical_framework, dilemma_category)
+    if selection_coverage is not None and player_name:
+        selection_coverage.record(player_name, ethical_framework, dilemma_category)
+    return player_name
+
+@app.route('/api/group_commit_stats', methods=['GET'])
+def group_commit_stats():
+    """Grupos confirmados por el escritor de decisiones y su tamaño medio"""
+    if decision_writer is None:
+        return jsonify({'mode': 'direct'})
+    return jsonify(dict(decision_writer.stats(), mode='group'))
+
+# ==================== FIN ESCRITURA AGRUPADA DE DECISIONES ====================
+
+# ==================== IDEMPOTENCIA ====================
+# Con la cabecera Idempotency-Key, un reintento de start_game o make_decision devuelve la
+# respuesta guardada (idempotency.py) en vez de repetir el análisis con IA y las escrituras.
+# IDEMPOTENCY_TTL_SECONDS=0 desactiva la cabecera.
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+
+idempotency_store = idempotency.IdempotencyStore(
+    repository,
+    ttl_seconds=IDEMPOTENCY_TTL_SECONDS,
+    wait_seconds=float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '10'))
+) if IDEMPOTENCY_TTL_SECONDS > 0 else None
+
+def idempotent(view):
+    """Decorador de rutas POST: respuesta guardada por (endpoint, Idempotency-Key)"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        header = request.headers.get('Idempotency-Key', '').strip()
+        if idempotency_store is None or not header:
+            return view(*args, **kwargs)
+        if len(header) > 200:
+            return jsonify({'status': 'error', 'message': 'Idempotency-Key demasiado larga'}), 400
+        key = f'{request.endpoint}:{header}'
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        try:
+            state, status, body = idempotency_store.begin(key, fingerprint)
+        except Exception as e:
+            # La idempotencia nunca debe tumbar el juego: se procesa la petición sin ella
+            print(f"⚠️ Error en las claves de idempotencia: {e}")
+            return view(*args, **kwargs)
+        if state == idempotency.REPLAY:
+            response = app.response_class(body, status=status, mimetype='application/json')
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        if state == idempotency.MISMATCH:
+            return jsonify({'status': 'error', 'message': 'Idempotency-Key reutilizada con otra petición'}), 422
+        if state == idempotency.PENDING:
+            return jsonify({'status': 'error', 'message': 'La petición original aún se está procesando'}), 409
+
+        try:
+            response = app.make_response(view(*args, **kwargs))
+        except Exception:
+            idempotency_store.release(key)
+            raise
+        try:
+            if response.status_code < 500 and response.is_json:
+                idempotency_store.complete(key, response.status_code, response.get_data(as_text=True))
+            else:
+                idempotency_store.release(key)
+        except Exception as e:
+            print(f"⚠️ Error guardando la respuesta idempotente: {e}")
+        return response
+    return wrapper
+
+@app.route('/api/idempotency_stats', methods=['GET'])
+def idempotency_stats():
+    """Claves nuevas, repetidas, en curso y reutilizadas con otro cuerpo"""
+    if idempotency_store is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(idempotency_store.stats(), enabled=True))
+
+# ==================== FIN IDEMPOTENCIA ====================
+
+# ==================== SISTEMA DE CACHE ====================
+# CACHE_MODE=lru (por proceso), shared (segmento mmap común a los workers de la máquina)
+# o redis (REDIS_URL, común a todas las máquinas). Ver caching.py.
+
+CACHE_MODE = os.getenv('CACHE_MODE', 'lru').lower()
+CACHE_ANALYSIS_TTL = int(os.getenv('CACHE_ANALYSIS_TTL', '86400'))
+
+cache = caching.create_cache(
+    CACHE_MODE,
+    max_entries=int(os.getenv('CACHE_MAX_ENTRIES', '1024')),
+    # Un segmento por base de datos: dos instancias en la misma máquina no se mezclan
+    shared_path=os.getenv('CACHE_SHARED_PATH') or caching.default_shared_path(
+        'ethical_cache_' + hashlib.sha1(DATABASE.encode('utf-8')).hexdigest()[:8]),
+    shared_size_mb=int(os.getenv('CACHE_SHARED_SIZE_MB', '16')),
+    redis_url=os.getenv('REDIS_URL')
+)
+
+@app.route('/api/cache_stats', methods=['GET'])
+def cache_stats():
+    """Métricas de la cache (hits, misses, evictions...)"""
+    try:
+        return jsonify(cache.stats())
+    except Exception as e:
+        print(f"❌ Error obteniendo métricas de cache: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# ==================== FIN SISTEMA DE CACHE ====================
+
+# ==================== LÍMITE DE PETICIONES A LA IA ====================
+# Token bucket por jugador, por IP y global (rate_limit.py). Sin presupuesto, get_dilemma
+# sirve un dilema IA ya cacheado o uno predefinido y make_decision solo usa análisis en cache.
+# AI_RATE_LIMIT_MODE=memory (por proceso), sqlite (común a los workers) u off.
+
+AI_RATE_LIMIT_MODE = os.getenv('AI_RATE_LIMIT_MODE', 'memory').lower()
+
+if AI_RATE_LIMIT_MODE == 'off':
+    ai_admission = None
+else:
+    ai_admission = rate_limit.AdmissionControl(
+        rate_limit.create_buckets(
+            AI_RATE_LIMIT_MODE,
+            os.getenv('AI_RATE_LIMIT_PATH') or os.path.splitext(DATABASE)[0] + '_ratelimit.db'
+        ),
+        {
+            'player': (float(os.getenv('AI_LIMIT_PLAYER_PER_MIN', '6')), int(os.getenv('AI_LIMIT_PLAYER_BURST', '10'))),
+            'ip': (float(os.getenv('AI_LIMIT_IP_PER_MIN', '20')), int(os.getenv('AI_LIMIT_IP_BURST', '30'))),
+            'global': (float(os.getenv('AI_LIMIT_GLOBAL_PER_MIN', '300')), int(os.getenv('AI_LIMIT_GLOBAL_BURST', '100')))
+        }
+    )
+
+def admit_ai_request(game_id=None):
+    """¿Puede esta petición llamar a Gemini? (jugador por game_id, IP del cliente y global)"""
+    if ai_admission is None:
+        return True
+    try:
+        player_name = game_player(game_id)
+        ip = request.remote_addr if has_request_context() else None
+        return ai_admission.admit(player=player_name, ip=ip)
+    except Exception as e:
+        # El limitador nunca debe tumbar el juego: ante un fallo se admite
+        print(f"⚠️ Error en el limitador de IA: {e}")
+        return True
+
+@app.route('/api/rate_limit_stats', methods=['GET'])
+def rate_limit_stats():
+    """Peticiones a la IA admitidas y denegadas por scope"""
+    if ai_admission is None:
+        return jsonify({'mode': 'off'})
+    return jsonify(ai_admission.stats())
+
+# ==================== FIN LÍMITE DE PETICIONES A LA IA ====================
+
+# ==================== POLÍTICA DE SERVICIO DE DILEMAS ====================
+# Con AI_SERVING_POLICY=adaptive, get_dilemma solo genera en vivo la fracción de
+# peticiones que permite cumplir el SLO (p. ej. p95 < 300 ms) con la latencia y errores
+# observados de Gemini; el resto se sirve del pool de dilemas IA cacheados o de los
+# predefinidos. AI_SERVING_POLICY=live mantiene "Gemini siempre primero".
+
+AI_SERVING_POLICY = os.getenv('AI_SERVING_POLICY', 'adaptive').lower()
+
+dilemma_policy = serving_policy.ServingPolicy(
+    slo_ms=float(os.getenv('AI_LATENCY_SLO_MS', '300')),
+    slo_percentile=float(os.getenv('AI_LATENCY_SLO_PERCENTILE', '95')),
+    window_seconds=int(os.getenv('AI_POLICY_WINDOW_SECONDS', '60')),
+    min_probe=float(os.getenv('AI_POLICY_MIN_PROBE', '0.02'))
+)
+
+@app.route('/api/serving_stats', methods=['GET'])
+def serving_stats():
+    """Decisiones de la política, latencia de Gemini y consumo del presupuesto del SLO"""
+    return jsonify(dict(dilemma_policy.stats(), policy=AI_SERVING_POLICY))
+
+# ==================== FIN POLÍTICA DE SERVICIO DE DILEMAS ====================
+
+# ==================== COLA DE TRABAJOS DE IA ====================
+# Con AI_JOB_QUEUE=sqlite los workers HTTP no llaman a Gemini: encolan trabajos en una
+# cola SQLite duradera (jobs.py) que consumen los procesos de `python worker.py`.
+# get_dilemma encola generaciones (como mucho AI_JOB_MAX_PENDING_GENERATIONS pendientes)
+# y sirve del pool de dilemas cacheados; make_decision encola el análisis y espera su
+# resultado como mucho AI_JOB_WAIT_SECONDS (si no llega, la decisión se guarda sin él).
+
+AI_JOB_QUEUE = os.getenv('AI_JOB_QUEUE', 'off').lower()
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH') or os.path.splitext(DATABASE)[0] + '_jobs.db'
+JOB_VISIBILITY_SECONDS = int(os.getenv('JOB_VISIBILITY_SECONDS', '60'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+AI_JOB_WAIT_SECONDS = float(os.getenv('AI_JOB_WAIT_SECONDS', '5'))
+AI_JOB_MAX_PENDING_GENERATIONS = int(os.getenv('AI_JOB_MAX_PENDING_GENERATIONS', '8'))
+# Un jugador espera el análisis; las generaciones y el mantenimiento son de fondo
+ANALYSIS_JOB_PRIORITY = 10
+
+def open_job_queue():
+    """Cola de trabajos con la configuración de la app (también la usa worker.py)"""
+    return jobs.JobQueue(JOB_QUEUE_PATH, visibility_timeout=JOB_VISIBILITY_SECONDS, max_attempts=JOB_MAX_ATTEMPTS)
+
+job_queue = open_job_queue() if AI_JOB_QUEUE == 'sqlite' else None
+
+def enqueue_dilemma_generation(game_id=None):
+    """Encola la generación de un dilema si hay hueco. El presupuesto de IA del jugador, la
+    IP y global solo se cobra cuando de verdad se encola. Devuelve True si se encoló."""
+    try:
+        if job_queue.pending('generate_dilemma') >= AI_JOB_MAX_PENDING_GENERATIONS:
+            return False
+        if not admit_ai_request(game_id):
+            return False
+        job_queue.enqueue('generate_dilemma')
+        return True
+    except sqlite3.Error as e:
+        print(f"⚠️ Error encolando la generación de un dilema: {e}")
+        return False
+
+def queued_analysis(dilemma, chosen_option, ethical_framework, game_id=None):
+    """Análisis hecho por un worker: se encola (deduplicado) y se espera su resultado"""
+    scenario_text = dilemma.get('scenario') if isinstance(dilemma, dict) else None
+    if not scenario_text:
+        return None
+    analysis_key = caching.cache_key('analysis', scenario_text, chosen_option, ethical_framework)
+    cached_analysis = cache.get(analysis_key)
+    if cached_analysis:
+        return cached_analysis
+    try:
+        # El mismo análisis pedido por varios jugadores es un único trabajo: solo se cobra
+        # el presupuesto de IA a quien lo encola (o vuelve a encolar uno fallido)
+        job = job_queue.find(analysis_key)
+        if job is None or job['status'] == jobs.FAILED:
+            if not admit_ai_request(game_id):
+                return None
+            job_id = job_queue.enqueue('analyze_decision', {
+                'dilemma': {'scenario': scenario_text, 'category': dilemma.get('category')},
+                'chosen_option': chosen_option,
+                'ethical_framework': ethical_framework
+            }, dedupe_key=analysis_key, priority=ANALYSIS_JOB_PRIORITY)
+        else:
+            job_id = job['id']
+        job = job_queue.wait(job_id, AI_JOB_WAIT_SECONDS)
+    except sqlite3.Error as e:
+        print(f"⚠️ Error en la cola de análisis: {e}")
+        return None
+    if not job or job['status'] != jobs.DONE or not job['result']:
+        return None
+    cache.set(analysis_key, job['result'], CACHE_ANALYSIS_TTL)
+    return job['result']
+
+@app.route('/api/job_queue_stats', methods=['GET'])
+def job_queue_stats():
+    """Trabajos por tipo y estado en la cola"""
+    if job_queue is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(job_queue.stats(), enabled=True))
+
+# ==================== FIN COLA DE TRABAJOS DE IA ====================
+
+# ==================== COMPRESIÓN DE RESPUESTAS ====================
+# gzip (o brotli si está instalado) para respuestas mayores que COMPRESSION_MIN_BYTES
+
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+
+@app.after_request
+def compress_api_response(response):
+    """Comprime la respuesta según Accept-Encoding"""
+    return compression.compress_response(response, request.accept_encodings, COMPRESSION_MIN_BYTES)
+
+# ==================== FIN COMPRESIÓN DE RESPUESTAS ====================
+
+# Configurar Gemini (el SDK tarda ~1s en importarse: se carga en el primer uso)
+_genai = None
+_genai_lock = threading.Lock()
+
+def get_genai():
+    """Importa y configura google.generativeai la primera vez que se necesita"""
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=GOOGLE_API_KEY)
+                _genai = genai
+    return _genai
+
+# Hedging de Gemini (opcional): si una llamada supera el p90 observado se lanza otra
+# idéntica y gana la primera respuesta; como máximo GEMINI_HEDGE_BUDGET llamadas extra
+GEMINI_HEDGING = os.getenv('GEMINI_HEDGING', '0') == '1'
+gemini_hedger = hedging.Hedger(
+    budget=float(os.getenv('GEMINI_HEDGE_BUDGET', '0.10')),
+    percentile=float(os.getenv('GEMINI_HEDGE_PERCENTILE', '90'))
+) if GEMINI_HEDGING else None
+
+def generate_content(model, prompt, **kwargs):
+    """model.generate_content con petición de respaldo si el hedging está activado"""
+    if gemini_hedger is None:
+        return model.generate_content(prompt, **kwargs)
+    return gemini_hedger.call(model.generate_content, prompt, **kwargs)
+
+# Salida estructurada: los dilemas se piden como JSON con esquema (dilemma_schema.py) y se
+# validan/reparan antes de descartarlos. Un SDK antiguo rechaza generation_config antes
+# de llamar a la API: entonces se sigue solo con el prompt.
+GEMINI_STRUCTURED_OUTPUT = os.getenv('GEMINI_STRUCTURED_OUTPUT', '1') == '1'
+_structured_output_supported = True
+dilemma_validator = dilemma_schema.DilemmaValidator()
+generation_stats = dilemma_schema.GenerationStats()
+
+def generate_structured(model, prompt, schema):
+    """generate_content pidiendo JSON con `schema` (o solo el prompt si no se admite)"""
+    global _structured_output_supported
+    if GEMINI_STRUCTURED_OUTPUT and _structured_output_supported:
+        try:
+            return generate_content(model, prompt, generation_config={
+                'response_mime_type': 'application/json',
+                'response_schema': schema
+            })
+        except (TypeError, ValueError) as e:
+            _structured_output_supported = False
+            print(f"⚠️ El SDK de Gemini no admite salida estructurada, se usa solo el prompt: {e}")
+    return generate_content(model, prompt)
+
+@app.route('/api/generation_stats', methods=['GET'])
+def generation_stats_route():
+    """Dilemas generados válidos, reparados y descartados (tasa de fallos de parseo)"""
+    return jsonify(dict(generation_stats.stats(),
+                        structured_output=GEMINI_STRUCTURED_OUTPUT and _structured_output_supported))
+
+@app.route('/api/hedging_stats', methods=['GET'])
+def hedging_stats():
+    """Llamadas a Gemini, respaldos lanzados y ganados"""
+    if gemini_hedger is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(gemini_hedger.stats(), enabled=True))
 
 PREDEFINED_DILEMMAS = [
     {
@@ -216,132 +653,29 @@ PREDEFINED_DILEMMAS = [
     }
 ]
 
-def init_db():
-    """Initialize the database with required tables"""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS games (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            player_name TEXT NOT NULL,
-            start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            end_time TIMESTAMP,
-            total_score INTEGER DEFAULT 0,
-            dilemmas_answered INTEGER DEFAULT 0
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS decisions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            game_id INTEGER,
-            dilemma_id INTEGER,
-            dilemma_text TEXT,
-            dilemma_category TEXT,
-            chosen_option TEXT,
-            ethical_framework TEXT,
-            analysis TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (game_id) REFERENCES games (id)
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS prompts_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            prompt_text TEXT,
-            response_text TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Tabla para cache de dilemas generados por IA
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS ai_dilemmas_cache (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            dilemma_text TEXT UNIQUE,
-            scenario TEXT,
-            options TEXT,
-            category TEXT,
-            image_url TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Tabla para logros disponibles
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS achievements (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            code TEXT UNIQUE NOT NULL,
-            name TEXT NOT NULL,
-            description TEXT NOT NULL,
-            icon TEXT NOT NULL,
-            achievement_type TEXT NOT NULL,
-            condition_value TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Tabla para logros desbloqueados por jugadores
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS player_achievements (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            player_name TEXT NOT NULL,
-            achievement_id INTEGER NOT NULL,
-            unlocked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (achievement_id) REFERENCES achievements (id),
-            UNIQUE(player_name, achievement_id)
-        )
-    ''')
-    
-    # Migración: Agregar columnas faltantes si no existen
-    migrate_db(cursor)
-    
-    # Inicializar logros predefinidos
-    init_achievements(cursor)
-    
-    conn.commit()
-    conn.close()
+def _schema_version():
+    """Versión de esquema esperada: cambia con storage.SCHEMA_VERSION, los logros, las tablas auxiliares o los shards"""
+    definition = json.dumps([ACHIEVEMENTS, analytics.ROLLUP_TABLES, bandit.BANDIT_TABLES,
+                             idempotency.IDEMPOTENCY_TABLES, warm_analyses.WARM_TABLES,
+                             repository.source_count()], ensure_ascii=False)
+    return f"{SCHEMA_VERSION}-{hashlib.sha256(definition.encode('utf-8')).hexdigest()[:12]}"
 
-def migrate_db(cursor):
-    """Migrate database schema to add new columns if they don't exist"""
-    try:
-        # Verificar columnas existentes en decisions
-        cursor.execute('PRAGMA table_info(decisions)')
-        existing_columns = [col[1] for col in cursor.fetchall()]
-        
-        # Agregar dilemma_category si no existe
-        if 'dilemma_category' not in existing_columns:
-            cursor.execute('ALTER TABLE decisions ADD COLUMN dilemma_category TEXT')
-            print("✅ Agregada columna 'dilemma_category' a la tabla decisions")
-        
-        # Agregar analysis si no existe
-        if 'analysis' not in existing_columns:
-            cursor.execute('ALTER TABLE decisions ADD COLUMN analysis TEXT')
-            print("✅ Agregada columna 'analysis' a la tabla decisions")
-        
-        # Verificar columnas existentes en games
-        cursor.execute('PRAGMA table_info(games)')
-        existing_columns_games = [col[1] for col in cursor.fetchall()]
-        
-        # Agregar dilemmas_answered si no existe
-        if 'dilemmas_answered' not in existing_columns_games:
-            cursor.execute('ALTER TABLE games ADD COLUMN dilemmas_answered INTEGER DEFAULT 0')
-            print("✅ Agregada columna 'dilemmas_answered' a la tabla games")
-        
-        # Verificar columnas existentes en ai_dilemmas_cache
-        cursor.execute('PRAGMA table_info(ai_dilemmas_cache)')
-        existing_columns_cache = [col[1] for col in cursor.fetchall()]
-        
-        # Agregar image_url si no existe
-        if 'image_url' not in existing_columns_cache:
-            cursor.execute('ALTER TABLE ai_dilemmas_cache ADD COLUMN image_url TEXT')
-            print("✅ Agregada columna 'image_url' a la tabla ai_dilemmas_cache")
-            
-    except Exception as e:
-        print(f"⚠️ Error durante la migración: {e}")
-        # No lanzar excepción, solo registrar el error
+def init_db(force=False):
+    """Initialize the database with required tables.
+
+    Si schema_version coincide con la versión esperada se omiten migraciones y
+    siembra de logros (arranque en frío rápido). Devuelve True si se inicializó.
+    """
+    version = _schema_version()
+    if not force and repository.get_schema_version() == version:
+        return False
+    repository.init_schema(ACHIEVEMENTS)
+    analytics.init_rollups(repository)
+    bandit.init_tables(repository)
+    idempotency.init_tables(repository)
+    warm_analyses.init_tables(repository)
+    repository.set_schema_version(version)
+    return True
 
 # ==================== SISTEMA DE IMÁGENES ====================
 # URLs públicas de imágenes de Unsplash organizadas por categoría
@@ -560,250 +894,133 @@ def get_ethical_framework_image(ethical_framework):
 def cache_dilemma_image(scenario, image_url):
     """Guarda la URL de imagen en el cache del dilema"""
     try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute(
-            'UPDATE ai_dilemmas_cache SET image_url = ? WHERE dilemma_text = ?',
-            (image_url, scenario)
-        )
-        conn.commit()
-        conn.close()
+        repository.set_dilemma_image(scenario, image_url)
+        cache.set(caching.cache_key('dilemma_image', scenario), image_url)
     except Exception as e:
         print(f"Error cacheando imagen: {e}")
 
 def get_cached_dilemma_image(scenario):
     """Obtiene la imagen en cache para un dilema"""
     try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute(
-            'SELECT image_url FROM ai_dilemmas_cache WHERE dilemma_text = ?',
-            (scenario,)
-        )
-        result = cursor.fetchone()
-        conn.close()
-        return result[0] if result and result[0] else None
+        return cache.get_or_set(caching.cache_key('dilemma_image', scenario),
+                                lambda: repository.get_cached_dilemma_image(scenario))
     except Exception as e:
         print(f"Error obteniendo imagen cacheada: {e}")
         return None
 
+# Servir las imágenes desde el proxy local (/img/<id>?w=) en lugar de Unsplash.
+# IMAGE_PROXY=auto (por defecto) lo activa solo si IMAGE_SOURCE_DIR tiene originales
+IMAGE_PROXY_MODE = os.getenv('IMAGE_PROXY', 'auto').lower()
+IMAGE_PROXY = image_proxy.has_sources() if IMAGE_PROXY_MODE == 'auto' else IMAGE_PROXY_MODE not in ('0', 'off')
+
+def public_image_url(image_url, width=800):
+    """URL de imagen que recibe el cliente (la del proxy si está activado)"""
+    return image_proxy.proxy_url(image_url, width) if IMAGE_PROXY else image_url
+
 # ==================== FIN SISTEMA DE IMÁGENES ====================
 
 # ==================== SISTEMA DE LOGROS ====================
 
-def init_achievements(cursor):
-    """Inicializa los logros predefinidos en la base de datos"""
-    achievements = [
-        # Logros por cantidad
-        ('first_dilemma', 'Primer Paso', 'Completa tu primer dilema ético', '🎯', 'quantity', '1'),
-        ('ten_dilemmas', 'Decidido', 'Completa 10 dilemas éticos', '🔟', 'quantity', '10'),
-        ('twenty_five_dilemmas', 'Pensador', 'Completa 25 dilemas éticos', '📚', 'quantity', '25'),
-        ('fifty_dilemmas', 'Filósofo', 'Completa 50 dilemas éticos', '🧠', 'quantity', '50'),
-        ('hundred_dilemmas', 'Maestro Ético', 'Completa 100 dilemas éticos', '👑', 'quantity', '100'),
-        
-        # Logros por diversidad - Categorías
-        ('explorer', 'Explorador', 'Responde dilemas de todas las categorías', '🗺️', 'diversity_categories', None),
-        
-        # Logros por diversidad - Marcos éticos
-        ('philosopher', 'Filósofo Completo', 'Usa todos los marcos éticos diferentes', '🎓', 'diversity_frameworks', None),
-        
-        # Logros por consistencia - Marcos éticos
-        ('utilitarian', 'Utilitarista', 'Elige utilitarismo 5 veces', '⚖️', 'consistency', 'utilitarianismo:5'),
-        ('deontologist', 'Deontólogo', 'Elige deontología 5 veces', '📜', 'consistency', 'deontologia:5'),
-        ('autonomous', 'Defensor de la Autonomía', 'Elige autonomía 5 veces', '🕊️', 'consistency', 'autonomia:5'),
-        ('paternalist', 'Paternalista', 'Elige paternalismo 5 veces', '🛡️', 'consistency', 'paternalismo:5'),
-        ('ecocentrist', 'Ecocentrista', 'Elige ecocentrismo 5 veces', '🌱', 'consistency', 'ecocentrismo:5'),
-        ('anthropocentrist', 'Antropocentrista', 'Elige antropocentrismo 5 veces', '👥', 'consistency', 'antropocentrismo:5'),
-        
-        # Logros especiales
-        ('thinker', 'Pensador Profundo', 'Completa 10 análisis con IA', '💭', 'special', 'analyses:10'),
-        ('speedster', 'Velocista', 'Completa 10 dilemas en una sola sesión', '⚡', 'special', 'session:10'),
-    ]
+# Catálogo de logros: (code, name, description, icon, achievement_type, condition_value)
+ACHIEVEMENTS = [
+    # Logros por cantidad
+    ('first_dilemma', 'Primer Paso', 'Completa tu primer dilema ético', '🎯', 'quantity', '1'),
+    ('ten_dilemmas', 'Decidido', 'Completa 10 dilemas éticos', '🔟', 'quantity', '10'),
+    ('twenty_five_dilemmas', 'Pensador', 'Completa 25 dilemas éticos', '📚', 'quantity', '25'),
+    ('fifty_dilemmas', 'Filósofo', 'Completa 50 dilemas éticos', '🧠', 'quantity', '50'),
+    ('hundred_dilemmas', 'Maestro Ético', 'Completa 100 dilemas éticos', '👑', 'quantity', '100'),
     
-    for code, name, description, icon, achievement_type, condition_value in achievements:
-        cursor.execute('''
-            INSERT OR IGNORE INTO achievements (code, name, description, icon, achievement_type, condition_value)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (code, name, description, icon, achievement_type, condition_value))
-
-def check_and_unlock_achievements(player_name, game_id=None):
-    """Verifica y desbloquea logros para un jugador"""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
+    # Logros por diversidad - Categorías
+    ('explorer', 'Explorador', 'Responde dilemas de todas las categorías', '🗺️', 'diversity_categories', None),
     
-    # Obtener todas las decisiones del jugador
-    if game_id:
-        cursor.execute('''
-            SELECT d.ethical_framework, d.dilemma_category, d.analysis, g.start_time
-            FROM decisions d
-            JOIN games g ON d.game_id = g.id
-            WHERE g.player_name = ? AND d.game_id = ?
-        ''', (player_name, game_id))
-    else:
-        cursor.execute('''
-            SELECT d.ethical_framework, d.dilemma_category, d.analysis, g.start_time
-            FROM decisions d
-            JOIN games g ON d.game_id = g.id
-            WHERE g.player_name = ?
-        ''', (player_name,))
+    # Logros por diversidad - Marcos éticos
+    ('philosopher', 'Filósofo Completo', 'Usa todos los marcos éticos diferentes', '🎓', 'diversity_frameworks', None),
     
-    all_decisions = cursor.fetchall()
+    # Logros por consistencia - Marcos éticos
+    ('utilitarian', 'Utilitarista', 'Elige utilitarismo 5 veces', '⚖️', 'consistency', 'utilitarianismo:5'),
+    ('deontologist', 'Deontólogo', 'Elige deontología 5 veces', '📜', 'consistency', 'deontologia:5'),
+    ('autonomous', 'Defensor de la Autonomía', 'Elige autonomía 5 veces', '🕊️', 'consistency', 'autonomia:5'),
+    ('paternalist', 'Paternalista', 'Elige paternalismo 5 veces', '🛡️', 'consistency', 'paternalismo:5'),
+    ('ecocentrist', 'Ecocentrista', 'Elige ecocentrismo 5 veces', '🌱', 'consistency', 'ecocentrismo:5'),
+    ('anthropocentrist', 'Antropocentrista', 'Elige antropocentrismo 5 veces', '👥', 'consistency', 'antropocentrismo:5'),
     
-    if not all_decisions:
-        conn.close()
-        return []
+    # Logros especiales
+    ('thinker', 'Pensador Profundo', 'Completa 10 análisis con IA', '💭', 'special', 'analyses:10'),
+    ('speedster', 'Velocista', 'Completa 10 dilemas en una sola sesión', '⚡', 'special', 'session:10'),
+]
+
+REQUIRED_CATEGORIES = {'clásico', 'medicina', 'tecnología', 'medio ambiente', 'negocios', 'sociedad'}
+REQUIRED_FRAMEWORKS = {'utilitarianismo', 'deontologia', 'autonomia', 'paternalismo', 'ecocentrismo', 'antropocentrismo'}
+
+def is_achievement_unlocked(achievement_type, condition_value, metrics, game_id=None):
+    """Evalúa la condición de un logro sobre los agregados de get_achievement_metrics"""
+    if achievement_type == 'quantity':
+        # Logros por cantidad total
+        return metrics['total'] >= int(condition_value)
     
-    # Obtener logros ya desbloqueados
-    cursor.execute('''
-        SELECT a.code FROM achievements a
-        JOIN player_achievements pa ON a.id = pa.achievement_id
-        WHERE pa.player_name = ?
-    ''', (player_name,))
-    unlocked_codes = {row[0] for row in cursor.fetchall()}
+    if achievement_type == 'diversity_categories':
+        # Explorador: todas las categorías
+        return REQUIRED_CATEGORIES.issubset(metrics['categories'])
     
-    # Obtener todos los logros disponibles
-    cursor.execute('SELECT id, code, achievement_type, condition_value FROM achievements')
-    all_achievements = cursor.fetchall()
+    if achievement_type == 'diversity_frameworks':
+        # Filósofo: todos los marcos éticos
+        return REQUIRED_FRAMEWORKS.issubset(metrics['frameworks'])
     
-    newly_unlocked = []
+    if achievement_type == 'consistency':
+        # Logros por consistencia: usar el mismo marco X veces
+        framework, count = condition_value.split(':')
+        return metrics['frameworks'].get(framework, 0) >= int(count)
     
-    for achievement_id, code, achievement_type, condition_value in all_achievements:
-        if code in unlocked_codes:
-            continue
-        
-        unlocked = False
-        
-        if achievement_type == 'quantity':
-            # Logros por cantidad total
-            total_count = len(all_decisions)
-            required = int(condition_value)
-            if total_count >= required:
-                unlocked = True
-        
-        elif achievement_type == 'diversity_categories':
-            # Explorador: todas las categorías
-            categories = {d[1] for d in all_decisions if d[1]}
-            required_categories = {'clásico', 'medicina', 'tecnología', 'medio ambiente', 'negocios', 'sociedad'}
-            if required_categories.issubset(categories):
-                unlocked = True
-        
-        elif achievement_type == 'diversity_frameworks':
-            # Filósofo: todos los marcos éticos
-            frameworks = {d[0] for d in all_decisions if d[0]}
-            required_frameworks = {'utilitarianismo', 'deontologia', 'autonomia', 'paternalismo', 'ecocentrismo', 'antropocentrismo'}
-            if required_frameworks.issubset(frameworks):
-                unlocked = True
-        
-        elif achievement_type == 'consistency':
-            # Logros por consistencia: usar el mismo marco X veces
-            framework, count = condition_value.split(':')
-            framework_count = sum(1 for d in all_decisions if d[0] == framework)
-            if framework_count >= int(count):
-                unlocked = True
-        
-        elif achievement_type == 'special':
-            if condition_value.startswith('analyses:'):
-                # Pensador: análisis completados
-                required = int(condition_value.split(':')[1])
-                analyses_count = sum(1 for d in all_decisions if d[2] and d[2].strip())
-                if analyses_count >= required:
-                    unlocked = True
-            elif condition_value.startswith('session:'):
-                # Velocista: dilemas en una sesión
-                if game_id:
-                    required = int(condition_value.split(':')[1])
-                    cursor.execute('SELECT COUNT(*) FROM decisions WHERE game_id = ?', (game_id,))
-                    session_count = cursor.fetchone()[0]
-                    if session_count >= required:
-                        unlocked = True
-        
-        if unlocked:
-            # Desbloquear logro
-            try:
-                cursor.execute('''
-                    INSERT INTO player_achievements (player_name, achievement_id)
-                    VALUES (?, ?)
-                ''', (player_name, achievement_id))
-                
-                # Obtener información del logro
-                cursor.execute('SELECT name, description, icon FROM achievements WHERE id = ?', (achievement_id,))
-                achievement_info = cursor.fetchone()
-                newly_unlocked.append({
-                    'code': code,
-                    'name': achievement_info[0],
-                    'description': achievement_info[1],
-                    'icon': achievement_info[2]
-                })
-            except sqlite3.IntegrityError:
-                # Ya estaba desbloqueado (race condition)
-                pass
+    if achievement_type == 'special':
+        if condition_value.startswith('analyses:'):
+            # Pensador: análisis completados
+            return metrics['analyses'] >= int(condition_value.split(':')[1])
+        if condition_value.startswith('session:'):
+            # Velocista: dilemas en una sesión (las métricas ya están filtradas por partida)
+            return bool(game_id) and metrics['total'] >= int(condition_value.split(':')[1])
     
-    conn.commit()
-    conn.close()
-    return newly_unlocked
+    return False
 
-def get_player_achievements(player_name):
-    """Obtiene todos los logros de un jugador"""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT a.code, a.name, a.description, a.icon, pa.unlocked_at
-        FROM achievements a
-        JOIN player_achievements pa ON a.id = pa.achievement_id
-        WHERE pa.player_name = ?
-        ORDER BY pa.unlocked_at DESC
-    ''', (player_name,))
-    
-    unlocked = [{
-        'code': row[0],
-        'name': row[1],
-        'description': row[2],
-        'icon': row[3],
-        'unlocked_at': row[4]
-    } for row in cursor.fetchall()]
-    
-    # Obtener todos los logros disponibles para mostrar progreso
-    cursor.execute('SELECT code, name, description, icon FROM achievements ORDER BY id')
-    all_achievements = cursor.fetchall()
+def check_and_unlock_achievements(player_name, game_id=None):
+    """Verifica y desbloquea logros para un jugador"""
+    # Agregados calculados en SQL: una fila por (marco, categoría), no por decisión
+    metrics = repository.get_achievement_metrics(player_name, game_id)
+    if not metrics['total']:
+        return []
     
-    unlocked_codes = {a['code'] for a in unlocked}
+    candidates = {
+        achievement_id: (code, name, description, icon)
+        for achievement_id, code, name, description, icon, achievement_type, condition_value
+        in repository.get_locked_achievements(player_name)
+        if is_achievement_unlocked(achievement_type, condition_value, metrics, game_id)
+    }
+    if not candidates:
+        return []
     
-    all_achievements_list = []
-    for code, name, description, icon in all_achievements:
-        all_achievements_list.append({
+    newly_unlocked = []
+    for achievement_id in repository.unlock_achievements(player_name, list(candidates)):
+        code, name, description, icon = candidates[achievement_id]
+        newly_unlocked.append({
             'code': code,
             'name': name,
             'description': description,
-            'icon': icon,
-            'unlocked': code in unlocked_codes
+            'icon': icon
         })
-    
-    conn.close()
-    return {
-        'unlocked': unlocked,
-        'all': all_achievements_list,
-        'total': len(all_achievements_list),
-        'unlocked_count': len(unlocked)
-    }
+    return newly_unlocked
+
+def get_player_achievements(player_name):
+    """Obtiene todos los logros de un jugador"""
+    return repository.get_player_achievements(player_name)
 
 def calculate_retroactive_achievements():
     """Calcula logros retroactivamente para todos los jugadores existentes"""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    
-    # Obtener todos los nombres de jugadores únicos
-    cursor.execute('SELECT DISTINCT player_name FROM games')
-    players = [row[0] for row in cursor.fetchall()]
-    
     total_unlocked = 0
-    for player_name in players:
+    for player_name in repository.list_players():
         newly_unlocked = check_and_unlock_achievements(player_name)
         total_unlocked += len(newly_unlocked)
         if newly_unlocked:
             print(f"✅ {player_name}: {len(newly_unlocked)} logros desbloqueados retroactivamente")
     
-    conn.close()
     return total_unlocked
 
 # ==================== FIN SISTEMA DE LOGROS ====================
@@ -815,7 +1032,7 @@ def generate_dilemma_with_gemini():
     
     try:
         # Usar gemini-2.5-flash (más reciente y estable)
-        model = genai.GenerativeModel('gemini-2.5-flash')
+        model = get_genai().GenerativeModel('gemini-2.5-flash')
         
         categories = ['medicina', 'tecnología', 'medio ambiente', 'negocios', 'sociedad', 'educación', 'política']
         selected_category = random.choice(categories)
@@ -846,32 +1063,21 @@ Formato JSON exacto:
 
 IMPORTANTE: Responde SOLO con el JSON, sin texto adicional, sin markdown, sin explicaciones."""
         
-        response = model.generate_content(prompt)
-        content = response.text.strip()
-        
-        # Limpiar markdown si existe
-        if content.startswith('```json'):
-            content = content[7:]
-        if content.startswith('```'):
-            content = content[3:]
-        if content.endswith('```'):
-            content = content[:-3]
-        content = content.strip()
+        response = generate_structured(model, prompt, dilemma_schema.DILEMMA_SCHEMA)
+        content = response.text
         
+        # Validar (enum de marcos, opciones y longitudes) reparando lo que se pueda
         try:
-            dilemma_data = json.loads(content)
-            
-            # Validar estructura
-            if 'scenario' in dilemma_data and 'options' in dilemma_data and len(dilemma_data['options']) == 2:
-                # Cachear dilema generado
-                cache_dilemma(dilemma_data)
-                return dilemma_data
-            else:
-                log_prompt(prompt, f"Invalid structure: {content}")
-                return None
-        except json.JSONDecodeError as e:
-            log_prompt(prompt, f"JSON Error: {str(e)}\nContent: {content}")
+            dilemma_data, repaired = dilemma_validator.parse(content, selected_category)
+        except dilemma_schema.InvalidDilemma as e:
+            generation_stats.record(failure=e.reason)
+            log_prompt(prompt, f"Invalid dilemma ({e.reason}): {e}\nContent: {content}")
             return None
+        
+        generation_stats.record(repaired=repaired)
+        # Cachear dilema generado
+        cache_dilemma(dilemma_data)
+        return dilemma_data
             
     except Exception as e:
         print(f"Error generating dilemma with Gemini: {e}")
@@ -880,33 +1086,34 @@ IMPORTANTE: Responde SOLO con el JSON, sin texto adicional, sin markdown, sin ex
 def cache_dilemma(dilemma_data):
     """Cache AI-generated dilemmas to avoid duplicates"""
     try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        
         # Obtener imagen para el dilema
         category = dilemma_data.get('category', 'general')
         scenario = dilemma_data['scenario']
         image_url = get_dilemma_image(scenario, category)
         
-        cursor.execute(
-            '''INSERT OR IGNORE INTO ai_dilemmas_cache (dilemma_text, scenario, options, category, image_url) 
-               VALUES (?, ?, ?, ?, ?)''',
-            (scenario, scenario, 
-             json.dumps(dilemma_data['options']), category, image_url)
-        )
-        
-        # Si el registro ya existía, actualizar la imagen
-        cursor.execute(
-            'UPDATE ai_dilemmas_cache SET image_url = ? WHERE dilemma_text = ? AND image_url IS NULL',
-            (image_url, scenario)
-        )
-        
-        conn.commit()
-        conn.close()
+        dilemma_data['cache_id'] = repository.cache_dilemma(scenario, json.dumps(dilemma_data['options']),
+                                                            category, image_url)
     except Exception as e:
         print(f"Error caching dilemma: {e}")
 
-def analyze_decision_with_ai(dilemma, chosen_option, ethical_framework):
+def analysis_prompt(scenario_text, chosen_option, ethical_framework):
+    """Prompt del análisis de una decisión (también es la clave de los análisis precalculados)"""
+    return f"""Analiza esta decisión ética y proporciona retroalimentación constructiva en español (máximo 150 palabras):
+
+Dilema: {scenario_text}
+
+Opción elegida: {chosen_option}
+Marco ético: {ethical_framework}
+
+Proporciona:
+1. Una explicación breve del marco ético aplicado
+2. Fortalezas de esta decisión
+3. Consideraciones alternativas
+4. Una reflexión final
+
+Sé constructivo, educativo y objetivo. No juzgues la decisión como "correcta" o "incorrecta", sino explora sus implicaciones éticas."""
+
+def analyze_decision_with_ai(dilemma, chosen_option, ethical_framework, game_id=None):
     """Analyze player's decision using AI and provide feedback"""
     if not GOOGLE_API_KEY:
         return None
@@ -921,33 +1128,31 @@ def analyze_decision_with_ai(dilemma, chosen_option, ethical_framework):
             print("⚠️ Dilema sin escenario para análisis")
             return None
         
-        # Usar gemini-2.5-flash (más reciente y estable)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
         scenario_text = dilemma.get('scenario', '')
         if not scenario_text:
             return None
         
-        prompt = f"""Analiza esta decisión ética y proporciona retroalimentación constructiva en español (máximo 150 palabras):
-
-Dilema: {scenario_text}
-
-Opción elegida: {chosen_option}
-Marco ético: {ethical_framework}
-
-Proporciona:
-1. Una explicación breve del marco ético aplicado
-2. Fortalezas de esta decisión
-3. Consideraciones alternativas
-4. Una reflexión final
-
-Sé constructivo, educativo y objetivo. No juzgues la decisión como "correcta" o "incorrecta", sino explora sus implicaciones éticas."""
+        # El mismo dilema, opción y marco producen el mismo análisis: reutilizarlo
+        analysis_key = caching.cache_key('analysis', scenario_text, chosen_option, ethical_framework)
+        cached_analysis = cache.get(analysis_key)
+        if cached_analysis:
+            return cached_analysis
         
-        response = model.generate_content(prompt)
+        # Sin presupuesto de IA la decisión se guarda sin análisis
+        if not admit_ai_request(game_id):
+            return None
+        
+        # Usar gemini-2.5-flash (más reciente y estable)
+        model = get_genai().GenerativeModel('gemini-2.5-flash')
+        
+        prompt = analysis_prompt(scenario_text, chosen_option, ethical_framework)
+        
+        response = generate_content(model, prompt)
         if not response or not response.text:
             return None
             
         analysis = response.text.strip()
+        cache.set(analysis_key, analysis, CACHE_ANALYSIS_TTL)
         
         return analysis
         
@@ -957,16 +1162,121 @@ Sé constructivo, educativo y objetivo. No juzgues la decisión como "correcta"
         traceback.print_exc()
         return None
 
+# Análisis precalculados de los dilemas predefinidos (warm_analyses.py): make_decision los
+# consulta antes de llamar a Gemini. Se generan con `python warm_analyses.py`.
+WARM_ANALYSES = os.getenv('WARM_ANALYSES', '1') == '1'
+warm_store = warm_analyses.WarmAnalyses(
+    repository,
+    refresh_seconds=float(os.getenv('WARM_ANALYSES_REFRESH_SECONDS', '60'))
+) if WARM_ANALYSES else None
+
+def predefined_analysis_prompts():
+    """Prompts de análisis de cada opción de cada dilema predefinido"""
+    return [analysis_prompt(dilemma['scenario'], option['text'], option['ethical_value'])
+            for dilemma in PREDEFINED_DILEMMAS for option in dilemma['options']]
+
+def get_warm_analysis(scenario_text, chosen_option, ethical_framework):
+    """Variante precalculada del análisis o None"""
+    if warm_store is None or not scenario_text:
+        return None
+    return warm_store.lookup(analysis_prompt(scenario_text, chosen_option, ethical_framework))
+
+@app.route('/api/warm_analyses_stats', methods=['GET'])
+def warm_analyses_stats():
+    """Análisis precalculados cargados y aciertos en make_decision"""
+    if warm_store is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(warm_store.stats(), enabled=True))
+
+# Los dilemas IA se identifican como AI_DILEMMA_ID_OFFSET + su id en ai_dilemmas_cache
+# (los predefinidos usan ids pequeños); uno sin id en la cache usa el propio offset
+AI_DILEMMA_ID_OFFSET = 1000
+
+def ai_dilemma_id(cache_id):
+    """Id público y estable de un dilema IA"""
+    return AI_DILEMMA_ID_OFFSET + (cache_id or 0)
+
+def get_random_cached_dilemma():
+    """Dilema generado anteriormente por la IA, para cuando no hay presupuesto de Gemini"""
+    try:
+        return repository.get_random_cached_dilemma()
+    except Exception as e:
+        print(f"Error reading cached dilemma: {e}")
+        return None
+
+# Selección de dilemas: random (como siempre) o dirigida a los marcos/categorías que aún
+# le faltan al jugador mediante el índice invertido de dilemma_index.py
+DILEMMA_SELECTION = os.getenv('DILEMMA_SELECTION', 'random').lower()
+DILEMMA_INDEX_SYNC_SECONDS = float(os.getenv('DILEMMA_INDEX_SYNC_SECONDS', '10'))
+# Cobertura de cada jugador (marcos y categorías ya elegidos), incremental en memoria
+selection_coverage = sessions.PlayerCoverageStore(
+    repository,
+    ttl_seconds=int(os.getenv('DILEMMA_COVERAGE_TTL_SECONDS', '300'))
+) if DILEMMA_SELECTION != 'random' else None
+_dilemma_index = None
+_dilemma_index_synced_at = 0.0
+_dilemma_index_lock = threading.Lock()
+
+def get_dilemma_index():
+    """Índice de dilemas con la cache de IA sincronizada (como mucho cada DILEMMA_INDEX_SYNC_SECONDS)"""
+    global _dilemma_index, _dilemma_index_synced_at
+    with _dilemma_index_lock:
+        if _dilemma_index is None:
+            _dilemma_index = dilemma_index.DilemmaIndex(PREDEFINED_DILEMMAS)
+        if time.monotonic() - _dilemma_index_synced_at >= DILEMMA_INDEX_SYNC_SECONDS:
+            try:
+                _dilemma_index.sync(repository)
+            except Exception as e:
+                print(f"⚠️ Error sincronizando el índice de dilemas: {e}")
+            _dilemma_index_synced_at = time.monotonic()
+    return _dilemma_index
+
+def get_selection_metrics(game_id):
+    """Marcos y categorías que ya ha elegido el jugador de la partida (None si no se conoce)"""
+    try:
+        player_name = game_player(game_id)
+        return selection_coverage.get(player_name) if player_name else None
+    except Exception as e:
+        print(f"⚠️ Error leyendo el historial para seleccionar dilema: {e}")
+        return None
+
+def select_dilemma(pool, metrics=None):
+    """Copia de un dilema del pool (predefined / ai) según DILEMMA_SELECTION o None si está vacío"""
+    dilemma = get_dilemma_index().select(pool, DILEMMA_SELECTION, metrics,
+                                         REQUIRED_FRAMEWORKS, REQUIRED_CATEGORIES)
+    return dict(dilemma) if dilemma else None
+
+# Planificador bandit (bandit.py): con DILEMMA_SCHEDULER=bandit cada dilema predefinido,
+# cada dilema IA cacheado y la generación en vivo son brazos; la recompensa es que el
+# jugador responda y siga jugando, penalizada por el coste y la latencia de cada brazo
+DILEMMA_SCHEDULER = os.getenv('DILEMMA_SCHEDULER', 'policy').lower()
+BANDIT_LIVE_COST = float(os.getenv('BANDIT_LIVE_COST', '0.3'))
+BANDIT_LATENCY_WEIGHT = float(os.getenv('BANDIT_LATENCY_WEIGHT', '0.2'))
+BANDIT_PERSIST_SECONDS = int(os.getenv('BANDIT_PERSIST_SECONDS', '60'))
+
+bandit_scheduler = bandit.BanditScheduler(
+    live_cost=BANDIT_LIVE_COST,
+    latency_weight=BANDIT_LATENCY_WEIGHT
+) if DILEMMA_SCHEDULER == 'bandit' else None
+
+def choose_bandit_dilemma(include_live):
+    """(brazo, copia del dilema) elegidos por el bandit; el dilema es None si el brazo es 'live'"""
+    candidates = {bandit.predefined_arm(dilemma['id']): dilemma for dilemma in PREDEFINED_DILEMMAS}
+    candidates.update((bandit.ai_arm(ai_id), dilemma) for ai_id, dilemma in get_dilemma_index().ai_items())
+    arm = bandit_scheduler.choose(list(candidates) + ([bandit.LIVE_ARM] if include_live else []))
+    return arm, (dict(candidates[arm]) if arm in candidates else None)
+
+@app.route('/api/bandit_stats', methods=['GET'])
+def bandit_stats():
+    """Brazos del bandit con mayor tasa de compromiso"""
+    if bandit_scheduler is None:
+        return jsonify({'enabled': False})
+    limit = max(1, min(request.args.get('limit', 20, type=int), 200))
+    return jsonify(dict(bandit_scheduler.stats(limit), enabled=True))
+
 def log_prompt(prompt, response):
     """Log AI prompts and responses for debugging"""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    cursor.execute(
-        'INSERT INTO prompts_log (prompt_text, response_text) VALUES (?, ?)',
-        (prompt, response)
-    )
-    conn.commit()
-    conn.close()
+    repository.log_prompt(prompt, response)
 
 @app.route('/')
 def index():
@@ -974,6 +1284,7 @@ def index():
     return render_template('index.html')
 
 @app.route('/api/start_game', methods=['POST'])
+@idempotent
 def start_game():
     """Start a new game session"""
     try:
@@ -983,43 +1294,24 @@ def start_game():
         
         player_name = data.get('player_name', 'Anonymous')
         
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
         try:
-            cursor.execute(
-                'INSERT INTO games (player_name) VALUES (?)',
-                (player_name,)
-            )
-            game_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            game_id = repository.create_game(player_name)
         except sqlite3.OperationalError as db_err:
             err_msg = str(db_err).lower()
             if 'no such table' in err_msg or 'unable to open database file' in err_msg:
                 print(f"⚠️ Detected missing table/DB, re-initializing...")
                 try:
-                    conn.close()
-                except Exception:
-                    pass
-                try:
-                    init_db()
-                    conn = sqlite3.connect(DATABASE)
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        'INSERT INTO games (player_name) VALUES (?)',
-                        (player_name,)
-                    )
-                    game_id = cursor.lastrowid
-                    conn.commit()
-                    conn.close()
+                    init_db(force=True)
+                    game_id = repository.create_game(player_name)
                 except Exception as retry_err:
                     print(f"❌ start_game retry failed: {retry_err}")
                     return jsonify({'status': 'error', 'message': 'Database error'}), 500
             else:
                 print(f"❌ start_game DB error: {db_err}")
-                conn.close()
                 return jsonify({'status': 'error', 'message': 'Database error'}), 500
         
+        if game_sessions is not None:
+            game_sessions.start(game_id, player_name)
         return jsonify({'game_id': game_id})
     except Exception as e:
         print(f"❌ start_game exception: {e}")
@@ -1028,16 +1320,56 @@ def start_game():
 @app.route('/api/get_dilemma', methods=['GET'])
 def get_dilemma():
     """Get a random ethical dilemma with image"""
-    # Try Gemini first, then predefined
+    # Gemini en vivo si la política y el limitador lo permiten; si no (o si falla),
+    # un dilema IA ya generado y, en último caso, uno predefinido
+    request_start = time.perf_counter()
+    game_id = request.args.get('game_id', type=int)
+    targeted = DILEMMA_SELECTION != 'random'
+    metrics = get_selection_metrics(game_id) if targeted else None
     ai_dilemma = None
+    dilemma = None
+    source = serving_policy.PREDEFINED
+    preferred = None
+    arm = None
     
-    # Intentar con Gemini
-    if GOOGLE_API_KEY:
+    ai_available = bool(GOOGLE_API_KEY) or job_queue is not None
+    
+    if bandit_scheduler is not None:
+        # El bandit elige el brazo: generar en vivo o un dilema concreto (IA cacheado o predefinido)
+        arm, chosen = choose_bandit_dilemma(include_live=ai_available)
+        preferred = serving_policy.LIVE if arm == bandit.LIVE_ARM else None
+    elif job_queue is not None:
+        preferred = serving_policy.LIVE
+    elif GOOGLE_API_KEY:
+        preferred = dilemma_policy.choose() if AI_SERVING_POLICY == 'adaptive' else serving_policy.LIVE
+    
+    if preferred == serving_policy.LIVE and job_queue is not None:
+        # Con la cola de trabajos un worker genera el dilema; esta petición sirve del pool
+        enqueue_dilemma_generation(game_id)
+        preferred = serving_policy.CACHE if bandit_scheduler is None else None
+    elif preferred == serving_policy.LIVE and admit_ai_request(game_id):
+        live_start = time.perf_counter()
         ai_dilemma = generate_dilemma_with_gemini()
+        dilemma_policy.record_live(time.perf_counter() - live_start, ai_dilemma is not None)
+    
+    if ai_dilemma:
+        source = serving_policy.LIVE
+    elif bandit_scheduler is not None:
+        if arm == bandit.LIVE_ARM:
+            arm, chosen = choose_bandit_dilemma(include_live=False)
+        if bandit.is_ai_arm(arm):
+            ai_dilemma = chosen
+            source = serving_policy.CACHE
+        else:
+            dilemma = chosen
+    elif ai_available:
+        ai_dilemma = select_dilemma(dilemma_index.AI, metrics) if targeted else get_random_cached_dilemma()
+        source = serving_policy.CACHE if ai_dilemma else serving_policy.PREDEFINED
     
     if ai_dilemma:
         dilemma = ai_dilemma
-        dilemma['id'] = random.randint(1000, 9999)  # Assign random ID for AI dilemmas
+        # Id estable: las decisiones del mismo dilema IA se agregan juntas en los rollups
+        dilemma['id'] = ai_dilemma_id(dilemma.pop('cache_id', None))
         if 'category' not in dilemma:
             dilemma['category'] = 'general'
         
@@ -1050,15 +1382,31 @@ def get_dilemma():
             dilemma['image_url'] = get_dilemma_image(scenario, dilemma.get('category', 'general'))
     else:
         # Fallback to predefined dilemmas
-        dilemma = random.choice(PREDEFINED_DILEMMAS).copy()
+        if dilemma is not None:
+            pass
+        elif targeted:
+            dilemma = select_dilemma(dilemma_index.PREDEFINED, metrics)
+        else:
+            dilemma = random.choice(PREDEFINED_DILEMMAS).copy()
         # Obtener imagen para dilema predefinido
         scenario = dilemma.get('scenario', '')
         category = dilemma.get('category', 'general')
         dilemma['image_url'] = get_dilemma_image(scenario, category)
     
+    if IMAGE_PROXY:
+        dilemma['image_srcset'] = image_proxy.srcset(dilemma['image_url'])
+        dilemma['image_url'] = public_image_url(dilemma['image_url'])
+    
+    elapsed = time.perf_counter() - request_start
+    dilemma_policy.record_served(source, elapsed, fallback=preferred is not None and source != preferred)
+    if bandit_scheduler is not None:
+        bandit_scheduler.observe_latency(arm, elapsed)
+        if game_id:
+            bandit_scheduler.served(game_id, dilemma['id'], arm)
     return jsonify(dilemma)
 
 @app.route('/api/make_decision', methods=['POST'])
+@idempotent
 def make_decision():
     """Record a player's decision and provide AI analysis"""
     try:
@@ -1078,59 +1426,26 @@ def make_decision():
         if not all([game_id, dilemma_id, dilemma_text, chosen_option, ethical_framework]):
             return jsonify({'status': 'error', 'message': 'Faltan datos requeridos'}), 400
         
-        # Generar análisis con IA (no bloquea si falla)
-        analysis = None
-        if full_dilemma and GOOGLE_API_KEY:
+        if bandit_scheduler is not None:
+            bandit_scheduler.answered(game_id, dilemma_id)
+        
+        # Primero un análisis precalculado; si no hay, generarlo con IA (no bloquea si falla)
+        scenario_text = full_dilemma.get('scenario') if isinstance(full_dilemma, dict) else dilemma_text
+        analysis = get_warm_analysis(scenario_text, chosen_option, ethical_framework)
+        if analysis is None and full_dilemma and job_queue is not None:
+            analysis = queued_analysis(full_dilemma, chosen_option, ethical_framework, game_id)
+        elif analysis is None and full_dilemma and GOOGLE_API_KEY:
             try:
-                analysis = analyze_decision_with_ai(full_dilemma, chosen_option, ethical_framework)
+                analysis = analyze_decision_with_ai(full_dilemma, chosen_option, ethical_framework, game_id)
             except Exception as e:
                 print(f"⚠️ Error generando análisis con IA: {e}")
                 # Continuar sin análisis si falla
         
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        
-        # Verificar que las columnas existan antes de insertar
-        cursor.execute('PRAGMA table_info(decisions)')
-        existing_columns = [col[1] for col in cursor.fetchall()]
-        
-        # Construir query según columnas disponibles
-        if 'dilemma_category' in existing_columns and 'analysis' in existing_columns:
-            cursor.execute(
-                '''INSERT INTO decisions (game_id, dilemma_id, dilemma_text, dilemma_category, chosen_option, ethical_framework, analysis) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                (game_id, dilemma_id, dilemma_text, dilemma_category, chosen_option, ethical_framework, analysis)
-            )
-        elif 'dilemma_category' in existing_columns:
-            cursor.execute(
-                '''INSERT INTO decisions (game_id, dilemma_id, dilemma_text, dilemma_category, chosen_option, ethical_framework) 
-                   VALUES (?, ?, ?, ?, ?, ?)''',
-                (game_id, dilemma_id, dilemma_text, dilemma_category, chosen_option, ethical_framework)
-            )
-        else:
-            # Fallback a esquema antiguo
-            cursor.execute(
-                '''INSERT INTO decisions (game_id, dilemma_id, dilemma_text, chosen_option, ethical_framework) 
-                   VALUES (?, ?, ?, ?, ?)''',
-                (game_id, dilemma_id, dilemma_text, chosen_option, ethical_framework)
-            )
-        
-        # Actualizar contador de dilemas respondidos (si la columna existe)
-        cursor.execute('PRAGMA table_info(games)')
-        existing_columns_games = [col[1] for col in cursor.fetchall()]
-        if 'dilemmas_answered' in existing_columns_games:
-            cursor.execute(
-                'UPDATE games SET dilemmas_answered = dilemmas_answered + 1 WHERE id = ?',
-                (game_id,)
-            )
-        
-        # Obtener nombre del jugador para verificar logros
-        cursor.execute('SELECT player_name FROM games WHERE id = ?', (game_id,))
-        player_result = cursor.fetchone()
-        player_name = player_result[0] if player_result else None
-        
-        conn.commit()
-        conn.close()
+        # Guardar decisión y obtener nombre del jugador para verificar logros
+        player_name = record_decision(
+            game_id, dilemma_id, dilemma_text, dilemma_category,
+            chosen_option, ethical_framework, analysis
+        )
         
         # Verificar y desbloquear logros (no bloquea si falla)
         newly_unlocked = []
@@ -1146,61 +1461,24 @@ def make_decision():
         return jsonify({
             'status': 'success',
             'analysis': analysis,
-            'ethical_framework_image': ethical_image_url,
+            'ethical_framework_image': public_image_url(ethical_image_url, 320),
             'newly_unlocked_achievements': newly_unlocked
         })
         
     except sqlite3.Error as e:
         print(f"❌ Error de base de datos: {e}")
-        if 'conn' in locals():
-            conn.rollback()
-            conn.close()
         return jsonify({'status': 'error', 'message': f'Error de base de datos: {str(e)}'}), 500
     except Exception as e:
         print(f"❌ Error inesperado en make_decision: {e}")
         import traceback
         traceback.print_exc()
-        if 'conn' in locals():
-            conn.rollback()
-            conn.close()
         return jsonify({'status': 'error', 'message': f'Error al registrar la decisión: {str(e)}'}), 500
 
 @app.route('/api/get_stats/<int:game_id>', methods=['GET'])
 def get_stats(game_id):
     """Get game statistics with enhanced metrics"""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    
-    # Estadísticas de marcos éticos
-    cursor.execute(
-        'SELECT ethical_framework, COUNT(*) as count FROM decisions WHERE game_id = ? GROUP BY ethical_framework',
-        (game_id,)
-    )
-    framework_stats = dict(cursor.fetchall())
-    
-    # Estadísticas por categoría
-    cursor.execute(
-        'SELECT dilemma_category, COUNT(*) as count FROM decisions WHERE game_id = ? GROUP BY dilemma_category',
-        (game_id,)
-    )
-    category_stats = dict(cursor.fetchall())
-    
-    # Total de decisiones
-    cursor.execute(
-        'SELECT COUNT(*) FROM decisions WHERE game_id = ?',
-        (game_id,)
-    )
-    total_decisions = cursor.fetchone()[0]
-    
-    # Información del juego
-    cursor.execute(
-        'SELECT player_name, dilemmas_answered FROM games WHERE id = ?',
-        (game_id,)
-    )
-    game_info = cursor.fetchone()
-    player_name = game_info[0] if game_info else None
-    
-    conn.close()
+    stats = game_sessions.game_stats(game_id) if game_sessions is not None else repository.get_game_stats(game_id)
+    player_name = stats['player_name']
     
     # Verificar logros una vez más al ver estadísticas (por si acaso)
     if player_name:
@@ -1210,43 +1488,222 @@ def get_stats(game_id):
             print(f"⚠️ Error verificando logros en stats: {e}")
     
     return jsonify({
-        'framework_stats': framework_stats,
-        'category_stats': category_stats,
-        'total_decisions': total_decisions,
+        'framework_stats': stats['framework_stats'],
+        'category_stats': stats['category_stats'],
+        'total_decisions': stats['total_decisions'],
         'player_name': player_name if player_name else 'Unknown',
-        'dilemmas_answered': game_info[1] if game_info else 0
+        'dilemmas_answered': stats['dilemmas_answered']
     })
 
+def release_games(game_ids):
+    """Libera el estado en memoria de partidas terminadas (sesión y seguimiento del bandit)"""
+    for game_id in game_ids:
+        if game_sessions is not None:
+            game_sessions.end(game_id)
+        if bandit_scheduler is not None:
+            bandit_scheduler.finished(game_id)
+
 @app.route('/api/end_game', methods=['POST'])
 def end_game():
     """End the current game session"""
     data = request.get_json()
     game_id = data.get('game_id')
     
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    cursor.execute(
-        'UPDATE games SET end_time = ? WHERE id = ?',
-        (datetime.now(), game_id)
-    )
-    conn.commit()
-    conn.close()
+    repository.end_game(game_id)
+    release_games([game_id])
     
     return jsonify({'status': 'success'})
 
 @app.route('/api/get_achievements/<player_name>', methods=['GET'])
 def get_achievements(player_name):
-    """Get all achievements for a player"""
+    """Get all achievements for a player.
+
+    Con ?since=YYYY-MM-DD HH:MM:SS[&after_id=N] (modo delta) devuelve solo los códigos
+    desbloqueados después de ese cursor y `as_of`/`as_of_id` para la siguiente consulta,
+    sin el catálogo completo.
+    """
     try:
+        since = request.args.get('since')
+        if since:
+            try:
+                since = datetime.fromisoformat(since).strftime('%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'Invalid since timestamp'}), 400
+            after_id = request.args.get('after_id', 0, type=int)
+            codes, unlocked_count, as_of, as_of_id = repository.get_unlocked_since(player_name, since, after_id)
+            return jsonify({
+                'unlocked_codes': codes,
+                'unlocked_count': unlocked_count,
+                'total': len(ACHIEVEMENTS),
+                'as_of': as_of,
+                'as_of_id': as_of_id
+            })
+
         achievements_data = get_player_achievements(player_name)
         return jsonify(achievements_data)
     except Exception as e:
         print(f"❌ Error obteniendo logros: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+# ==================== ANALÍTICA GLOBAL ====================
+# Vistas globales servidas desde tablas de rollup (ver analytics.py); cada respuesta
+# incluye refreshed_at con el momento del último refresco.
+
+@app.route('/api/get_leaderboard', methods=['GET'])
+def get_leaderboard():
+    """Get top players by number of decisions"""
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    try:
+        return jsonify(analytics.get_leaderboard(repository, limit))
+    except Exception as e:
+        print(f"❌ Error obteniendo ranking: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/get_dilemma_frameworks', methods=['GET'])
+def get_dilemma_frameworks():
+    """Get the framework distribution and most-chosen framework per dilemma"""
+    try:
+        return jsonify(analytics.get_dilemma_frameworks(repository))
+    except Exception as e:
+        print(f"❌ Error obteniendo marcos por dilema: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/get_category_frameworks', methods=['GET'])
+def get_category_frameworks():
+    """Get the framework distribution per dilemma category"""
+    try:
+        return jsonify(analytics.get_category_frameworks(repository))
+    except Exception as e:
+        print(f"❌ Error obteniendo marcos por categoría: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# Perfiles éticos vectorizados (profiles.py): NumPy se importa en el primer uso
+PROFILE_REFRESH_SECONDS = float(os.getenv('PROFILE_REFRESH_SECONDS', '5'))
+_profile_engine = None
+_profile_refreshed_at = 0.0
+_profile_lock = threading.Lock()
+
+def get_profile_engine():
+    """Motor de perfiles con las decisiones nuevas incorporadas (como mucho cada PROFILE_REFRESH_SECONDS)"""
+    global _profile_engine, _profile_refreshed_at
+    with _profile_lock:
+        if _profile_engine is None:
+            import profiles
+            _profile_engine = profiles.ProfileEngine()
+        if time.monotonic() - _profile_refreshed_at >= PROFILE_REFRESH_SECONDS:
+            _profile_engine.refresh(repository)
+            _profile_refreshed_at = time.monotonic()
+    return _profile_engine
+
+@app.route('/api/get_player_profile/<player_name>', methods=['GET'])
+def get_player_profile(player_name):
+    """Perfil ético del jugador, su percentil por marco y los jugadores más parecidos"""
+    k = max(1, min(request.args.get('k', 5, type=int), 50))
+    min_decisions = max(1, request.args.get('min_decisions', 1, type=int))
+    try:
+        engine = get_profile_engine()
+        profile = engine.profile(player_name)
+        if profile is None:
+            return jsonify({'status': 'error', 'message': 'Jugador sin decisiones'}), 404
+        profile['similar_players'] = engine.similar(player_name, k, min_decisions)
+        profile['players'] = engine.size
+        return jsonify(profile)
+    except Exception as e:
+        print(f"❌ Error obteniendo perfil del jugador: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# ==================== FIN ANALÍTICA GLOBAL ====================
+
+# ==================== EXPORTACIÓN ====================
+
+@app.route('/api/export_decisions', methods=['GET'])
+def export_decisions():
+    """Stream decisions joined with games as NDJSON or CSV"""
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in export_data.EXPORT_FORMATS:
+        return jsonify({'status': 'error', 'message': 'Formato no soportado (ndjson o csv)'}), 400
+    try:
+        since_ids = export_data.parse_since_ids(request.args.get('since_id'))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'since_id inválido'}), 400
+    
+    rows = repository.iter_decision_export(since_ids, request.args.get('since'))
+    # Respuesta en streaming (chunked): se envía bloque a bloque mientras se lee
+    return Response(
+        stream_with_context(export_data.iter_export(rows, export_format)),
+        mimetype=export_data.EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename=decisions.{export_format}'}
+    )
+
+# ==================== FIN EXPORTACIÓN ====================
+
+# ==================== PROXY DE IMÁGENES ====================
+
+@app.route('/img/<image_id>', methods=['GET'])
+def proxy_image(image_id):
+    """Variante redimensionada de una imagen precargada (ETag fuerte, cache inmutable)"""
+    width = image_proxy.snap_width(request.args.get('w', type=int))
+    try:
+        variant = image_proxy.get_variant(image_id, width)
+    except Exception as e:
+        print(f"⚠️ Error generando variante de imagen: {e}")
+        variant = None
+    if variant is None:
+        if not image_proxy.is_valid_image_id(image_id):
+            return jsonify({'status': 'error', 'message': 'Image not found'}), 404
+        return redirect(image_proxy.remote_url(image_id, request.args.get('w', type=int)))
+
+    path, etag = variant
+    # La URL identifica contenido fijo (id de foto + ancho): se puede cachear un año
+    response = send_file(path, mimetype='image/jpeg', etag=etag, max_age=31536000, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+# ==================== FIN PROXY DE IMÁGENES ====================
+
+# ==================== PERFILADO DE CONSULTAS ====================
+
+if QUERY_PROFILE:
+    @app.before_request
+    def profile_queries_start():
+        """Atribuye las sentencias SQL de la petición a su endpoint"""
+        query_profiler.profiler.set_endpoint(request.endpoint)
+
+    @app.teardown_request
+    def profile_queries_end(exc=None):
+        query_profiler.profiler.set_endpoint(None)
+
+    @app.route('/api/debug/query_profile', methods=['GET'])
+    def get_query_profile():
+        """Sentencias por endpoint: recuento y tiempo total/medio/máximo (?endpoint=, ?reset=1)"""
+        report = query_profiler.profiler.report(request.args.get('endpoint'))
+        if request.args.get('reset') == '1':
+            query_profiler.profiler.reset()
+        return jsonify(report)
+
+    # Volcado al terminar el proceso (útil con benchmarks y simulaciones)
+    if os.getenv('QUERY_PROFILE_FILE'):
+        atexit.register(query_profiler.profiler.dump, os.getenv('QUERY_PROFILE_FILE'))
+
+# ==================== FIN PERFILADO DE CONSULTAS ====================
+
 try:
-    init_db()
-    print(f"✅ Database initialized at: {DATABASE}")
+    if init_db():
+        print(f"✅ Database initialized at: {DATABASE}")
+    else:
+        print(f"✅ Database schema up to date at: {DATABASE}")
+    if ANALYTICS_REFRESH_SECONDS > 0:
+        analytics.start_refresher(repository, ANALYTICS_REFRESH_SECONDS)
+    if MAINTENANCE_INTERVAL_SECONDS > 0:
+        maintenance.start_scheduler(repository, MAINTENANCE_INTERVAL_SECONDS)
+    if GAME_REAPER_INTERVAL_SECONDS > 0:
+        maintenance.start_reaper(repository, GAME_REAPER_INTERVAL_SECONDS, GAME_IDLE_MINUTES, release_games)
+    if bandit_scheduler is not None:
+        bandit_scheduler.load(repository)
+        if BANDIT_PERSIST_SECONDS > 0:
+            bandit.start_persister(bandit_scheduler, repository, BANDIT_PERSIST_SECONDS)
+        atexit.register(bandit_scheduler.save, repository)
 except Exception as _e:
     print(f"⚠️ init_db warning: {_e}")
 
@@ -1257,15 +1714,19 @@ if __name__ == '__main__':
     print(f"📚 Predefined dilemmas: {len(PREDEFINED_DILEMMAS)}")
     
     # Calcular logros retroactivamente para jugadores existentes
-    print("🏆 Calculando logros retroactivos...")
-    try:
-        total_unlocked = calculate_retroactive_achievements()
-        if total_unlocked > 0:
-            print(f"✅ {total_unlocked} logros desbloqueados retroactivamente")
-        else:
-            print("✅ No hay logros nuevos para desbloquear")
-    except Exception as e:
-        print(f"⚠️ Error calculando logros retroactivos: {e}")
+    if job_queue is not None:
+        job_queue.enqueue('retroactive_achievements', dedupe_key=f"retroactive_achievements:{datetime.now():%Y-%m-%d}")
+        print("🏆 Logros retroactivos encolados para los workers")
+    else:
+        print("🏆 Calculando logros retroactivos...")
+        try:
+            total_unlocked = calculate_retroactive_achievements()
+            if total_unlocked > 0:
+                print(f"✅ {total_unlocked} logros desbloqueados retroactivamente")
+            else:
+                print("✅ No hay logros nuevos para desbloquear")
+        except Exception as e:
+            print(f"⚠️ Error calculando logros retroactivos: {e}")
     
     print("🚀 Server running on http://localhost:5000")
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Planificador de dilemas como multi-armed bandit (Thompson sampling)
+Cada origen posible es un brazo: generar en vivo con Gemini ('live'), cada dilema
+predefinido ('predefined:<id>') y cada dilema IA cacheado ('ai:<id de la cache>').
+
+Recompensa (compromiso): 1 si el jugador responde el dilema y sigue jugando (llega a
+responder el siguiente), 0 si lo salta, abandona o termina la partida tras él. Es la
+misma señal que se puede reconstruir de la tabla decisions, lo que permite comparar
+políticas offline con replay. Esa comparación es sesgada (ver replay_evaluate): sirve
+como comprobación de cordura, no como estimación de la mejora.
+
+Objetivo de cada brazo: muestra Beta(1 + éxitos, 1 + fallos) - coste - peso x latencia
+(solo 'live' tiene coste; la latencia es una media móvil exponencial por brazo).
+Cada evento actualiza un brazo en O(1). El estado se guarda periódicamente sumando a
+la tabla bandit_arms los incrementos de cada worker, así varios procesos no se pisan.
+
+Uso:
+    python bandit.py --replay     # replay (sesgado) de la política con las decisiones históricas
+    python bandit.py --show 20    # brazos con mayor tasa de compromiso
+"""
+import argparse
+import contextlib
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+LIVE_ARM = 'live'
+
+BANDIT_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS bandit_arms (
+        arm TEXT PRIMARY KEY,
+        successes REAL NOT NULL DEFAULT 0,
+        failures REAL NOT NULL DEFAULT 0,
+        latency_ms REAL
+    )
+    ''',
+]
+
+
+def predefined_arm(dilemma_id):
+    return f'predefined:{dilemma_id}'
+
+
+def ai_arm(cache_id):
+    return f'ai:{cache_id}'
+
+
+def is_ai_arm(arm):
+    return bool(arm) and arm.startswith('ai:')
+
+
+def init_tables(repository):
+    """Crea bandit_arms junto a los logs y los rollups"""
+    with repository.logs() as conn:
+        cursor = conn.cursor()
+        for statement in BANDIT_TABLES:
+            repository.execute(cursor, statement)
+
+
+class BanditScheduler:
+    """Estado de los brazos y seguimiento de los dilemas servidos por partida"""
+
+    def __init__(self, live_cost=0.3, latency_weight=0.2, pending_ttl=1800, latency_alpha=0.2, rng=None):
+        self.live_cost = live_cost
+        self.latency_weight = latency_weight
+        self.pending_ttl = pending_ttl
+        self.latency_alpha = latency_alpha
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._arms = {}      # brazo -> [éxitos, fallos, latencia en s o None]
+        self._deltas = {}    # brazo -> [éxitos, fallos] aún no guardados
+        # partida -> [instante, (dilema servido sin responder, brazo) o None, brazo respondido esperando continuación]
+        self._games = OrderedDict()
+
+    # ---------- Selección ----------
+
+    def score(self, arm):
+        successes, failures, latency = self._arms.get(arm, (0.0, 0.0, None))
+        sample = self.rng.betavariate(1.0 + successes, 1.0 + failures)
+        cost = self.live_cost if arm == LIVE_ARM else 0.0
+        return sample - cost - self.latency_weight * (latency or 0.0)
+
+    def choose(self, arms):
+        """Brazo con mayor objetivo muestreado entre los candidatos (None si no hay)"""
+        best, best_score = None, float('-inf')
+        for arm in arms:
+            value = self.score(arm)
+            if value > best_score:
+                best, best_score = arm, value
+        return best
+
+    # ---------- Eventos (O(1) cada uno) ----------
+
+    def _reward(self, arm, value):
+        stats = self._arms.setdefault(arm, [0.0, 0.0, None])
+        delta = self._deltas.setdefault(arm, [0.0, 0.0])
+        stats[0] += value
+        stats[1] += 1 - value
+        delta[0] += value
+        delta[1] += 1 - value
+
+    def _game(self, game_id, now):
+        state = self._games.get(game_id)
+        if state is None:
+            state = self._games[game_id] = [now, None, None]
+        else:
+            self._games.move_to_end(game_id)
+            state[0] = now
+        # Las partidas inactivas más antiguas están al principio: se cierran con recompensa 0
+        while self._games:
+            oldest = next(iter(self._games.values()))
+            if now - oldest[0] < self.pending_ttl:
+                break
+            self._games.popitem(last=False)
+            self._close(oldest)
+        return state
+
+    def _close(self, state):
+        if state[1] is not None:
+            self._reward(state[1][1], 0.0)
+        if state[2] is not None:
+            self._reward(state[2], 0.0)
+        state[1] = state[2] = None
+
+    def update(self, arm, reward):
+        """Recompensa directa de un brazo (evaluación offline)"""
+        with self._lock:
+            self._reward(arm, reward)
+
+    def observe_latency(self, arm, seconds):
+        with self._lock:
+            stats = self._arms.setdefault(arm, [0.0, 0.0, None])
+            stats[2] = seconds if stats[2] is None else stats[2] + self.latency_alpha * (seconds - stats[2])
+
+    def served(self, game_id, dilemma_id, arm):
+        """Se ha servido un dilema; si el anterior de la partida no se respondió, cuenta como 0"""
+        with self._lock:
+            state = self._game(game_id, time.monotonic())
+            if state[1] is not None:
+                self._reward(state[1][1], 0.0)
+            state[1] = (dilemma_id, arm)
+
+    def answered(self, game_id, dilemma_id):
+        """El jugador respondió: el dilema respondido antes en la partida recibe 1 (siguió jugando)"""
+        with self._lock:
+            state = self._games.get(game_id)
+            if state is None or state[1] is None or state[1][0] != dilemma_id:
+                return
+            state = self._game(game_id, time.monotonic())
+            if state[2] is not None:
+                self._reward(state[2], 1.0)
+            state[2] = state[1][1]
+            state[1] = None
+
+    def finished(self, game_id):
+        """Fin de partida: el último dilema (tras el que abandonó) y el pendiente reciben 0"""
+        with self._lock:
+            state = self._games.pop(game_id, None)
+            if state is not None:
+                self._close(state)
+
+    # ---------- Persistencia ----------
+
+    def load(self, repository):
+        """Carga el estado guardado (suma lo aún no guardado de este proceso)"""
+        with repository.logs() as conn:
+            rows = repository.execute(conn.cursor(),
+                                      'SELECT arm, successes, failures, latency_ms FROM bandit_arms').fetchall()
+        with self._lock:
+            for arm, successes, failures, latency_ms in rows:
+                delta = self._deltas.get(arm, (0.0, 0.0))
+                latency = self._arms.get(arm, (0, 0, None))[2]
+                if latency is None and latency_ms is not None:
+                    latency = latency_ms / 1000
+                self._arms[arm] = [successes + delta[0], failures + delta[1], latency]
+        return len(rows)
+
+    def save(self, repository):
+        """Suma a bandit_arms los incrementos desde el último guardado y recarga el total"""
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+            latencies = {arm: stats[2] for arm, stats in self._arms.items() if stats[2] is not None}
+        try:
+            with repository.logs() as conn:
+                cursor = conn.cursor()
+                for arm in set(deltas) | set(latencies):
+                    successes, failures = deltas.get(arm, (0.0, 0.0))
+                    latency_ms = latencies[arm] * 1000 if arm in latencies else None
+                    repository.execute(cursor, '''
+                        INSERT INTO bandit_arms (arm, successes, failures, latency_ms) VALUES (?, ?, ?, ?)
+                        ON CONFLICT (arm) DO UPDATE SET
+                            successes = bandit_arms.successes + excluded.successes,
+                            failures = bandit_arms.failures + excluded.failures,
+                            latency_ms = COALESCE(excluded.latency_ms, bandit_arms.latency_ms)
+                    ''', (arm, successes, failures, latency_ms))
+        except Exception:
+            # No perder los incrementos si la escritura falla: se reintentan en el siguiente guardado
+            with self._lock:
+                for arm, (successes, failures) in deltas.items():
+                    delta = self._deltas.setdefault(arm, [0.0, 0.0])
+                    delta[0] += successes
+                    delta[1] += failures
+            raise
+        self.load(repository)
+        return len(deltas)
+
+    def stats(self, limit=20):
+        with self._lock:
+            arms = [(arm, s, f, latency) for arm, (s, f, latency) in self._arms.items()]
+            pending = len(self._games)
+        arms.sort(key=lambda item: (item[1] + 1) / (item[1] + item[2] + 2), reverse=True)
+        return {
+            'arms': len(arms),
+            'games_tracked': pending,
+            'live_cost': self.live_cost,
+            'latency_weight': self.latency_weight,
+            'top_arms': [{
+                'arm': arm,
+                'engagement': round((s + 1) / (s + f + 2), 4),
+                'observations': int(s + f),
+                'latency_ms': round(latency * 1000, 1) if latency is not None else None
+            } for arm, s, f, latency in arms[:limit]]
+        }
+
+
+def start_persister(scheduler, repository, interval):
+    """Guarda el estado del bandit cada `interval` segundos en un hilo daemon"""
+    def _loop():
+        while True:
+            time.sleep(interval)
+            try:
+                scheduler.save(repository)
+            except Exception as e:
+                print(f"⚠️ Error guardando el estado del bandit: {e}")
+
+    thread = threading.Thread(target=_loop, name='bandit-persister', daemon=True)
+    thread.start()
+    return thread
+
+
+# ==================== EVALUACIÓN OFFLINE ====================
+
+def historical_events(repository, predefined_scenarios):
+    """Decisiones históricas como eventos (brazo, recompensa) en orden global.
+
+    Un dilema IA se atribuye a 'live' la primera vez que aparece (se generó entonces) y a
+    su brazo de cache las siguientes. La última decisión de cada partida vale 0.
+    """
+    cache_ids = {}
+    with repository.logs() as conn:
+        for cache_id, scenario in repository.execute(conn.cursor(),
+                                                     'SELECT id, dilemma_text FROM ai_dilemmas_cache').fetchall():
+            cache_ids[scenario] = cache_id
+
+    events = []
+    for index in range(repository.source_count()):
+        with repository.source(index) as conn:
+            rows = repository.execute(conn.cursor(), '''
+                SELECT timestamp, id, game_id, dilemma_text FROM decisions ORDER BY game_id, id
+            ''').fetchall()
+        for position, (timestamp, decision_id, game_id, text) in enumerate(rows):
+            last_of_game = position + 1 == len(rows) or rows[position + 1][2] != game_id
+            if text in predefined_scenarios:
+                arm = predefined_arm(predefined_scenarios[text])
+            elif text in cache_ids:
+                arm = ai_arm(cache_ids[text])
+            else:
+                continue
+            events.append((str(timestamp), index, decision_id, arm, 0.0 if last_of_game else 1.0))
+    events.sort()
+
+    seen_ai = set()
+    replay = []
+    for _, _, _, arm, reward in events:
+        if is_ai_arm(arm) and arm not in seen_ai:
+            seen_ai.add(arm)
+            replay.append((LIVE_ARM, reward))
+        else:
+            replay.append((arm, reward))
+    return replay
+
+
+def replay_evaluate(events, scheduler, base_arms):
+    """Replay (Li et al.): solo cuentan los eventos en los que la política elige el brazo registrado.
+
+    El replay solo es insesgado si las acciones registradas salieron de una política
+    uniformemente aleatoria. Las decisiones históricas las sirvió el planificador
+    random/policy (con el pool y los límites de cada momento) y no guardan la
+    probabilidad de cada servicio, así que no se puede corregir con IPS: la cifra está
+    sesgada y no debe usarse como estimación de la mejora (`biased` lo indica).
+
+    Los candidatos son los brazos base más los dilemas IA ya vistos hasta ese momento.
+    Devuelve eventos, coincidencias y recompensa media de la política y del registro.
+    """
+    candidates = list(base_arms)
+    known = set(candidates)
+    matched, policy_reward, logged_reward = 0, 0.0, 0.0
+    for arm, reward in events:
+        logged_reward += reward
+        if arm not in known:
+            known.add(arm)
+            candidates.append(arm)
+        if scheduler.choose(candidates) == arm:
+            matched += 1
+            policy_reward += reward
+            scheduler.update(arm, reward)
+    return {
+        'events': len(events),
+        'matched': matched,
+        'policy_engagement': round(policy_reward / matched, 4) if matched else None,
+        'logged_engagement': round(logged_reward / len(events), 4) if events else None,
+        'biased': True
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bandit de dilemas: evaluación offline y estado')
+    parser.add_argument('--replay', action='store_true',
+                        help='Replay de la política con las decisiones históricas (sesgado, no estima la mejora)')
+    parser.add_argument('--show', type=int, metavar='N', help='Mostrar los N brazos con más compromiso')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if not args.replay and not args.show:
+        parser.print_help()
+        return
+
+    with contextlib.redirect_stdout(sys.stderr):
+        import app
+    if args.show:
+        scheduler = BanditScheduler()
+        scheduler.load(app.repository)
+        for arm in scheduler.stats(args.show)['top_arms']:
+            print(f"{arm['arm']:<24} compromiso {arm['engagement']:.3f}  "
+                  f"observaciones {arm['observations']:>6}  latencia {arm['latency_ms']} ms")
+    if args.replay:
+        scenarios = {dilemma['scenario']: dilemma['id'] for dilemma in app.PREDEFINED_DILEMMAS}
+        events = historical_events(app.repository, scenarios)
+        base_arms = [LIVE_ARM] + [predefined_arm(dilemma['id']) for dilemma in app.PREDEFINED_DILEMMAS]
+        scheduler = BanditScheduler(app.BANDIT_LIVE_COST, app.BANDIT_LATENCY_WEIGHT, rng=random.Random(args.seed))
+        result = replay_evaluate(events, scheduler, base_arms)
+        print(f"[OK] {result['events']} eventos, {result['matched']} coincidencias: "
+              f"compromiso de la política {result['policy_engagement']} "
+              f"vs registrado {result['logged_engagement']}")
+        print("[WARN] Estimación sesgada: el registro no viene de una política uniforme ni guarda "
+              "propensiones; no usar como estimación de la mejora")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark de escritura agrupada: decisiones/s y commits/s con y sin group commit
+Lanza ráfagas de record_decision desde varios hilos contra una base SQLite temporal,
+primero en modo directo (un commit por decisión) y después con
+group_commit.GroupCommitWriter (un commit por grupo).
+
+Uso:
+    python bench_group_commit.py [--decisions 3000] [--concurrency 32]
+                                 [--max-delay-ms 5] [--max-rows 64] [--storage-mode single]
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import group_commit
+from serving_policy import percentile
+from storage import SQLiteRepository
+
+
+def run_mode(record, game_ids, decisions, concurrency):
+    """Graba `decisions` decisiones repartidas entre las partidas; devuelve segundos y latencias"""
+    def one(i):
+        start = time.perf_counter()
+        record(game_ids[i % len(game_ids)], i % 20 + 1, f'Dilema de benchmark #{i}', 'general',
+               'Opción A', 'utilitarianismo', None)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, range(decisions)))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de group commit de decisiones (SQLite)')
+    parser.add_argument('--decisions', type=int, default=3000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--max-delay-ms', type=float, default=5)
+    parser.add_argument('--max-rows', type=int, default=64)
+    parser.add_argument('--storage-mode', choices=['single', 'sharded'], default='single')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("BENCHMARK DE GROUP COMMIT")
+    print(f"decisiones={args.decisions} concurrencia={args.concurrency} "
+          f"ventana={args.max_delay_ms}ms grupo<={args.max_rows} almacenamiento={args.storage_mode}")
+    print("=" * 60)
+
+    results = {}
+    for label in ('directo', 'agrupado'):
+        # Base nueva en cada modo para comparar en igualdad de condiciones
+        database = os.path.join(tempfile.mkdtemp(prefix='bench_group_commit_'), 'ethical_game.db')
+        repository = SQLiteRepository(database, mode=args.storage_mode)
+        repository.init_schema([])
+        game_ids = [repository.create_game(f'player-{i}') for i in range(args.games)]
+
+        writer = None
+        record = repository.record_decision
+        if label == 'agrupado':
+            writer = group_commit.GroupCommitWriter(repository, args.max_delay_ms, args.max_rows)
+            record = writer.record_decision
+        seconds, latencies = run_mode(record, game_ids, args.decisions, args.concurrency)
+        commits = writer.stats()['groups'] if writer else args.decisions
+
+        with repository.all_gameplay() as conn:
+            stored = conn.execute('SELECT COUNT(*) FROM all_decisions').fetchone()[0]
+        results[label] = args.decisions / seconds
+        print(f"[{label:>8}] {args.decisions / seconds:8.0f} decisiones/s  {commits / seconds:7.0f} commits/s  "
+              f"p50 {percentile(latencies, 50) * 1000:6.1f} ms  p99 {percentile(latencies, 99) * 1000:6.1f} ms  "
+              f"guardadas {stored}")
+        if writer:
+            stats = writer.stats()
+            print(f"           grupos {stats['groups']}, tamaño medio {stats['avg_group_size']}, "
+                  f"máximo {stats['largest_group']}, reintentados {stats['retried_groups']}")
+        if stored != args.decisions:
+            print(f"[ERROR] se esperaban {args.decisions} decisiones en '{label}' y hay {stored}")
+            return
+
+    print("-" * 60)
+    print(f"[OK] group commit x{results['agrupado'] / results['directo']:.2f} decisiones/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark de hedging: latencia de analyze_decision_with_ai con y sin petición de respaldo
+Usa el Gemini simulado de simulate.py con una cola de latencia (una fracción de las
+llamadas tarda mucho más que la mediana) y compara p50/p90/p99 frente a las llamadas
+extra que añade el hedging.
+
+Uso:
+    python bench_hedging.py [--calls 2000] [--concurrency 8] [--latency-ms 80]
+                            [--tail-ms 800] [--tail-probability 0.05] [--budget 0.10]
+"""
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import hedging
+from simulate import FakeGemini
+from serving_policy import percentile
+
+
+def run_mode(app_module, fake, hedger, calls, concurrency, label):
+    """Lanza `calls` análisis distintos (sin aciertos de cache) y devuelve latencias y llamadas a Gemini"""
+    app_module.gemini_hedger = hedger
+    calls_before = fake.calls
+    dilemma = {'scenario': f'Benchmark de hedging ({label})'}
+
+    def one(i):
+        start = time.perf_counter()
+        app_module.analyze_decision_with_ai(dict(dilemma, scenario=f"{dilemma['scenario']} #{i}"),
+                                            'Opción A', 'utilitarianismo')
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, range(calls)))
+    # Las llamadas perdedoras terminan en segundo plano: esperar para contarlas
+    if hedger is not None:
+        time.sleep(fake.latency_ms / 1000 + fake.tail_ms * 10 / 1000)
+        hedger.shutdown()
+    return latencies, fake.calls - calls_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de hedging de Gemini (p99 vs llamadas extra)')
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=80)
+    parser.add_argument('--jitter-ms', type=float, default=15)
+    parser.add_argument('--tail-ms', type=float, default=800)
+    parser.add_argument('--tail-probability', type=float, default=0.05)
+    parser.add_argument('--budget', type=float, default=0.10)
+    parser.add_argument('--percentile', type=float, default=90)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='bench_hedging_'), 'ethical_game.db')
+    os.environ.update(ANALYTICS_REFRESH_SECONDS='0', MAINTENANCE_INTERVAL_SECONDS='0',
+                      AI_RATE_LIMIT_MODE='off', GOOGLE_API_KEY='')
+    with contextlib.redirect_stdout(sys.stderr):
+        import app as app_module
+
+    fake = FakeGemini(args.latency_ms, args.jitter_ms, args.tail_ms, args.tail_probability, seed=42)
+    app_module._genai = fake
+    app_module.GOOGLE_API_KEY = 'simulated'
+
+    print("=" * 60)
+    print("BENCHMARK DE HEDGING")
+    print(f"llamadas={args.calls} concurrencia={args.concurrency} latencia={args.latency_ms}ms "
+          f"cola={args.tail_ms}ms x {args.tail_probability:.0%} presupuesto={args.budget:.0%}")
+    print("=" * 60)
+
+    results = {}
+    for label, hedger in (('directo', None), ('hedging', hedging.Hedger(args.budget, args.percentile))):
+        latencies, gemini_calls = run_mode(app_module, fake, hedger, args.calls, args.concurrency, label)
+        p50, p90, p99 = (percentile(latencies, pct) * 1000 for pct in (50, 90, 99))
+        results[label] = (p99, gemini_calls)
+        print(f"[{label:>7}] p50 {p50:7.1f} ms  p90 {p90:7.1f} ms  p99 {p99:7.1f} ms  "
+              f"llamadas a Gemini {gemini_calls}")
+        if hedger is not None:
+            stats = hedger.stats()
+            print(f"          espera del respaldo {stats['delay_ms']} ms, respaldos {stats['hedges']} "
+                  f"(ganados {stats['hedge_wins']}, sin presupuesto {stats['hedges_skipped_budget']})")
+
+    print("-" * 60)
+    direct_p99, direct_calls = results['directo']
+    hedged_p99, hedged_calls = results['hedging']
+    print(f"[OK] p99 x{direct_p99 / hedged_p99:.2f} mejor con "
+          f"{(hedged_calls - direct_calls) / direct_calls:+.1%} llamadas a Gemini")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark de arranque en frío: tiempo de `import app` medido con python -X importtime
+Falla (código de salida 1) si se supera el presupuesto o si el SDK de Gemini se
+importa al arrancar en lugar de en el primer uso.
+
+Uso:
+    python bench_import.py [--budget-ms 300] [--runs 5]
+    python -m pytest tests/test_import_budget.py   # el mismo presupuesto como test
+"""
+import argparse
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+BUDGET_MS = 300
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+def measure_import(db_path):
+    """Importa app en un proceso nuevo y devuelve (ms acumulados de app, módulos importados)"""
+    env = dict(os.environ, DATABASE_PATH=db_path, ANALYTICS_REFRESH_SECONDS='0',
+               MAINTENANCE_INTERVAL_SECONDS='0', GOOGLE_API_KEY='fake-key')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=APP_DIR, env=env, capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            modules[match.group(4)] = int(match.group(2))
+    return modules['app'] / 1000, modules
+
+def run_benchmark(runs=5):
+    """(ms del primer arranque, mediana en ms con el esquema al día, módulos del SDK de Gemini importados)
+
+    También lo usa tests/test_import_budget.py, que hace cumplir el presupuesto en pytest.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='bench_import_')
+    db_path = os.path.join(tmp_dir, 'ethical_game.db')
+    try:
+        # Primer arranque: crea el esquema y compila los .pyc (no cuenta para el presupuesto)
+        first_ms, _ = measure_import(db_path)
+        timings = []
+        for _ in range(runs):
+            elapsed_ms, modules = measure_import(db_path)
+            timings.append(elapsed_ms)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    eager = sorted(name for name in modules if name.startswith('google.generativeai'))
+    return first_ms, statistics.median(timings), eager
+
+def main():
+    parser = argparse.ArgumentParser(description='Presupuesto de tiempo de importación de app.py')
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    first_ms, median_ms, eager = run_benchmark(args.runs)
+
+    print("=" * 60)
+    print("BENCHMARK DE ARRANQUE EN FRÍO (python -X importtime -c 'import app')")
+    print("=" * 60)
+    print(f"Primer arranque (creación de esquema): {first_ms:8.1f} ms")
+    print(f"Arranque con esquema al día (mediana): {median_ms:8.1f} ms")
+    print(f"Presupuesto:                           {args.budget_ms:8.1f} ms")
+
+    failed = False
+    if eager:
+        print(f"[ERROR] google.generativeai se importa al arrancar ({len(eager)} módulos)")
+        failed = True
+    if median_ms > args.budget_ms:
+        print("[ERROR] Presupuesto de importación superado")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("[OK] Arranque dentro del presupuesto")
+
+if __name__ == '__main__':
+    main()
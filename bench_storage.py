@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark de escritura concurrente: almacenamiento single vs sharded
+Lanza varios procesos (como workers de gunicorn) que registran decisiones a
+través de las rutas reales de la app y compara el throughput de escritura.
+
+Uso:
+    python bench_storage.py [--workers 8] [--decisions 50] [--shards 4]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+def _worker(mode, db_path, shard_count, worker_id, decisions, barrier, results):
+    """Juega una partida completa con el cliente de pruebas de Flask"""
+    os.environ['DATABASE_PATH'] = db_path
+    os.environ['STORAGE_MODE'] = mode
+    os.environ['SHARD_COUNT'] = str(shard_count)
+    os.environ['GOOGLE_API_KEY'] = ''
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+
+    client = app_module.app.test_client()
+    response = client.post('/api/start_game', json={'player_name': f'bench-player-{worker_id}'})
+    game_id = response.get_json()['game_id']
+
+    # Medir solo las escrituras: todos los workers arrancan a la vez tras importar la app
+    barrier.wait()
+    start = time.perf_counter()
+    errors = 0
+    for i in range(decisions):
+        dilemma = app_module.PREDEFINED_DILEMMAS[i % len(app_module.PREDEFINED_DILEMMAS)]
+        option = dilemma['options'][i % 2]
+        response = client.post('/api/make_decision', json={
+            'game_id': game_id,
+            'dilemma_id': dilemma['id'],
+            'dilemma_text': dilemma['scenario'],
+            'dilemma_category': dilemma['category'],
+            'chosen_option': option['text'],
+            'ethical_framework': option['ethical_value'],
+        })
+        if response.status_code != 200:
+            errors += 1
+    results.put((start, time.perf_counter(), errors))
+
+def run_mode(mode, workers, decisions, shard_count):
+    """Ejecuta el benchmark para un modo de almacenamiento y devuelve (decisiones/s, errores)"""
+    tmp_dir = tempfile.mkdtemp(prefix=f'bench_{mode}_')
+    db_path = os.path.join(tmp_dir, 'ethical_game.db')
+    try:
+        ctx = multiprocessing.get_context('spawn')
+        results = ctx.Queue()
+        barrier = ctx.Barrier(workers)
+        processes = [
+            ctx.Process(target=_worker, args=(mode, db_path, shard_count, i, decisions, barrier, results))
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        timings = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        elapsed = max(end for _, end, _ in timings) - min(start for start, _, _ in timings)
+        errors = sum(err for _, _, err in timings)
+        return (workers * decisions) / elapsed, errors
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de escritura single vs sharded')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--decisions', type=int, default=50)
+    parser.add_argument('--shards', type=int, default=4)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("BENCHMARK DE ESCRITURA CONCURRENTE")
+    print(f"workers={args.workers} decisiones/worker={args.decisions} shards={args.shards}")
+    print("=" * 60)
+
+    results = {}
+    for mode in ('single', 'sharded'):
+        rate, errors = run_mode(mode, args.workers, args.decisions, args.shards)
+        results[mode] = rate
+        print(f"[{mode:>7}] {rate:8.1f} decisiones/s  (errores: {errors})")
+
+    print("-" * 60)
+    print(f"[OK] Mejora sharded vs single: x{results['sharded'] / results['single']:.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,362 @@
+"""
+Capa de cache compartible entre workers
+Una misma interfaz (get / set / delete / get_or_set / stats) con tres modos:
+
+- 'lru': LRU en memoria de cada proceso (cada worker tiene su copia).
+- 'shared': tabla hash de tamaño fijo en un archivo mmap (/dev/shm si existe), común a
+  todos los workers de la máquina; el lock es flock sobre el archivo.
+- 'redis': cualquier servidor compatible con Redis (Redis, Valkey, KeyDB...) vía
+  redis-py (pip install redis), común a todas las máquinas.
+
+Claves str y valores serializables a JSON. Todos los modos exponen las mismas
+métricas: hits, misses, sets, entries y hit_rate, más evictions (en Redis
+server_evicted_keys: las expulsiones las decide el servidor y su contador es global).
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso en desarrollo, basta el lock de hilos
+    fcntl = None
+
+CACHE_MODES = ('lru', 'shared', 'redis')
+
+
+class Cache:
+    """Interfaz común de los tres modos de cache"""
+
+    mode = None
+
+    def get(self, key, default=None):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """Guarda un valor (ttl en segundos). Devuelve False si no cabe en la cache."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def counters(self):
+        """(hits, misses, sets, evictions, entries, capacity)"""
+        raise NotImplementedError
+
+    def get_or_set(self, key, compute, ttl=None):
+        """Devuelve el valor en cache o lo calcula y lo guarda (None no se guarda)"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+    def stats(self):
+        hits, misses, sets, evictions, entries, capacity = self.counters()
+        return {
+            'mode': self.mode,
+            'hits': hits,
+            'misses': misses,
+            'sets': sets,
+            'evictions': evictions,
+            'entries': entries,
+            'capacity': capacity,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None
+        }
+
+
+def cache_key(prefix, *parts):
+    """Clave corta y estable para textos largos (escenarios, prompts)"""
+    digest = hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()[:32]
+    return f'{prefix}:{digest}'
+
+
+class LRUCache(Cache):
+    """LRU por proceso con caducidad opcional"""
+
+    mode = 'lru'
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = self._misses = self._sets = self._evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] and entry[1] < time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl if ttl else 0)
+            self._entries.move_to_end(key)
+            self._sets += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def counters(self):
+        with self._lock:
+            return self._hits, self._misses, self._sets, self._evictions, len(self._entries), self.max_entries
+
+
+class SharedMemoryCache(Cache):
+    """Tabla hash asociativa (WAYS entradas por cubeta) en un archivo mmap compartido.
+
+    Cabecera: magic, nº de slots, tamaño de slot y contadores (hits, misses, sets,
+    evictions). Cada slot: hash de la clave, caducidad, último uso y longitud, seguidos
+    de [clave, valor] en JSON. Dentro de una cubeta se expulsa la entrada menos usada.
+    """
+
+    mode = 'shared'
+    MAGIC = b'EDC1'
+    WAYS = 8
+    _HEADER = struct.Struct('<4sII4Q')
+    _SLOT_HEADER = struct.Struct('<QddI4x')
+
+    def __init__(self, path, size_bytes=16 * 1024 * 1024, slot_size=4096):
+        self.path = path
+        self.slot_size = slot_size
+        buckets = max(1, (size_bytes - self._HEADER.size) // (slot_size * self.WAYS))
+        self.slots = buckets * self.WAYS
+        self.size_bytes = self._HEADER.size + self.slots * slot_size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+
+    def _ensure_open(self):
+        # Tras un fork (gunicorn --preload) cada proceso necesita su propio descriptor:
+        # flock no excluye a procesos que comparten la misma descripción de archivo
+        if self._pid == os.getpid():
+            return
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._pid = os.getpid()
+        with self._file_lock():
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            header = os.read(self._fd, self._HEADER.size)
+            if (os.fstat(self._fd).st_size != self.size_bytes or len(header) < self._HEADER.size
+                    or self._HEADER.unpack(header)[:3] != (self.MAGIC, self.slots, self.slot_size)):
+                # Archivo nuevo o con otra geometría: se reinicia vacío
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self.size_bytes)
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                os.write(self._fd, self._HEADER.pack(self.MAGIC, self.slots, self.slot_size, 0, 0, 0, 0))
+        self._map = mmap.mmap(self._fd, self.size_bytes)
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _count(self, index):
+        # Contadores de la cabecera: 0=hits, 1=misses, 2=sets, 3=evictions
+        offset = 12 + index * 8
+        value, = struct.unpack_from('<Q', self._map, offset)
+        struct.pack_into('<Q', self._map, offset, value + 1)
+
+    def _bucket(self, key):
+        key_hash = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+        first = (key_hash % (self.slots // self.WAYS)) * self.WAYS
+        return key_hash, [self._HEADER.size + (first + way) * self.slot_size for way in range(self.WAYS)]
+
+    def _read_slot(self, offset):
+        return self._SLOT_HEADER.unpack_from(self._map, offset)
+
+    def _find(self, key, key_hash, offsets, now):
+        """Offset del slot con la clave (vigente) o None"""
+        for offset in offsets:
+            slot_hash, expires, _, length = self._read_slot(offset)
+            if slot_hash != key_hash:
+                continue
+            start = offset + self._SLOT_HEADER.size
+            stored_key, value = json.loads(self._map[start:start + length])
+            if stored_key != key:
+                continue
+            if expires and expires < now:
+                self._SLOT_HEADER.pack_into(self._map, offset, 0, 0, 0, 0)
+                return None, None
+            return offset, value
+        return None, None
+
+    def get(self, key, default=None):
+        with self._lock:
+            self._ensure_open()
+            key_hash, offsets = self._bucket(key)
+            now = time.time()
+            with self._file_lock():
+                offset, value = self._find(key, key_hash, offsets, now)
+                if offset is None:
+                    self._count(1)
+                    return default
+                slot_hash, expires, _, length = self._read_slot(offset)
+                self._SLOT_HEADER.pack_into(self._map, offset, slot_hash, expires, now, length)
+                self._count(0)
+                return value
+
+    def set(self, key, value, ttl=None):
+        payload = json.dumps([key, value], ensure_ascii=False).encode('utf-8')
+        if len(payload) > self.slot_size - self._SLOT_HEADER.size:
+            return False
+        with self._lock:
+            self._ensure_open()
+            key_hash, offsets = self._bucket(key)
+            now = time.time()
+            with self._file_lock():
+                target, _ = self._find(key, key_hash, offsets, now)
+                if target is None:
+                    slots = [(self._read_slot(offset), offset) for offset in offsets]
+                    free = [offset for (slot_hash, expires, _, _), offset in slots
+                            if slot_hash == 0 or (expires and expires < now)]
+                    if free:
+                        target = free[0]
+                    else:
+                        target = min(slots, key=lambda item: item[0][2])[1]
+                        self._count(3)
+                start = target + self._SLOT_HEADER.size
+                self._map[start:start + len(payload)] = payload
+                self._SLOT_HEADER.pack_into(self._map, target, key_hash, now + ttl if ttl else 0, now, len(payload))
+                self._count(2)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            self._ensure_open()
+            key_hash, offsets = self._bucket(key)
+            with self._file_lock():
+                offset, _ = self._find(key, key_hash, offsets, time.time())
+                if offset is not None:
+                    self._SLOT_HEADER.pack_into(self._map, offset, 0, 0, 0, 0)
+
+    def clear(self):
+        with self._lock:
+            self._ensure_open()
+            with self._file_lock():
+                for index in range(self.slots):
+                    self._SLOT_HEADER.pack_into(self._map, self._HEADER.size + index * self.slot_size, 0, 0, 0, 0)
+
+    def counters(self):
+        with self._lock:
+            self._ensure_open()
+            with self._file_lock():
+                _, _, _, hits, misses, sets, evictions = self._HEADER.unpack_from(self._map, 0)
+                entries = sum(1 for index in range(self.slots)
+                              if self._read_slot(self._HEADER.size + index * self.slot_size)[0])
+        return hits, misses, sets, evictions, entries, self.slots
+
+
+class RedisCache(Cache):
+    """Cache en un servidor compatible con Redis; los contadores viven en un hash del servidor.
+
+    Las claves escritas se registran en un sorted set con su caducidad como puntuación:
+    contar las entradas es ZCARD tras descartar las caducadas, sin recorrer el keyspace.
+    Una clave expulsada por maxmemory sigue contando hasta su caducidad o hasta clear().
+    """
+
+    mode = 'redis'
+
+    def __init__(self, url, prefix='ethical:cache:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_MODE=redis requiere redis-py (pip install redis)") from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.stats_key = prefix + '__stats__'
+        self.keys_key = prefix + '__keys__'
+
+    def get(self, key, default=None):
+        raw = self.client.get(self.prefix + key)
+        self.client.hincrby(self.stats_key, 'misses' if raw is None else 'hits', 1)
+        return default if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.set(self.prefix + key, json.dumps(value, ensure_ascii=False), ex=ttl)
+        pipeline.zadd(self.keys_key, {key: time.time() + ttl if ttl else float('inf')})
+        pipeline.hincrby(self.stats_key, 'sets', 1)
+        pipeline.execute()
+        return True
+
+    def delete(self, key):
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.delete(self.prefix + key)
+        pipeline.zrem(self.keys_key, key)
+        pipeline.execute()
+
+    def clear(self):
+        keys = [key for key in self.client.scan_iter(match=self.prefix + '*') if key != self.stats_key.encode()]
+        if keys:
+            self.client.delete(*keys)
+
+    def counters(self):
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.hgetall(self.stats_key)
+        pipeline.zremrangebyscore(self.keys_key, '-inf', time.time())
+        pipeline.zcard(self.keys_key)
+        raw_stats, _, entries = pipeline.execute()
+        stats = {name.decode(): int(value) for name, value in raw_stats.items()}
+        try:
+            # Las expulsiones las hace el servidor (maxmemory-policy): contador global del servidor
+            info = self.client.info()
+        except Exception:
+            # Algunos servidores compatibles no implementan INFO
+            info = {}
+        return (stats.get('hits', 0), stats.get('misses', 0), stats.get('sets', 0),
+                int(info.get('evicted_keys', 0)), entries, int(info.get('maxmemory', 0)) or None)
+
+    def stats(self):
+        stats = super().stats()
+        stats['server_evicted_keys'] = stats.pop('evictions')
+        return stats
+
+
+def default_shared_path(name):
+    """Archivo del segmento compartido: en memoria (/dev/shm) si el sistema lo tiene"""
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, name)
+
+
+def create_cache(mode, max_entries=1024, shared_path=None, shared_size_mb=16, redis_url=None):
+    """Construye la cache del modo indicado ('lru', 'shared' o 'redis')"""
+    if mode == 'shared':
+        return SharedMemoryCache(shared_path or default_shared_path('ethical_cache'), shared_size_mb * 1024 * 1024)
+    if mode == 'redis':
+        return RedisCache(redis_url or 'redis://localhost:6379/0')
+    if mode != 'lru':
+        raise ValueError(f"CACHE_MODE desconocido: {mode} (opciones: {', '.join(CACHE_MODES)})")
+    return LRUCache(max_entries)
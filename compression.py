@@ -0,0 +1,69 @@
+"""
+Compresión de respuestas HTTP (gzip / brotli)
+Negocia la codificación con Accept-Encoding y comprime las respuestas JSON o de texto
+que superan un umbral de tamaño. Brotli se usa si el paquete `brotli` está instalado
+(pip install brotli); si no, gzip. Las respuestas en streaming no se tocan.
+"""
+import gzip
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/html', 'text/csv', 'text/plain'}
+
+# Niveles pensados para contenido dinámico: buena relación tamaño/CPU por petición
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+_brotli = None
+
+
+def _load_brotli():
+    """Importa brotli una sola vez (None si no está instalado)"""
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = False
+    return _brotli or None
+
+
+def available_encodings():
+    """Codificaciones soportadas, en orden de preferencia"""
+    return ['br', 'gzip'] if _load_brotli() else ['gzip']
+
+
+def negotiate_encoding(accept_encodings):
+    """Mejor codificación aceptada por el cliente (Accept de werkzeug) o None"""
+    for encoding in available_encodings():
+        if accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+def compress_body(data, encoding):
+    """Comprime bytes con la codificación indicada"""
+    if encoding == 'br':
+        return _load_brotli().compress(data, quality=BROTLI_QUALITY)
+    # mtime=0: misma entrada, mismos bytes (cacheable por proxies)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response, accept_encodings, min_bytes):
+    """Comprime la respuesta in situ si procede y la devuelve"""
+    response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    data = response.get_data()
+    if len(data) < min_bytes:
+        return response
+    encoding = negotiate_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    response.set_data(compress_body(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
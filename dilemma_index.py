@@ -0,0 +1,119 @@
+"""
+Índice invertido de dilemas por marco ético y categoría
+Los dilemas predefinidos y los generados por IA (ai_dilemmas_cache) se guardan una vez
+en memoria y se indexan por (pool, marco) y (pool, categoría), de modo que elegir un
+dilema que ofrezca un marco o una categoría concretos es un random.choice sobre una
+lista ya construida (O(1)), sin filtrar listas en cada petición.
+
+La parte de IA se sincroniza de forma incremental (id mayor que el último visto); si
+la retención de maintenance.py borra dilemas antiguos, se descartan del índice.
+
+Estrategias de selección (DILEMMA_SELECTION):
+- 'random': como antes, cualquier dilema del pool
+- 'frameworks': un dilema con una opción de un marco que el jugador aún no ha elegido
+- 'categories': un dilema de una categoría que le falta para el logro `explorer`
+- 'coverage': primero categorías que faltan, después marcos
+"""
+import random
+import threading
+
+PREDEFINED = 'predefined'
+AI = 'ai'
+STRATEGIES = ('random', 'frameworks', 'categories', 'coverage')
+SYNC_BATCH = 500
+
+
+class DilemmaIndex:
+    """Dilemas en memoria con listas de posiciones por marco y por categoría"""
+
+    def __init__(self, predefined=(), rng=None):
+        self.rng = rng or random
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.last_ai_id = 0
+        self._reset()
+        for dilemma in predefined:
+            self._add(PREDEFINED, dilemma)
+
+    def _reset(self):
+        self.dilemmas = []
+        self.ai_ids = []
+        self.all = {PREDEFINED: [], AI: []}
+        self.by_framework = {}
+        self.by_category = {}
+
+    def _add(self, pool, dilemma, ai_id=None):
+        position = len(self.dilemmas)
+        self.dilemmas.append(dilemma)
+        self.ai_ids.append(ai_id)
+        self.all[pool].append(position)
+        for framework in {option.get('ethical_value') for option in dilemma.get('options', [])} - {None}:
+            self.by_framework.setdefault((pool, framework), []).append(position)
+        self.by_category.setdefault((pool, dilemma.get('category') or 'general'), []).append(position)
+
+    def add_ai_dilemmas(self, rows):
+        """rows: (id, dilemma) de ai_dilemmas_cache en orden de id"""
+        with self._lock:
+            for ai_id, dilemma in rows:
+                self._add(AI, dilemma, ai_id)
+                self.last_ai_id = max(self.last_ai_id, ai_id)
+
+    def drop_ai_before(self, min_id):
+        """Descarta dilemas IA borrados por la retención (reconstruye las listas)"""
+        with self._lock:
+            if not any(ai_id is not None and ai_id < min_id for ai_id in self.ai_ids):
+                return 0
+            kept = list(zip(self.ai_ids, self.dilemmas))
+            self._reset()
+            dropped = 0
+            for ai_id, dilemma in kept:
+                if ai_id is None:
+                    self._add(PREDEFINED, dilemma)
+                elif ai_id >= min_id:
+                    self._add(AI, dilemma, ai_id)
+                else:
+                    dropped += 1
+            return dropped
+
+    def sync(self, repository):
+        """Incorpora los dilemas IA nuevos de la cache. Devuelve cuántos se añadieron."""
+        added = 0
+        with self._sync_lock:
+            min_id = repository.get_min_cached_dilemma_id()
+            # Tabla vacía: todo lo indexado se ha borrado
+            self.drop_ai_before(self.last_ai_id + 1 if min_id is None else min_id)
+            while True:
+                rows = repository.get_cached_dilemmas_since(self.last_ai_id, SYNC_BATCH)
+                if not rows:
+                    break
+                self.add_ai_dilemmas(rows)
+                added += len(rows)
+        return added
+
+    def ai_items(self):
+        """[(id en la cache, dilema)] de todos los dilemas IA indexados"""
+        with self._lock:
+            return [(self.ai_ids[position], self.dilemmas[position]) for position in self.all[AI]]
+
+    def count(self, pool=None):
+        return len(self.all[pool]) if pool else len(self.dilemmas)
+
+    # ---------- Selección ----------
+
+    def _draw(self, positions):
+        return self.dilemmas[self.rng.choice(positions)] if positions else None
+
+    def _draw_missing(self, pool, index, wanted, seen):
+        """Un dilema de alguna clave de `wanted` que el jugador aún no tiene en `seen`"""
+        missing = [key for key in sorted(wanted - set(seen)) if index.get((pool, key))]
+        return self._draw(index[(pool, self.rng.choice(missing))]) if missing else None
+
+    def select(self, pool, strategy='random', metrics=None, frameworks=(), categories=()):
+        """Dilema del pool según la estrategia (metrics: get_achievement_metrics del jugador) o None"""
+        with self._lock:
+            dilemma = None
+            if metrics is not None and strategy in ('categories', 'coverage'):
+                dilemma = self._draw_missing(pool, self.by_category, set(categories), metrics['categories'])
+            if dilemma is None and metrics is not None and strategy in ('frameworks', 'coverage'):
+                dilemma = self._draw_missing(pool, self.by_framework, set(frameworks), metrics['frameworks'])
+            return dilemma or self._draw(self.all[pool])
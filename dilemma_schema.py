@@ -0,0 +1,214 @@
+"""
+Esquema, validación y reparación de los dilemas generados por Gemini
+La generación pide salida estructurada (response_mime_type JSON + DILEMMA_SCHEMA), de
+modo que el modelo ya no envuelve el JSON en markdown ni inventa marcos éticos. Aun
+así la respuesta se valida con un validador compilado una sola vez (enum de
+ethical_value, número de opciones y límites de longitud) y, antes de descartar una
+respuesta, se intenta reparar:
+
+- texto alrededor del JSON o bloques ```json``` (modelos/SDK sin salida estructurada)
+- JSON truncado (respuesta parcial): se cierran cadenas, listas y objetos abiertos
+- marcos con mayúsculas o tildes ('Deontología' -> 'deontologia')
+- textos de opción demasiado largos (se recortan en un límite de palabra)
+- más de dos opciones (se conservan las dos primeras) o categoría ausente
+
+GenerationStats cuenta llamadas válidas, reparadas y fallidas por motivo, es decir, el
+coste de las llamadas desperdiciadas.
+"""
+import json
+import threading
+import unicodedata
+
+FRAMEWORKS = ('utilitarianismo', 'deontologia', 'autonomia', 'paternalismo', 'ecocentrismo', 'antropocentrismo')
+
+OPTION_COUNT = 2
+OPTION_TEXT_MAX = 100
+SCENARIO_MIN = 20
+SCENARIO_MAX = 1200
+
+# Esquema de respuesta para generation_config (subconjunto OpenAPI de Gemini)
+DILEMMA_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'category': {'type': 'STRING'},
+        'scenario': {'type': 'STRING'},
+        'options': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {
+                    'text': {'type': 'STRING'},
+                    'ethical_value': {'type': 'STRING', 'enum': list(FRAMEWORKS)}
+                },
+                'required': ['text', 'ethical_value']
+            }
+        }
+    },
+    'required': ['category', 'scenario', 'options']
+}
+
+
+class InvalidDilemma(ValueError):
+    """Respuesta que no se puede convertir en un dilema válido; `reason` para las métricas"""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def _plain(value):
+    """Minúsculas y sin tildes ('Deontología' -> 'deontologia')"""
+    decomposed = unicodedata.normalize('NFKD', value.strip().lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def close_truncated_json(text):
+    """Cierra cadenas y contenedores abiertos de un JSON cortado a mitad"""
+    stack = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]' and stack:
+            stack.pop()
+    repaired = text + ('"' if in_string else '')
+    # Una clave o una coma colgando no se pueden cerrar: se recortan
+    repaired = repaired.rstrip().rstrip(',:').rstrip()
+    if repaired.endswith(('{', '[')) or not stack:
+        return repaired + ''.join(reversed(stack))
+    if repaired.endswith('"') and stack[-1] == '}':
+        # ¿"clave" sin valor? Se quita la clave incompleta
+        head, _, tail = repaired.rpartition('"')
+        head = head.rpartition('"')[0]
+        if head.rstrip().endswith((',', '{')):
+            repaired = head.rstrip().rstrip(',')
+    return repaired + ''.join(reversed(stack))
+
+
+def extract_json(text):
+    """(objeto, reparado): quita markdown/texto alrededor y cierra JSON truncado"""
+    content = (text or '').strip()
+    if not content:
+        raise InvalidDilemma('empty', 'Respuesta vacía')
+    try:
+        return json.loads(content), False
+    except json.JSONDecodeError:
+        pass
+    start = content.find('{')
+    if start < 0:
+        raise InvalidDilemma('json', f'Sin objeto JSON: {content[:200]}')
+    end = content.rfind('}')
+    candidates = [content[start:end + 1]] if end > start else []
+    candidates.append(close_truncated_json(content[start:].split('```', 1)[0]))
+    for candidate in candidates:
+        try:
+            return json.loads(candidate), True
+        except json.JSONDecodeError:
+            continue
+    raise InvalidDilemma('json', f'JSON irreparable: {content[:200]}')
+
+
+class DilemmaValidator:
+    """Validador compilado: enum de marcos y límites precalculados al construirlo"""
+
+    def __init__(self, frameworks=FRAMEWORKS, option_count=OPTION_COUNT, option_text_max=OPTION_TEXT_MAX,
+                 scenario_min=SCENARIO_MIN, scenario_max=SCENARIO_MAX):
+        self.frameworks = frozenset(frameworks)
+        self.aliases = {_plain(framework): framework for framework in frameworks}
+        self.option_count = option_count
+        self.option_text_max = option_text_max
+        self.scenario_min = scenario_min
+        self.scenario_max = scenario_max
+
+    def _framework(self, value):
+        if value in self.frameworks:
+            return value, False
+        framework = self.aliases.get(_plain(value)) if isinstance(value, str) else None
+        if framework is None:
+            raise InvalidDilemma('schema', f'ethical_value desconocido: {value!r}')
+        return framework, True
+
+    def _option_text(self, text):
+        text = ' '.join(text.split()) if isinstance(text, str) else ''
+        if not text:
+            raise InvalidDilemma('schema', 'Opción sin texto')
+        if len(text) <= self.option_text_max:
+            return text, False
+        cut = text[:self.option_text_max - 1].rsplit(' ', 1)[0].rstrip(',;:')
+        return cut + '…', True
+
+    def validate(self, data, category=None):
+        """(dilema normalizado, reparado) o InvalidDilemma"""
+        if not isinstance(data, dict):
+            raise InvalidDilemma('schema', 'La respuesta no es un objeto')
+        repaired = False
+        scenario = ' '.join(data.get('scenario', '').split()) if isinstance(data.get('scenario'), str) else ''
+        if not self.scenario_min <= len(scenario) <= self.scenario_max:
+            raise InvalidDilemma('schema', f'Escenario de {len(scenario)} caracteres')
+        raw_options = data.get('options')
+        if not isinstance(raw_options, list) or len(raw_options) < self.option_count:
+            raise InvalidDilemma('schema', 'Faltan opciones')
+        if len(raw_options) > self.option_count:
+            raw_options = raw_options[:self.option_count]
+            repaired = True
+        options = []
+        for option in raw_options:
+            if not isinstance(option, dict):
+                raise InvalidDilemma('schema', 'Opción que no es un objeto')
+            text, cut = self._option_text(option.get('text'))
+            framework, renamed = self._framework(option.get('ethical_value'))
+            repaired = repaired or cut or renamed
+            options.append({'text': text, 'ethical_value': framework})
+        found_category = data.get('category') if isinstance(data.get('category'), str) else ''
+        if not found_category.strip():
+            found_category = category or 'general'
+            repaired = True
+        return {'category': found_category.strip(), 'scenario': scenario, 'options': options}, repaired
+
+    def parse(self, text, category=None):
+        """Texto de la respuesta -> (dilema, reparado) o InvalidDilemma"""
+        data, repaired_json = extract_json(text)
+        dilemma, repaired = self.validate(data, category)
+        return dilemma, repaired_json or repaired
+
+
+class GenerationStats:
+    """Llamadas de generación de dilemas: válidas, reparadas y fallidas por motivo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.valid = 0
+        self.repaired = 0
+        self.failures = {}
+
+    def record(self, repaired=False, failure=None):
+        with self._lock:
+            self.calls += 1
+            if failure:
+                self.failures[failure] = self.failures.get(failure, 0) + 1
+            elif repaired:
+                self.repaired += 1
+            else:
+                self.valid += 1
+
+    def stats(self):
+        with self._lock:
+            failed = sum(self.failures.values())
+            return {
+                'calls': self.calls,
+                'valid': self.valid,
+                'repaired': self.repaired,
+                'failed': failed,
+                'failures': dict(self.failures),
+                'parse_failure_rate': round(failed / self.calls, 4) if self.calls else 0.0
+            }
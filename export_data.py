@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Exportación de decisiones (unidas a su partida) en NDJSON o CSV
+Lee por bloques y escribe en streaming, así la memoria no crece con el tamaño de la
+tabla. Para trabajos nocturnos, --state guarda la última id exportada de cada fuente
+y la siguiente ejecución solo lee las filas nuevas.
+
+Uso:
+    python export_data.py --format csv --output decisiones.csv
+    python export_data.py --format ndjson --state export_state.json >> decisiones.ndjson
+    python export_data.py --since "2025-01-01 00:00:00"
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import sys
+
+from storage import EXPORT_COLUMNS
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+EXPORT_FIELDS = ['source'] + [name for name, _ in EXPORT_COLUMNS]
+
+
+def parse_since_ids(value):
+    """'120' aplica a la fuente 0; '120,98,77' da la última id por shard en orden"""
+    if not value:
+        return {}
+    return {index: int(part) for index, part in enumerate(value.split(',')) if part.strip()}
+
+
+def iter_export(rows, export_format, watermark=None, rows_per_chunk=500):
+    """Convierte filas (fuente, tupla) en bloques de texto NDJSON o CSV.
+
+    Si se pasa `watermark` (dict), se actualiza con la última id vista por fuente.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == 'csv' else None
+    if writer:
+        writer.writerow(EXPORT_FIELDS)
+
+    pending = 0
+    for source, row in rows:
+        if writer:
+            writer.writerow((source,) + row)
+        else:
+            buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, (source,) + row)), ensure_ascii=False))
+            buffer.write('\n')
+        if watermark is not None:
+            watermark[source] = row[0]
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exporta decisiones y partidas en NDJSON o CSV')
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson')
+    parser.add_argument('--output', help='Archivo de salida (por defecto stdout)')
+    parser.add_argument('--since-id', help="Última id ya exportada ('120' o '120,98,77' por shard)")
+    parser.add_argument('--since', help="Solo decisiones posteriores a este timestamp ('YYYY-MM-DD HH:MM:SS')")
+    parser.add_argument('--state', help='Archivo JSON con la marca de agua por fuente (se lee y actualiza)')
+    parser.add_argument('--chunk-size', type=int, default=500)
+    args = parser.parse_args()
+
+    # app imprime mensajes al importarse: no deben mezclarse con la exportación en stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import repository
+
+    since_ids = parse_since_ids(args.since_id)
+    if args.state and os.path.exists(args.state):
+        with open(args.state, encoding='utf-8') as f:
+            since_ids = {int(source): last_id for source, last_id in json.load(f).items()}
+
+    watermark = dict(since_ids)
+    rows = repository.iter_decision_export(since_ids, args.since, args.chunk_size)
+    output = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    exported = 0
+    try:
+        for chunk in iter_export(rows, args.format, watermark, args.chunk_size):
+            output.write(chunk)
+            exported += chunk.count('\n')
+    finally:
+        if args.output:
+            output.close()
+
+    if args.state:
+        with open(args.state, 'w', encoding='utf-8') as f:
+            json.dump(watermark, f)
+    print(f"[OK] Exportación completada ({exported} líneas)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
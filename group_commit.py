@@ -0,0 +1,135 @@
+"""
+Escritura agrupada (group commit) de decisiones
+Con el modo directo cada make_decision hace su INSERT + UPDATE + commit, y cada commit
+es un fsync: con ráfagas el rendimiento queda limitado por los fsync y por la espera
+del lock de escritura de SQLite.
+
+GroupCommitWriter encola las decisiones para un único hilo escritor que las guarda en
+grupos (una transacción por fuente, storage.GameRepository.record_decisions) cuando
+pasan `max_delay_ms` desde la primera del grupo o se juntan `max_rows`. Cada llamante
+espera a que su grupo esté confirmado (durable) antes de responder, así que la
+semántica para el cliente no cambia; solo se añade como mucho `max_delay_ms` de espera.
+
+Si el grupo falla, se reintenta cada decisión por separado para que el error solo
+llegue a quien lo provocó. Con shards cada fuente es una transacción propia: si solo
+falla alguna, únicamente se reintentan sus decisiones (las confirmadas no se duplican).
+
+La espera del llamante está acotada por `timeout`: si el escritor aún no ha tomado la
+decisión (está atascado o muerto) se cancela y se guarda directamente; si ya está en un
+grupo en curso se espera otro `timeout` y después se lanza TimeoutError.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from storage import PartialBatchError
+
+
+class GroupCommitWriter:
+    """Cola de decisiones con un hilo escritor que confirma por grupos"""
+
+    def __init__(self, repository, max_delay_ms=5, max_rows=64, timeout=5.0):
+        self.repository = repository
+        self.max_delay = max_delay_ms / 1000
+        self.max_rows = max(1, max_rows)
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._groups = 0
+        self._rows = 0
+        self._largest = 0
+        self._retried = 0
+        self._fallbacks = 0
+
+    def _ensure_thread(self):
+        # Hilo creado en el primer uso y de nuevo tras un fork (workers de gunicorn)
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+
+    def submit(self, *decision):
+        """Encola una decisión (argumentos de record_decision) y devuelve un Future con el jugador"""
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((decision, future))
+        return future
+
+    def record_decision(self, *decision):
+        """Como repository.record_decision, pero confirmada dentro de un grupo"""
+        future = self.submit(*decision)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            if not future.cancel():
+                # Ya forma parte de un grupo en curso: guardarla aparte la duplicaría
+                return future.result(timeout=self.timeout)
+        with self._lock:
+            self._fallbacks += 1
+        return self.repository.record_decision(*decision)
+
+    def _collect(self):
+        """Primera decisión pendiente más las que lleguen antes del plazo o del tamaño máximo"""
+        group = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(group) < self.max_rows:
+            remaining = deadline - time.monotonic()
+            try:
+                group.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return group
+
+    def _run(self):
+        while True:
+            # Las canceladas por tiempo de espera ya las guardó su llamante
+            group = [item for item in self._collect() if item[1].set_running_or_notify_cancel()]
+            if not group:
+                continue
+            try:
+                players = self.repository.record_decisions([decision for decision, _ in group])
+            except PartialBatchError as e:
+                for position, (_, future) in enumerate(group):
+                    if position not in e.failed:
+                        future.set_result(e.players[position])
+                self._retry([group[position] for position in sorted(e.failed)])
+            except Exception:
+                self._retry(group)
+            else:
+                for (_, future), player_name in zip(group, players):
+                    future.set_result(player_name)
+            with self._lock:
+                self._groups += 1
+                self._rows += len(group)
+                self._largest = max(self._largest, len(group))
+
+    def _retry(self, group):
+        with self._lock:
+            self._retried += 1
+        for decision, future in group:
+            try:
+                future.set_result(self.repository.record_decision(*decision))
+            except Exception as e:
+                future.set_exception(e)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'groups': self._groups,
+                'rows': self._rows,
+                'avg_group_size': round(self._rows / self._groups, 2) if self._groups else 0,
+                'largest_group': self._largest,
+                'retried_groups': self._retried,
+                'direct_fallbacks': self._fallbacks,
+                'pending': self._queue.qsize(),
+                'max_delay_ms': self.max_delay * 1000,
+                'max_rows': self.max_rows
+            }
@@ -0,0 +1,109 @@
+"""
+Peticiones de respaldo (hedging) para recortar la cola de latencia de Gemini
+Si una llamada no ha respondido cuando supera el percentil observado (p90 por defecto),
+se lanza una segunda llamada idéntica y gana la primera respuesta. El presupuesto
+limita las llamadas extra: cada llamada primaria acumula `budget` fichas (hasta
+BURST) y cada respaldo gasta una, así que como máximo se añade ~budget x llamadas.
+
+La llamada perdedora no se puede cancelar (es una petición HTTP en curso): termina en
+segundo plano y su latencia también alimenta la ventana.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+BURST = 5
+RECOMPUTE_EVERY = 10
+
+
+class Hedger:
+    """Ejecuta llamadas con un respaldo tras el percentil de latencia observado"""
+
+    def __init__(self, budget=0.10, percentile=90, min_samples=20, window=200, max_workers=32):
+        self.budget = budget
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._since_recompute = 0
+        self._delay = None
+        self._tokens = float(BURST)
+        self._calls = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._skipped = 0
+
+    def _record(self, start, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+            self._since_recompute += 1
+            if self._since_recompute >= RECOMPUTE_EVERY and len(self._latencies) >= self.min_samples:
+                ordered = sorted(self._latencies)
+                self._delay = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+                self._since_recompute = 0
+
+    def _submit(self, fn, args, kwargs):
+        start = time.perf_counter()
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda f: self._record(start, f))
+        return future
+
+    def _take_token(self):
+        with self._lock:
+            self._calls += 1
+            self._tokens = min(BURST, self._tokens + self.budget)
+            return self._delay
+
+    def _allow_hedge(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self._hedges += 1
+                return True
+            self._skipped += 1
+            return False
+
+    def call(self, fn, *args, **kwargs):
+        """fn(*args, **kwargs) con respaldo; devuelve el primer resultado correcto"""
+        delay = self._take_token()
+        primary = self._submit(fn, args, kwargs)
+        # Sin suficientes muestras todavía no se sabe cuándo una llamada es "lenta"
+        if delay is None:
+            return primary.result()
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._allow_hedge():
+            return primary.result()
+
+        hedge = self._submit(fn, args, kwargs)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self._hedge_wins += 1
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def stats(self):
+        with self._lock:
+            return {
+                'percentile': self.percentile,
+                'budget': self.budget,
+                'delay_ms': round(self._delay * 1000, 1) if self._delay is not None else None,
+                'calls': self._calls,
+                'hedges': self._hedges,
+                'hedge_rate': round(self._hedges / self._calls, 4) if self._calls else None,
+                'hedge_wins': self._hedge_wins,
+                'hedges_skipped_budget': self._skipped
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,134 @@
+"""
+Claves de idempotencia (cabecera Idempotency-Key) para make_decision y start_game
+Si una petición expira en el cliente y se reintenta, o el jugador pulsa dos veces, el
+servidor devolvería otra partida o repetiría el análisis con Gemini, insertaría una
+decisión duplicada e inflaría dilemas_answered. Con la cabecera, la primera petición
+reserva la clave y guarda su respuesta; las repeticiones devuelven esa respuesta con
+una sola búsqueda por clave primaria.
+
+- Una repetición mientras la original aún se procesa espera hasta `wait_seconds` a
+  que termine (después responde 409).
+- La misma clave con otro cuerpo de petición es un error del cliente (422).
+- Las respuestas 5xx no se guardan: la clave se libera y el reintento se procesa.
+- Las claves caducan a los `ttl_seconds` y se purgan cada `prune_every` reservas; una
+  reserva sin respuesta durante `pending_timeout` (proceso caído) se puede retomar.
+"""
+import threading
+import time
+
+NEW = 'new'
+REPLAY = 'replay'
+PENDING = 'pending'
+MISMATCH = 'mismatch'
+
+IDEMPOTENCY_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key TEXT PRIMARY KEY,
+        fingerprint TEXT NOT NULL,
+        status INTEGER,
+        response TEXT,
+        created_at REAL NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys (created_at)',
+]
+
+
+def init_tables(repository):
+    """Crea idempotency_keys junto a los logs"""
+    with repository.logs() as conn:
+        cursor = conn.cursor()
+        for statement in IDEMPOTENCY_TABLES:
+            repository.execute(cursor, statement)
+
+
+class IdempotencyStore:
+    """Reserva, respuesta guardada y caducidad de las claves de idempotencia"""
+
+    def __init__(self, repository, ttl_seconds=86400, wait_seconds=10, pending_timeout=120, prune_every=1000):
+        self.repository = repository
+        self.ttl_seconds = ttl_seconds
+        self.wait_seconds = wait_seconds
+        self.pending_timeout = pending_timeout
+        self.prune_every = prune_every
+        self._lock = threading.Lock()
+        self._counts = {NEW: 0, REPLAY: 0, PENDING: 0, MISMATCH: 0}
+        self._purged = 0
+
+    def _reserve(self, key, fingerprint, now):
+        """Inserta la reserva o sustituye una caducada/abandonada; True si ahora es nuestra"""
+        with self.repository.logs() as conn:
+            cursor = self.repository.execute(conn.cursor(), '''
+                INSERT INTO idempotency_keys (key, fingerprint, status, response, created_at)
+                VALUES (?, ?, NULL, NULL, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    fingerprint = excluded.fingerprint, status = NULL, response = NULL,
+                    created_at = excluded.created_at
+                WHERE idempotency_keys.created_at < ?
+                   OR (idempotency_keys.status IS NULL AND idempotency_keys.created_at < ?)
+            ''', (key, fingerprint, now, now - self.ttl_seconds, now - self.pending_timeout))
+            return cursor.rowcount == 1
+
+    def _lookup(self, key):
+        with self.repository.logs() as conn:
+            return self.repository.execute(conn.cursor(), '''
+                SELECT fingerprint, status, response FROM idempotency_keys WHERE key = ?
+            ''', (key,)).fetchone()
+
+    def begin(self, key, fingerprint):
+        """(estado, status, respuesta): NEW si hay que procesar la petición, REPLAY con la
+        respuesta guardada, PENDING si la original sigue en curso o MISMATCH"""
+        state, status, response = self._begin(key, fingerprint)
+        with self._lock:
+            self._counts[state] += 1
+            prune = state == NEW and self._counts[NEW] % self.prune_every == 0
+        if prune:
+            self.purge()
+        return state, status, response
+
+    def _begin(self, key, fingerprint):
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            if self._reserve(key, fingerprint, time.time()):
+                return NEW, None, None
+            row = self._lookup(key)
+            if row is None:
+                continue  # purgada entre las dos consultas
+            stored_fingerprint, status, response = row
+            if stored_fingerprint != fingerprint:
+                return MISMATCH, None, None
+            if status is not None:
+                return REPLAY, status, response
+            if time.monotonic() >= deadline:
+                return PENDING, None, None
+            time.sleep(0.05)
+
+    def complete(self, key, status, response):
+        """Guarda la respuesta de una clave reservada con begin()"""
+        with self.repository.logs() as conn:
+            self.repository.execute(conn.cursor(), '''
+                UPDATE idempotency_keys SET status = ?, response = ? WHERE key = ?
+            ''', (status, response, key))
+
+    def release(self, key):
+        """Libera una reserva sin respuesta (error del servidor): el reintento se procesará"""
+        with self.repository.logs() as conn:
+            self.repository.execute(conn.cursor(), '''
+                DELETE FROM idempotency_keys WHERE key = ? AND status IS NULL
+            ''', (key,))
+
+    def purge(self, now=None):
+        """Borra las claves caducadas. Devuelve cuántas."""
+        cutoff = (now or time.time()) - self.ttl_seconds
+        with self.repository.logs() as conn:
+            deleted = self.repository.execute(conn.cursor(), '''
+                DELETE FROM idempotency_keys WHERE created_at < ?
+            ''', (cutoff,)).rowcount
+        with self._lock:
+            self._purged += deleted
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, purged=self._purged, ttl_seconds=self.ttl_seconds)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Proxy de imágenes con cache local direccionada por contenido
+Las imágenes de los dilemas (Unsplash) se sirven desde /img/<id>?w=<ancho> a partir de
+un directorio local precargado (IMAGE_SOURCE_DIR). Cada variante redimensionada se
+guarda una vez en IMAGE_CACHE_DIR con un nombre derivado del hash del original, el
+ancho y la calidad, que también es su ETag fuerte. Las imágenes no precargadas no pasan
+por el proxy (se sirve su URL original); si aun así se pide una, la ruta redirige a la
+URL original con el ancho pedido.
+
+Redimensionar usa Pillow (requirements.txt); si no estuviera instalado se serviría el original.
+
+Uso:
+    python image_proxy.py --seed      # descarga los originales de los bancos de imágenes
+"""
+import argparse
+import contextlib
+import hashlib
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_SOURCE_DIR = os.getenv('IMAGE_SOURCE_DIR', os.path.join(APP_DIR, 'image_source'))
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'ethical_image_cache'))
+
+# Anchos servidos: cualquier ?w= se redondea hacia arriba a uno de ellos
+IMAGE_WIDTHS = (320, 480, 800)
+JPEG_QUALITY = 80
+REMOTE_URL = 'https://images.unsplash.com/{image_id}?w={width}'
+
+_UNSPLASH_URL = re.compile(r'^https://images\.unsplash\.com/(photo-[0-9]+-[0-9a-f]+)(\?.*)?$')
+_IMAGE_ID = re.compile(r'^photo-[0-9]+-[0-9a-f]+$')
+
+# Hash de cada original por (ruta) -> (mtime_ns, tamaño, sha256): evita releerlo en cada petición
+_source_digests = {}
+_variant_lock = threading.Lock()
+
+
+def image_id_from_url(url):
+    """Id de Unsplash de una URL del banco de imágenes o None"""
+    match = _UNSPLASH_URL.match(url or '')
+    return match.group(1) if match else None
+
+
+def is_valid_image_id(image_id):
+    """Los ids del proxy solo pueden ser ids de foto de Unsplash (nada de rutas)"""
+    return bool(_IMAGE_ID.match(image_id or ''))
+
+
+def has_sources():
+    """¿Hay originales precargados en IMAGE_SOURCE_DIR? (IMAGE_PROXY=auto)"""
+    try:
+        with os.scandir(IMAGE_SOURCE_DIR) as entries:
+            return any(entry.name.endswith('.jpg') for entry in entries)
+    except OSError:
+        return False
+
+
+def remote_url(image_id, width=None):
+    """URL original de Unsplash con el ancho pedido (800 si no se pidió)"""
+    return REMOTE_URL.format(image_id=image_id, width=width if width and width > 0 else IMAGE_WIDTHS[-1])
+
+
+def proxy_url(url, width=800):
+    """URL del proxy para una imagen precargada; las demás URLs se devuelven igual (sin redirección)"""
+    image_id = image_id_from_url(url)
+    return f'/img/{image_id}?w={snap_width(width)}' if _source_path(image_id) else url
+
+
+def srcset(url):
+    """Atributo srcset con todas las variantes o None si la imagen no pasa por el proxy"""
+    image_id = image_id_from_url(url)
+    if not _source_path(image_id):
+        return None
+    return ', '.join(f'/img/{image_id}?w={width} {width}w' for width in IMAGE_WIDTHS)
+
+
+def snap_width(width):
+    """Ancho permitido más pequeño que cubre el pedido (limita las variantes en cache)"""
+    for allowed in IMAGE_WIDTHS:
+        if width and width <= allowed:
+            return allowed
+    return IMAGE_WIDTHS[-1]
+
+
+def _source_path(image_id):
+    if not is_valid_image_id(image_id):
+        return None
+    path = os.path.join(IMAGE_SOURCE_DIR, f'{image_id}.jpg')
+    return path if os.path.isfile(path) else None
+
+
+def _source_digest(path):
+    stat = os.stat(path)
+    cached = _source_digests.get(path)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _source_digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+
+def _load_pillow():
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def _render_variant(source, destination, width):
+    """Escribe la variante redimensionada (o una copia si no hay Pillow)"""
+    Image = _load_pillow()
+    tmp_path = f'{destination}.{threading.get_ident()}.tmp'
+    if Image is None:
+        shutil.copyfile(source, tmp_path)
+    else:
+        with Image.open(source) as image:
+            image = image.convert('RGB')
+            if image.width > width:
+                image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            image.save(tmp_path, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp_path, destination)
+
+
+def get_variant(image_id, width):
+    """Ruta de la variante en cache y su ETag, generándola si hace falta; None si no hay original"""
+    source = _source_path(image_id)
+    if source is None:
+        return None
+    pillow = 'pil' if _load_pillow() else 'raw'
+    key = hashlib.sha256(f'{_source_digest(source)}:{width}:{JPEG_QUALITY}:{pillow}'.encode('ascii')).hexdigest()
+    path = os.path.join(IMAGE_CACHE_DIR, key[:2], f'{key}.jpg')
+    if not os.path.exists(path):
+        with _variant_lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                _render_variant(source, path, width)
+    return path, key
+
+
+def seed(urls, session=None):
+    """Descarga a IMAGE_SOURCE_DIR los originales que aún no están. Devuelve cuántos se bajaron."""
+    import requests
+
+    session = session or requests.Session()
+    os.makedirs(IMAGE_SOURCE_DIR, exist_ok=True)
+    downloaded = 0
+    for image_id in sorted({image_id_from_url(url) for url in urls} - {None}):
+        path = os.path.join(IMAGE_SOURCE_DIR, f'{image_id}.jpg')
+        if os.path.exists(path):
+            continue
+        response = session.get(remote_url(image_id), timeout=30)
+        response.raise_for_status()
+        with open(path + '.tmp', 'wb') as f:
+            f.write(response.content)
+        os.replace(path + '.tmp', path)
+        downloaded += 1
+    return downloaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Proxy de imágenes: precarga de originales')
+    parser.add_argument('--seed', action='store_true', help='Descargar los originales de los bancos de imágenes')
+    args = parser.parse_args()
+    if not args.seed:
+        parser.print_help()
+        return
+
+    with contextlib.redirect_stdout(sys.stderr):
+        import app
+    urls = [url for images in app.IMAGE_BANK.values() for url in images]
+    urls += [url for keyword_map in app.KEYWORD_IMAGE_MAP.values() for url in keyword_map.values()]
+    urls += list(app.ETHICAL_FRAMEWORK_IMAGES.values())
+    downloaded = seed(urls)
+    print(f"[OK] {downloaded} imágenes descargadas en {IMAGE_SOURCE_DIR}")
+
+
+if __name__ == '__main__':
+    main()
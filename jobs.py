@@ -0,0 +1,270 @@
+"""
+Cola de trabajos duradera en SQLite para el trabajo de IA
+Los procesos web solo encolan trabajos y leen sus resultados. Los procesos de
+worker.py los consumen: generación de dilemas, análisis de decisiones, mantenimiento
+de la cache y logros retroactivos. Así el rendimiento de la IA escala con el número de
+workers, independiente de los workers HTTP.
+
+- Concesión (lease): al reclamar un trabajo pasa a 'running' y deja de ser visible
+  durante `visibility_timeout` segundos. Si el worker muere sin completarlo, vuelve a
+  ser visible y otro lo reclama (como mucho `max_attempts` veces).
+- Reintentos: un fallo lo devuelve a la cola con espera exponencial.
+- dedupe_key evita encolar dos veces el mismo trabajo (p. ej. el mismo análisis): se
+  devuelve el id del existente.
+- Reclamar es una sola sentencia UPDATE ... RETURNING sobre el índice parcial de
+  trabajos pendientes, así que varios procesos nunca reciben el mismo trabajo.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueue:
+    """Cola en un archivo SQLite (WAL) compartido por los procesos web y los workers"""
+
+    def __init__(self, path, visibility_timeout=60, max_attempts=3, retry_base_seconds=2):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                dedupe_key TEXT UNIQUE,
+                status TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                available_at REAL NOT NULL,
+                lease_owner TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                finished_at REAL
+            )
+        ''')
+        # Solo los trabajos pendientes o en curso: reclamar no recorre los terminados
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (priority DESC, available_at)
+            WHERE status IN ('queued', 'running')
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at) WHERE finished_at IS NOT NULL')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # Un trabajo confirmado sobrevive a un corte de luz
+            conn.execute('PRAGMA synchronous=FULL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # ---------- Productores (procesos web) ----------
+
+    def enqueue(self, kind, payload=None, dedupe_key=None, priority=0, delay=0.0, max_attempts=None):
+        """Encola un trabajo y devuelve su id. Se reclaman antes los de mayor `priority`.
+
+        Con dedupe_key se devuelve el trabajo existente (pendiente o terminado, con su
+        resultado); uno fallido se vuelve a encolar con los intentos a cero.
+        """
+        now = time.time()
+        conn = self._connection()
+        cursor = conn.execute('''
+            INSERT INTO jobs (kind, payload, dedupe_key, status, priority, max_attempts, available_at, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (dedupe_key) DO UPDATE SET
+                payload = excluded.payload, status = excluded.status, attempts = 0,
+                available_at = excluded.available_at, lease_owner = NULL, error = NULL, finished_at = NULL
+            WHERE jobs.status = 'failed'
+        ''', (kind, json.dumps(payload or {}, ensure_ascii=False), dedupe_key, QUEUED, priority,
+              max_attempts or self.max_attempts, now + delay, now))
+        if dedupe_key is None:
+            return cursor.lastrowid
+        return conn.execute('SELECT id FROM jobs WHERE dedupe_key = ?', (dedupe_key,)).fetchone()[0]
+
+    def get(self, job_id):
+        """{'id', 'kind', 'status', 'attempts', 'result', 'error'} o None"""
+        return self._job('id = ?', job_id)
+
+    def find(self, dedupe_key):
+        """El trabajo con esta dedupe_key (mismo formato que get) o None"""
+        return self._job('dedupe_key = ?', dedupe_key)
+
+    def _job(self, condition, value):
+        row = self._connection().execute(f'''
+            SELECT id, kind, status, attempts, result, error FROM jobs WHERE {condition}
+        ''', (value,)).fetchone()
+        if row is None:
+            return None
+        return {'id': row[0], 'kind': row[1], 'status': row[2], 'attempts': row[3],
+                'result': json.loads(row[4]) if row[4] is not None else None, 'error': row[5]}
+
+    def wait(self, job_id, timeout, poll_interval=0.05):
+        """Espera a que el trabajo termine (done/failed) como mucho `timeout` segundos"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in (DONE, FAILED) or time.monotonic() >= deadline:
+                return job
+            time.sleep(poll_interval)
+            poll_interval = min(poll_interval * 1.5, 0.5)
+
+    def pending(self, kind=None):
+        """Trabajos en cola o en curso (de un tipo o de todos)"""
+        query = "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+        params = ()
+        if kind:
+            query += ' AND kind = ?'
+            params = (kind,)
+        return self._connection().execute(query, params).fetchone()[0]
+
+    # ---------- Consumidores (worker.py) ----------
+
+    def claim(self, owner, kinds):
+        """Reclama el trabajo visible más prioritario (y antiguo) de `kinds`: (id, kind, payload, intento) o None"""
+        now = time.time()
+        placeholders = ', '.join('?' for _ in kinds)
+        row = self._connection().execute(f'''
+            UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?,
+                            available_at = ?
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE status IN ('queued', 'running') AND available_at <= ?
+                  AND attempts < max_attempts AND kind IN ({placeholders})
+                ORDER BY priority DESC, available_at LIMIT 1
+            )
+            RETURNING id, kind, payload, attempts
+        ''', (owner, now + self.visibility_timeout, now, *kinds)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2]), row[3]
+
+    def extend(self, job_id, owner):
+        """Renueva la concesión de un trabajo largo; False si ya no es de este worker"""
+        return self._connection().execute('''
+            UPDATE jobs SET available_at = ? WHERE id = ? AND lease_owner = ? AND status = 'running'
+        ''', (time.time() + self.visibility_timeout, job_id, owner)).rowcount == 1
+
+    def complete(self, job_id, owner, result=None):
+        """Guarda el resultado; False si la concesión caducó y otro worker lo reclamó"""
+        return self._connection().execute('''
+            UPDATE jobs SET status = 'done', result = ?, error = NULL, finished_at = ?
+            WHERE id = ? AND lease_owner = ? AND status = 'running'
+        ''', (json.dumps(result, ensure_ascii=False), time.time(), job_id, owner)).rowcount == 1
+
+    def fail(self, job_id, owner, error):
+        """Devuelve el trabajo a la cola con espera exponencial o lo marca como fallido"""
+        now = time.time()
+        return self._connection().execute('''
+            UPDATE jobs SET
+                status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                available_at = ? + ? * (1 << (attempts - 1)),
+                finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE ? END,
+                error = ?
+            WHERE id = ? AND lease_owner = ? AND status = 'running'
+        ''', (now, self.retry_base_seconds, now, str(error)[:2000], job_id, owner)).rowcount == 1
+
+    def expire(self):
+        """Marca como fallidos los trabajos cuya última concesión caducó sin más intentos"""
+        now = time.time()
+        return self._connection().execute('''
+            UPDATE jobs SET status = 'failed', error = 'Concesión caducada sin más intentos', finished_at = ?
+            WHERE status IN ('queued', 'running') AND available_at <= ? AND attempts >= max_attempts
+        ''', (now, now)).rowcount
+
+    def purge(self, older_than_seconds):
+        """Borra los trabajos terminados hace más de `older_than_seconds`"""
+        return self._connection().execute('''
+            DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?
+        ''', (time.time() - older_than_seconds,)).rowcount
+
+    def stats(self):
+        rows = self._connection().execute('SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status').fetchall()
+        by_kind = {}
+        for kind, status, count in rows:
+            by_kind.setdefault(kind, {})[status] = count
+        return {'kinds': by_kind, 'visibility_timeout': self.visibility_timeout, 'max_attempts': self.max_attempts}
+
+
+class Worker:
+    """Bucle reclamar -> ejecutar -> completar/fallar de un proceso de worker.py.
+
+    handlers: {kind: función(payload) -> resultado serializable a JSON}. Mientras un
+    trabajo se ejecuta, un hilo renueva su concesión cada tercio del visibility timeout;
+    si el proceso muere, la concesión caduca y el trabajo se reintenta en otro worker.
+    """
+
+    def __init__(self, queue, handlers, owner=None, poll_interval=0.5):
+        self.queue = queue
+        self.handlers = handlers
+        self.kinds = tuple(handlers)
+        self.owner = owner or f'{socket.gethostname()}:{os.getpid()}'
+        self.poll_interval = poll_interval
+        self.processed = {DONE: 0, FAILED: 0}
+        self._expired_at = 0.0
+
+    def _heartbeat(self, job_id, stop):
+        while not stop.wait(self.queue.visibility_timeout / 3):
+            if not self.queue.extend(job_id, self.owner):
+                return
+
+    def run_once(self):
+        """Procesa un trabajo si hay alguno visible. Devuelve True si lo ha hecho."""
+        now = time.monotonic()
+        if now - self._expired_at >= self.queue.visibility_timeout / 2:
+            self._expired_at = now
+            self.queue.expire()
+        job = self.queue.claim(self.owner, self.kinds)
+        if job is None:
+            return False
+        job_id, kind, payload, attempt = job
+        stop = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, stop), daemon=True).start()
+        try:
+            result = self.handlers[kind](payload)
+        except Exception as e:
+            stop.set()
+            print(f"⚠️ Trabajo {job_id} ({kind}) falló en el intento {attempt}: {e}")
+            traceback.print_exc()
+            self.queue.fail(job_id, self.owner, e)
+            self.processed[FAILED] += 1
+            return True
+        stop.set()
+        if not self.queue.complete(job_id, self.owner, result):
+            print(f"⚠️ Trabajo {job_id} ({kind}): la concesión caducó antes de completarlo")
+        self.processed[DONE] += 1
+        return True
+
+    def run(self, stop=None, max_jobs=None):
+        """Procesa trabajos hasta que `stop` (threading/multiprocessing Event) se active"""
+        processed = 0
+        while not (stop is not None and stop.is_set()):
+            if max_jobs is not None and processed >= max_jobs:
+                break
+            try:
+                worked = self.run_once()
+            except sqlite3.OperationalError as e:
+                print(f"⚠️ Error en la cola de trabajos: {e}")
+                worked = False
+            if worked:
+                processed += 1
+            elif stop is not None:
+                stop.wait(self.poll_interval)
+            else:
+                time.sleep(self.poll_interval)
+        return processed
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Mantenimiento de prompts_log y ai_dilemmas_cache
+Aplica la política de retención (por antigüedad y/o número de filas), compacta los
+registros antiguos de prompts_log (prompt deduplicado por hash, respuesta con zlib) y
+ejecuta un VACUUM incremental + ANALYZE acotado. Todo se hace en lotes pequeños, cada
+uno en su propia transacción, para no bloquear las escrituras del juego.
+
+También cierra las partidas abandonadas (sin end_game) en lotes acotados.
+
+Uso como tarea programada (cron):
+    python maintenance.py
+    python maintenance.py --reap-games 30  # solo cierra partidas sin actividad en 30 minutos
+    python maintenance.py --full-vacuum    # una vez: activa auto_vacuum en bases SQLite existentes
+"""
+import argparse
+import contextlib
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from storage import compress_text, utc_now
+
+
+# Tablas con retención: columna de fecha y variables de entorno de la política
+RETENTION_TABLES = {
+    'prompts_log': ('timestamp', 'PROMPTS_LOG_MAX_AGE_DAYS', 'PROMPTS_LOG_MAX_ROWS'),
+    'ai_dilemmas_cache': ('created_at', 'DILEMMA_CACHE_MAX_AGE_DAYS', 'DILEMMA_CACHE_MAX_ROWS'),
+}
+
+
+def _env_int(name):
+    value = os.getenv(name, '').strip()
+    return int(value) if value else None
+
+
+def retention_policy():
+    """Política vigente por tabla: (max_age_days, max_rows); None desactiva el límite.
+
+    Se lee en cada ejecución porque app carga .env después de importar este módulo.
+    """
+    return {table: (_env_int(age_var), _env_int(rows_var))
+            for table, (_, age_var, rows_var) in RETENTION_TABLES.items()}
+
+
+BATCH_SIZE = 500
+VACUUM_PAGES = 1000
+
+
+def _delete_batches(repository, table, condition, params, batch_size):
+    """Borra en lotes de batch_size filas (una transacción corta por lote)"""
+    deleted = 0
+    while True:
+        with repository.logs() as conn:
+            cursor = conn.cursor()
+            repository.execute(cursor, f'''
+                DELETE FROM {table} WHERE id IN (
+                    SELECT id FROM {table} WHERE {condition} ORDER BY id LIMIT ?
+                )
+            ''', params + (batch_size,))
+            count = cursor.rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def apply_retention(repository, table, max_age_days=None, max_rows=None, batch_size=BATCH_SIZE):
+    """Elimina las filas más antiguas que max_age_days o que exceden max_rows"""
+    deleted = 0
+    if max_age_days is not None:
+        # CURRENT_TIMESTAMP guarda la hora en UTC
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+        column = RETENTION_TABLES[table][0]
+        deleted += _delete_batches(repository, table, f'{column} < ?', (cutoff,), batch_size)
+    if max_rows is not None:
+        with repository.logs() as conn:
+            row = repository.execute(conn.cursor(), f'SELECT id FROM {table} ORDER BY id DESC LIMIT 1 OFFSET ?',
+                                     (max_rows,)).fetchone()
+        if row:
+            deleted += _delete_batches(repository, table, 'id <= ?', (row[0],), batch_size)
+    return deleted
+
+
+def delete_orphan_prompts(repository):
+    """Elimina los textos de prompt que ya no referencia ningún registro"""
+    with repository.logs() as conn:
+        cursor = conn.cursor()
+        repository.execute(cursor, '''
+            DELETE FROM prompt_texts WHERE NOT EXISTS (
+                SELECT 1 FROM prompts_log l WHERE l.prompt_hash = prompt_texts.hash
+            )
+        ''')
+        return cursor.rowcount
+
+
+def compact_prompt_logs(repository, batch_size=BATCH_SIZE):
+    """Convierte registros con texto plano al formato deduplicado y comprimido"""
+    compacted = 0
+    while True:
+        with repository.logs() as conn:
+            cursor = conn.cursor()
+            rows = repository.execute(cursor, '''
+                SELECT id, prompt_text, response_text FROM prompts_log
+                WHERE prompt_text IS NOT NULL OR response_text IS NOT NULL
+                ORDER BY id LIMIT ?
+            ''', (batch_size,)).fetchall()
+            for log_id, prompt_text, response_text in rows:
+                prompt_hash = repository.store_prompt_text(cursor, prompt_text)
+                repository.execute(cursor, '''
+                    UPDATE prompts_log SET prompt_hash = ?, response_zlib = ?, prompt_text = NULL, response_text = NULL
+                    WHERE id = ?
+                ''', (prompt_hash, compress_text(response_text), log_id))
+        compacted += len(rows)
+        if len(rows) < batch_size:
+            return compacted
+
+
+# ---------- Partidas abandonadas ----------
+
+REAP_BATCH_SIZE = 200
+REAP_MAX_BATCHES = 5
+
+
+def reap_idle_games(repository, idle_minutes=30, batch_size=REAP_BATCH_SIZE, max_batches=REAP_MAX_BATCHES):
+    """Cierra las partidas sin end_time ni actividad en idle_minutes. Devuelve sus ids.
+
+    Usa el índice parcial idx_games_open (end_time IS NULL). Cada lote es una transacción
+    corta y como mucho se procesan max_batches lotes por fuente y llamada (trabajo
+    acotado); con shards, uno con muchas partidas abandonadas no deja sin turno al resto.
+    end_time es el momento del cierre, como en end_game: snapshot.py copia las partidas
+    en orden de end_time y una fecha en el pasado quedaría detrás de su marca de agua.
+    """
+    # CURRENT_TIMESTAMP guarda la hora en UTC
+    cutoff = (datetime.now(timezone.utc) - timedelta(minutes=idle_minutes)).strftime('%Y-%m-%d %H:%M:%S')
+    reaped = []
+    for index in range(repository.source_count()):
+        batches = 0
+        while batches < max_batches:
+            batches += 1
+            with repository.source(index) as conn:
+                cursor = conn.cursor()
+                game_ids = [row[0] for row in repository.execute(cursor, '''
+                    SELECT id FROM games
+                    WHERE end_time IS NULL AND start_time < ?
+                      AND NOT EXISTS (SELECT 1 FROM decisions d WHERE d.game_id = games.id AND d.timestamp >= ?)
+                    ORDER BY start_time LIMIT ?
+                ''', (cutoff, cutoff, batch_size)).fetchall()]
+                if game_ids:
+                    placeholders = ', '.join('?' for _ in game_ids)
+                    repository.execute(cursor, f'''
+                        UPDATE games SET end_time = ? WHERE id IN ({placeholders}) AND end_time IS NULL
+                    ''', (utc_now(), *game_ids))
+            reaped.extend(game_ids)
+            if len(game_ids) < batch_size:
+                break
+    return reaped
+
+
+def start_reaper(repository, interval, idle_minutes, on_reaped=None):
+    """Cierra partidas abandonadas cada `interval` segundos en un hilo daemon.
+    on_reaped(ids) libera el estado en memoria de esas partidas."""
+    def _loop():
+        while True:
+            time.sleep(interval)
+            try:
+                game_ids = reap_idle_games(repository, idle_minutes)
+                if game_ids:
+                    if on_reaped:
+                        on_reaped(game_ids)
+                    print(f"✅ {len(game_ids)} partidas abandonadas cerradas")
+            except Exception as e:
+                print(f"⚠️ Error cerrando partidas abandonadas: {e}")
+
+    thread = threading.Thread(target=_loop, name='idle-games-reaper', daemon=True)
+    thread.start()
+    return thread
+
+
+def run_maintenance(repository, vacuum_pages=VACUUM_PAGES):
+    """Retención + compactación + vacuum incremental. Devuelve un informe con los bytes recuperados."""
+    bytes_before = repository.logs_size_bytes()
+    rows_deleted = {
+        table: apply_retention(repository, table, max_age_days, max_rows)
+        for table, (max_age_days, max_rows) in retention_policy().items()
+    }
+    rows_compacted = compact_prompt_logs(repository)
+    rows_deleted['prompt_texts'] = delete_orphan_prompts(repository)
+    repository.vacuum_logs(vacuum_pages)
+    bytes_after = repository.logs_size_bytes()
+    return {
+        'rows_deleted': rows_deleted,
+        'rows_compacted': rows_compacted,
+        'bytes_before': bytes_before,
+        'bytes_after': bytes_after,
+        'bytes_reclaimed': max(0, bytes_before - bytes_after),
+    }
+
+
+def start_scheduler(repository, interval):
+    """Ejecuta el mantenimiento cada `interval` segundos en un hilo daemon"""
+    def _loop():
+        while True:
+            time.sleep(interval)
+            try:
+                report = run_maintenance(repository)
+                if report['bytes_reclaimed'] or any(report['rows_deleted'].values()):
+                    print(f"✅ Mantenimiento: {sum(report['rows_deleted'].values())} filas eliminadas, "
+                          f"{report['bytes_reclaimed']} bytes recuperados")
+            except Exception as e:
+                print(f"⚠️ Error en el mantenimiento de logs: {e}")
+
+    thread = threading.Thread(target=_loop, name='logs-maintenance', daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Retención, compactación y vacuum de logs y cache de dilemas')
+    parser.add_argument('--vacuum-pages', type=int, default=VACUUM_PAGES,
+                        help='Páginas máximas a liberar por ejecución (SQLite)')
+    parser.add_argument('--full-vacuum', action='store_true',
+                        help='VACUUM completo que activa auto_vacuum incremental en SQLite (bloquea)')
+    parser.add_argument('--reap-games', type=int, metavar='MINUTOS',
+                        help='Solo cerrar las partidas sin actividad en MINUTOS (sin límite de lotes)')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import repository
+
+    if args.reap_games is not None:
+        total = 0
+        while True:
+            game_ids = reap_idle_games(repository, args.reap_games)
+            total += len(game_ids)
+            if len(game_ids) < REAP_BATCH_SIZE * REAP_MAX_BATCHES:
+                break
+        print(f"[OK] {total} partidas abandonadas cerradas")
+        return
+
+    if args.full_vacuum:
+        if not hasattr(repository, 'full_vacuum_logs'):
+            print("[ERROR] --full-vacuum solo aplica al backend SQLite")
+            sys.exit(1)
+        before = repository.logs_size_bytes()
+        repository.full_vacuum_logs()
+        print(f"[OK] VACUUM completo: {before - repository.logs_size_bytes()} bytes recuperados")
+
+    report = run_maintenance(repository, args.vacuum_pages)
+    for table, count in report['rows_deleted'].items():
+        print(f"[OK] {table}: {count} filas eliminadas")
+    print(f"[OK] {report['rows_compacted']} registros compactados")
+    print(f"[OK] {report['bytes_reclaimed']} bytes recuperados "
+          f"({report['bytes_before']} -> {report['bytes_after']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Perfiles éticos vectorizados (NumPy)
+Cada jugador se resume en un histograma de 6 marcos éticos. Todos los perfiles viven
+en una matriz N x 6 que se actualiza de forma incremental con las decisiones nuevas
+(marca de agua por fuente, como los rollups de analytics.py) y responde con
+operaciones vectorizadas:
+
+- jugadores más parecidos: similitud coseno contra toda la matriz + argpartition (top-k)
+- percentil del jugador en cada marco: búsqueda binaria en columnas ordenadas de
+  proporciones, recalculadas solo cuando cambian los datos
+"""
+import threading
+
+import numpy as np
+
+FRAMEWORKS = ('utilitarianismo', 'deontologia', 'autonomia', 'paternalismo', 'ecocentrismo', 'antropocentrismo')
+FRAMEWORK_INDEX = {framework: column for column, framework in enumerate(FRAMEWORKS)}
+
+INITIAL_CAPACITY = 1024
+
+
+class ProfileEngine:
+    """Matriz de perfiles de todos los jugadores (una copia por proceso)"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self.names = []
+        self.index = {}
+        self.counts = np.zeros((INITIAL_CAPACITY, len(FRAMEWORKS)), dtype=np.float32)
+        self.unit = np.zeros_like(self.counts)
+        self._sorted_shares = None
+        self.watermarks = {}
+
+    @property
+    def size(self):
+        return len(self.names)
+
+    # ---------- Carga incremental ----------
+
+    def _rows_for(self, player_names):
+        """Fila de cada jugador, creando las que faltan (la matriz crece por duplicación)"""
+        rows = np.empty(len(player_names), dtype=np.int64)
+        for position, name in enumerate(player_names):
+            row = self.index.get(name)
+            if row is None:
+                row = self.index[name] = len(self.names)
+                self.names.append(name)
+            rows[position] = row
+        if self.size > len(self.counts):
+            capacity = max(self.size, 2 * len(self.counts))
+            for attribute in ('counts', 'unit'):
+                grown = np.zeros((capacity, len(FRAMEWORKS)), dtype=np.float32)
+                grown[:len(getattr(self, attribute))] = getattr(self, attribute)
+                setattr(self, attribute, grown)
+        return rows
+
+    def add_counts(self, player_names, columns, counts):
+        """Suma decisiones: (jugador, columna de marco, número) en arrays paralelos"""
+        with self._lock:
+            rows = self._rows_for(player_names)
+            np.add.at(self.counts, (rows, np.asarray(columns, dtype=np.int64)), np.asarray(counts, dtype=np.float32))
+            touched = np.unique(rows)
+            norms = np.linalg.norm(self.counts[touched], axis=1, keepdims=True)
+            self.unit[touched] = np.divide(self.counts[touched], norms, out=np.zeros_like(self.counts[touched]),
+                                           where=norms > 0)
+            self._sorted_shares = None
+
+    def refresh(self, repository):
+        """Incorpora las decisiones con id mayor que la marca de agua de cada fuente"""
+        added = 0
+        placeholders = ', '.join('?' for _ in FRAMEWORKS)
+        with self._refresh_lock:
+            for index in range(repository.source_count()):
+                since_id = self.watermarks.get(index, 0)
+                with repository.source(index) as conn:
+                    cursor = conn.cursor()
+                    upper_id = repository.execute(cursor, 'SELECT MAX(id) FROM decisions').fetchone()[0] or 0
+                    if upper_id <= since_id:
+                        continue
+                    rows = repository.execute(cursor, f'''
+                        SELECT g.player_name, d.ethical_framework, COUNT(*) FROM decisions d
+                        JOIN games g ON d.game_id = g.id
+                        WHERE d.id > ? AND d.id <= ? AND d.ethical_framework IN ({placeholders})
+                        GROUP BY g.player_name, d.ethical_framework
+                    ''', (since_id, upper_id) + FRAMEWORKS).fetchall()
+                if rows:
+                    names, frameworks, counts = zip(*rows)
+                    self.add_counts(names, [FRAMEWORK_INDEX[framework] for framework in frameworks], counts)
+                    added += sum(counts)
+                self.watermarks[index] = upper_id
+        return added
+
+    # ---------- Consultas ----------
+
+    def _shares(self):
+        totals = self.counts[:self.size].sum(axis=1, keepdims=True)
+        return np.divide(self.counts[:self.size], totals, out=np.zeros_like(self.counts[:self.size]),
+                         where=totals > 0)
+
+    def profile(self, player_name):
+        """Decisiones, proporción por marco y percentil por marco de un jugador o None"""
+        with self._lock:
+            row = self.index.get(player_name)
+            if row is None:
+                return None
+            if self._sorted_shares is None:
+                self._sorted_shares = np.sort(self._shares(), axis=0)
+            counts = self.counts[row]
+            total = float(counts.sum())
+            shares = counts / total if total else counts
+            # Percentil = % de jugadores con proporción estrictamente menor en ese marco
+            below = np.array([np.searchsorted(self._sorted_shares[:, column], shares[column], side='left')
+                              for column in range(len(FRAMEWORKS))])
+            percentiles = 100.0 * below / self.size
+        return {
+            'player_name': player_name,
+            'decisions': int(total),
+            'profile': {framework: round(float(share), 4) for framework, share in zip(FRAMEWORKS, shares)},
+            'percentiles': {framework: round(float(value), 1) for framework, value in zip(FRAMEWORKS, percentiles)}
+        }
+
+    def similar(self, player_name, k=5, min_decisions=1):
+        """Los k jugadores con perfil más parecido (coseno) con al menos min_decisions"""
+        with self._lock:
+            row = self.index.get(player_name)
+            if row is None:
+                return None
+            size = self.size
+            similarity = self.unit[:size] @ self.unit[row]
+            similarity[row] = -np.inf
+            if min_decisions > 1:
+                similarity[self.counts[:size].sum(axis=1) < min_decisions] = -np.inf
+            k = min(k, size - 1)
+            if k <= 0:
+                return []
+            top = np.argpartition(-similarity, k - 1)[:k]
+            top = top[np.argsort(-similarity[top])]
+            return [{
+                'player_name': self.names[other],
+                'similarity': round(float(similarity[other]), 4),
+                'decisions': int(self.counts[other].sum())
+            } for other in top if similarity[other] > -np.inf]
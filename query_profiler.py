@@ -0,0 +1,221 @@
+"""
+Perfilado de consultas SQLite por petición (opt-in)
+ProfiledConnection registra cada sentencia con set_trace_callback (incluidas las
+implícitas BEGIN/COMMIT) y mide el tiempo hasta que termina. Las sentencias se agrupan
+por huella (literales sustituidos por ?) y por endpoint de Flask, con recuento y tiempo
+total, medio y máximo. Las consultas lentas se registran con su EXPLAIN QUERY PLAN.
+
+Se activa con QUERY_PROFILE=1 (solo backend SQLite).
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+# Sin letra, dígito ni punto delante: no toca identificadores (shard1) y el signo entra en el literal
+_NUMBER_LITERAL = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+
+def fingerprint(sql):
+    """Forma normalizada de una sentencia: mismos valores distintos, misma huella"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    return _IN_LIST.sub('(?, ...)', sql)
+
+
+class QueryProfiler:
+    """Agregado de sentencias por (endpoint, huella); seguro entre hilos"""
+
+    def __init__(self, slow_ms=50):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {}
+
+    def set_endpoint(self, endpoint):
+        self._local.endpoint = endpoint
+
+    def current_endpoint(self):
+        # Fuera de una petición (hilos de analítica, mantenimiento...) se usa el nombre del hilo
+        return getattr(self._local, 'endpoint', None) or f'thread:{threading.current_thread().name}'
+
+    def record(self, sql, seconds):
+        """Suma una ejecución; devuelve la clave para añadir después el tiempo de fetch"""
+        key = (self.current_endpoint(), fingerprint(sql))
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                entry = self._stats[key] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+        return key
+
+    def add_time(self, key, seconds):
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry:
+                entry[1] += seconds
+                entry[2] = max(entry[2], seconds)
+
+    def report(self, endpoint=None):
+        """{endpoint: [sentencias ordenadas por tiempo total]}"""
+        with self._lock:
+            items = [(key, list(entry)) for key, entry in self._stats.items()]
+        result = {}
+        for (name, statement), (count, total, maximum) in items:
+            if endpoint and name != endpoint:
+                continue
+            result.setdefault(name, []).append({
+                'statement': statement,
+                'count': count,
+                'total_ms': round(total * 1000, 3),
+                'mean_ms': round(total * 1000 / count, 3),
+                'max_ms': round(maximum * 1000, 3)
+            })
+        for statements in result.values():
+            statements.sort(key=lambda s: s['total_ms'], reverse=True)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+
+    def log_slow(self, sql, seconds, plan):
+        print(f"🐢 Consulta lenta ({seconds * 1000:.1f} ms) en {self.current_endpoint()}: {_WHITESPACE.sub(' ', sql).strip()}")
+        for line in plan:
+            print(f"   {line}")
+
+
+profiler = QueryProfiler()
+
+
+class ProfiledCursor:
+    """Envuelve un cursor para sumar el tiempo de fetch a la última sentencia"""
+
+    def __init__(self, connection, cursor):
+        self._connection = connection
+        self._cursor = cursor
+
+    def execute(self, sql, parameters=()):
+        try:
+            self._cursor.execute(sql, parameters)
+        finally:
+            self._connection._statement_done()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        try:
+            self._cursor.executemany(sql, seq_of_parameters)
+        finally:
+            self._connection._statement_done()
+        return self
+
+    def _timed_fetch(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._connection._last_key:
+                profiler.add_time(self._connection._last_key, time.perf_counter() - start)
+
+    def fetchone(self):
+        return self._timed_fetch(self._cursor.fetchone)
+
+    def fetchall(self):
+        return self._timed_fetch(self._cursor.fetchall)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(self._cursor.fetchmany, size or self._cursor.arraysize)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Clase de conexión para storage.SQLiteRepository (parámetro connection_factory).
+
+    Cada sentencia empieza en el trace callback y termina con la siguiente o al volver
+    execute/commit. Las consultas lentas se explican al terminar (dentro del callback
+    no se puede ejecutar nada en la conexión).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending = None
+        self._last_key = None
+        self._slow = []
+        self._explaining = False
+        self.set_trace_callback(self._trace)
+
+    def _trace(self, sql):
+        if self._explaining:
+            return
+        now = time.perf_counter()
+        self._finish(now)
+        self._pending = (sql, now)
+
+    def _finish(self, now):
+        if self._pending is None:
+            return
+        sql, start = self._pending
+        self._pending = None
+        elapsed = now - start
+        self._last_key = profiler.record(sql, elapsed)
+        if elapsed * 1000 >= profiler.slow_ms:
+            self._slow.append((sql, elapsed))
+
+    def _statement_done(self):
+        self._finish(time.perf_counter())
+        slow, self._slow = self._slow, []
+        for sql, elapsed in slow:
+            profiler.log_slow(sql, elapsed, self._explain(sql))
+
+    def _explain(self, sql):
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return []
+        self._explaining = True
+        try:
+            rows = super().execute('EXPLAIN QUERY PLAN ' + sql).fetchall()
+            return [row[-1] for row in rows]
+        except Exception as e:
+            return [f'(EXPLAIN no disponible: {e})']
+        finally:
+            self._explaining = False
+
+    def cursor(self, *args, **kwargs):
+        return ProfiledCursor(self, super().cursor(*args, **kwargs))
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executescript(self, script):
+        try:
+            return super().executescript(script)
+        finally:
+            self._statement_done()
+
+    def commit(self):
+        try:
+            super().commit()
+        finally:
+            self._statement_done()
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self._statement_done()
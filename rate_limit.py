@@ -0,0 +1,204 @@
+"""
+Limitador de peticiones a la IA (token bucket)
+Cada clave (jugador, IP o global) tiene un cubo de `burst` fichas que se rellena a
+`per_minute` fichas por minuto; una llamada a Gemini consume una ficha. Si alguno de
+los cubos está vacío la petición no se rechaza: la app sirve contenido cacheado o
+predefinido.
+
+Dos almacenes con la misma interfaz:
+
+- 'memory': diccionario por proceso con locks repartidos por hash de la clave
+  (cada decisión toca un solo cubo bajo un lock de los LOCK_STRIPES).
+- 'sqlite': tabla común a todos los workers de la máquina; cada decisión es un
+  único UPSERT atómico, sin locks en Python.
+
+Ambos deciden en O(1); los cubos inactivos (que ya estarían llenos) se purgan cada
+PRUNE_EVERY decisiones.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+LIMITER_MODES = ('memory', 'sqlite')
+SCOPES = ('player', 'ip', 'global')
+LOCK_STRIPES = 64
+PRUNE_EVERY = 4096
+
+
+class TokenBuckets:
+    """Interfaz común de los almacenes de cubos"""
+
+    mode = None
+
+    def acquire(self, key, rate, capacity, cost=1):
+        """Consume `cost` fichas si las hay (rate en fichas/segundo). Devuelve True/False."""
+        raise NotImplementedError
+
+    def refund(self, key, capacity, cost=1):
+        """Devuelve fichas consumidas por una petición que al final no se admitió"""
+        raise NotImplementedError
+
+    def prune(self, idle_seconds):
+        """Elimina cubos sin uso desde hace idle_seconds (ya estarían llenos)"""
+        raise NotImplementedError
+
+
+class MemoryTokenBuckets(TokenBuckets):
+    """Cubos en memoria del proceso"""
+
+    mode = 'memory'
+
+    def __init__(self):
+        self._buckets = {}
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def _lock(self, key):
+        return self._locks[hash(key) % LOCK_STRIPES]
+
+    def acquire(self, key, rate, capacity, cost=1):
+        now = time.monotonic()
+        with self._lock(key):
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(capacity), now]
+            else:
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] < cost:
+                return False
+            bucket[0] -= cost
+            return True
+
+    def refund(self, key, capacity, cost=1):
+        with self._lock(key):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(capacity, bucket[0] + cost)
+
+    def prune(self, idle_seconds):
+        cutoff = time.monotonic() - idle_seconds
+        for key, bucket in list(self._buckets.items()):
+            if bucket[1] < cutoff:
+                with self._lock(key):
+                    if bucket[1] < cutoff:
+                        self._buckets.pop(key, None)
+
+
+class SQLiteTokenBuckets(TokenBuckets):
+    """Cubos en una base SQLite compartida por los workers (una conexión por hilo)"""
+
+    mode = 'sqlite'
+
+    # Relleno y consumo en una sola sentencia: si no hay fichas el WHERE del UPSERT
+    # no actualiza nada y rowcount es 0
+    _ACQUIRE_SQL = '''
+        INSERT INTO rate_buckets (key, tokens, updated_at) VALUES (:key, :capacity - :cost, :now)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = MIN(:capacity, tokens + (excluded.updated_at - updated_at) * :rate) - :cost,
+            updated_at = excluded.updated_at
+        WHERE MIN(:capacity, tokens + (excluded.updated_at - updated_at) * :rate) >= :cost
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                ) WITHOUT ROWID
+            ''')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def acquire(self, key, rate, capacity, cost=1):
+        cursor = self._connection().execute(self._ACQUIRE_SQL, {
+            'key': key, 'capacity': float(capacity), 'cost': cost, 'rate': rate, 'now': time.time()
+        })
+        return cursor.rowcount == 1
+
+    def refund(self, key, capacity, cost=1):
+        self._connection().execute('UPDATE rate_buckets SET tokens = MIN(?, tokens + ?) WHERE key = ?',
+                                   (float(capacity), cost, key))
+
+    def prune(self, idle_seconds):
+        self._connection().execute('DELETE FROM rate_buckets WHERE updated_at < ?', (time.time() - idle_seconds,))
+
+
+def create_buckets(mode, path=None):
+    """Almacén de cubos para LIMITER_MODES"""
+    if mode == 'memory':
+        return MemoryTokenBuckets()
+    if mode == 'sqlite':
+        return SQLiteTokenBuckets(path)
+    raise ValueError(f"AI_RATE_LIMIT_MODE desconocido: {mode} (usa {', '.join(LIMITER_MODES)})")
+
+
+class AdmissionControl:
+    """Decide si una petición puede llamar a la IA según los cubos de jugador, IP y global.
+
+    limits: {scope: (por_minuto, burst)}; un scope con por_minuto <= 0 no se limita.
+    """
+
+    def __init__(self, buckets, limits):
+        self.buckets = buckets
+        self.limits = {scope: (per_minute / 60.0, max(1, burst))
+                       for scope, (per_minute, burst) in limits.items() if per_minute > 0}
+        # Un cubo inactivo durante burst/rate segundos está lleno: se puede olvidar
+        self.idle_seconds = max((burst / rate for rate, burst in self.limits.values()), default=0)
+        self._counter_lock = threading.Lock()
+        self._decisions = 0
+        self._admitted = 0
+        self._denied = dict.fromkeys(SCOPES, 0)
+
+    def admit(self, player=None, ip=None):
+        """True si hay presupuesto de IA; si un cubo está vacío devuelve las fichas ya tomadas"""
+        keys = {'player': player, 'ip': ip, 'global': ''}
+        taken = []
+        denied_scope = None
+        for scope in SCOPES:
+            if scope not in self.limits or keys[scope] is None:
+                continue
+            rate, burst = self.limits[scope]
+            key = f'{scope}:{keys[scope]}'
+            if not self.buckets.acquire(key, rate, burst):
+                denied_scope = scope
+                break
+            taken.append((key, burst))
+        if denied_scope:
+            for key, burst in taken:
+                self.buckets.refund(key, burst)
+        self._count(denied_scope)
+        return denied_scope is None
+
+    def _count(self, denied_scope):
+        with self._counter_lock:
+            self._decisions += 1
+            if denied_scope:
+                self._denied[denied_scope] += 1
+            else:
+                self._admitted += 1
+            prune = self._decisions % PRUNE_EVERY == 0
+        if prune and self.idle_seconds:
+            self.buckets.prune(self.idle_seconds)
+
+    def stats(self):
+        with self._counter_lock:
+            return {
+                'mode': self.buckets.mode,
+                'limits': {scope: {'per_minute': round(rate * 60, 3), 'burst': burst}
+                           for scope, (rate, burst) in self.limits.items()},
+                'admitted': self._admitted,
+                'denied': dict(self._denied)
+            }
@@ -0,0 +1,125 @@
+"""
+Política adaptativa para servir dilemas: Gemini en vivo, pool cacheado o predefinidos
+Se observa la latencia y los errores de las últimas llamadas a Gemini (ventana
+deslizante) y se decide, en cada petición, si generar en vivo o servir un dilema ya
+generado. El objetivo es un SLO de latencia del tipo "p95 < 300 ms": con p95 el 5% de
+las respuestas puede superar el umbral (presupuesto de error). Si una fracción `slow`
+de las llamadas en vivo es lenta o falla, se envía a Gemini solo
+
+    live_fraction = min(1, presupuesto / slow)
+
+de las peticiones, con un mínimo de sondeo para detectar cuándo se recupera.
+"""
+import random
+import threading
+import time
+from collections import deque
+
+LIVE = 'live'
+CACHE = 'cache'
+PREDEFINED = 'predefined'
+SOURCES = (LIVE, CACHE, PREDEFINED)
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano de una lista no vacía"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class ServingPolicy:
+    """Ventana de latencias de Gemini y decisión live/cache/predefined por petición"""
+
+    def __init__(self, slo_ms=300, slo_percentile=95, window_seconds=60, max_samples=500,
+                 min_probe=0.02, refresh_seconds=1.0, rng=None):
+        self.slo = slo_ms / 1000.0
+        self.slo_percentile = slo_percentile
+        self.budget = 1 - slo_percentile / 100.0
+        self.window_seconds = window_seconds
+        self.min_probe = min_probe
+        self.refresh_seconds = refresh_seconds
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=max_samples)  # (instante, segundos, ok) de llamadas en vivo
+        self._served = deque(maxlen=max_samples)   # (instante, segundos) de respuestas servidas
+        self._live_fraction = 1.0
+        self._computed_at = 0.0
+        self._choices = dict.fromkeys((LIVE, CACHE), 0)
+        self._served_from = dict.fromkeys(SOURCES, 0)
+        self._fallbacks = 0
+        self._requests = 0
+        self._over_slo = 0
+
+    # ---------- Observaciones ----------
+
+    def record_live(self, seconds, ok):
+        """Resultado de una llamada a Gemini (ok=False si falló o la respuesta no era válida)"""
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds, ok))
+
+    def record_served(self, source, seconds, fallback=False):
+        """Origen y latencia total de una respuesta servida; fallback si el origen elegido no respondió"""
+        with self._lock:
+            self._served.append((time.monotonic(), seconds))
+            self._served_from[source] += 1
+            self._requests += 1
+            if seconds > self.slo:
+                self._over_slo += 1
+            if fallback:
+                self._fallbacks += 1
+
+    # ---------- Decisión ----------
+
+    def _window(self, samples, now):
+        cutoff = now - self.window_seconds
+        return [sample for sample in samples if sample[0] >= cutoff]
+
+    def _refresh(self, now):
+        live = self._window(self._samples, now)
+        if not live:
+            # Sin datos recientes se vuelve a probar Gemini con todo el tráfico
+            self._live_fraction = 1.0
+        else:
+            slow = sum(1 for _, seconds, ok in live if not ok or seconds > self.slo) / len(live)
+            self._live_fraction = 1.0 if slow <= self.budget else max(self.min_probe, self.budget / slow)
+        self._computed_at = now
+
+    def choose(self):
+        """Origen preferido para esta petición: LIVE o CACHE (que cae a PREDEFINED si está vacío)"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._computed_at >= self.refresh_seconds:
+                self._refresh(now)
+            source = LIVE if self.rng.random() < self._live_fraction else CACHE
+            self._choices[source] += 1
+        return source
+
+    # ---------- Métricas ----------
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            live = self._window(self._samples, now)
+            served = self._window(self._served, now)
+            latencies = [seconds for _, seconds, ok in live if ok]
+            errors = sum(1 for _, _, ok in live if not ok)
+            served_slow = sum(1 for _, seconds in served if seconds > self.slo)
+            return {
+                'slo_ms': round(self.slo * 1000, 1),
+                'slo_percentile': self.slo_percentile,
+                'window_seconds': self.window_seconds,
+                'live_fraction': round(self._live_fraction, 4),
+                'choices': dict(self._choices),
+                'served_from': dict(self._served_from),
+                'fallbacks': self._fallbacks,
+                'live_calls': len(live),
+                'live_error_rate': round(errors / len(live), 4) if live else None,
+                'live_p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+                'live_p95_ms': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+                'served_p95_ms': round(percentile([s for _, s in served], 95) * 1000, 1) if served else None,
+                # Fracción del presupuesto de error consumida en la ventana (1.0 = SLO al límite)
+                'budget_used': round(served_slow / (self.budget * len(served)), 4) if served and self.budget else None,
+                'requests': self._requests,
+                'requests_over_slo': self._over_slo
+            }
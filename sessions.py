@@ -0,0 +1,199 @@
+"""
+Sesiones de partida en memoria
+El jugador de una partida no cambia durante la sesión, pero make_decision, el limitador
+de IA y la selección de dilemas lo leían de `games` en cada petición, y get_stats
+recalculaba las agregaciones por marco y categoría con GROUP BY.
+
+GameSessionStore guarda por partida el jugador, el contador de dilemas respondidos y
+los recuentos por marco ético y por categoría. Se crea en start_game, se actualiza tras
+cada escritura (que sigue yendo a la base: write-through) y se descarta en end_game o
+tras `ttl_seconds` sin uso. Si la sesión no está (reinicio, otro worker) se recarga de
+la base (cold miss).
+
+Con varios workers otro proceso puede registrar decisiones de la misma partida: las
+estadísticas se validan con una lectura por clave primaria de dilemas_answered y, si no
+coincide con la sesión, se recargan.
+
+PlayerCoverageStore guarda por jugador (en todas sus partidas) los marcos y categorías
+ya elegidos para la selección dirigida de dilemas: se agregan de la base una vez y
+después se actualizan con cada decisión, en lugar de un GROUP BY por petición.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+def _game_key(game_id):
+    """game_id como entero: el JSON puede traer "5" y la URL 5, y deben ser la misma sesión"""
+    try:
+        return int(game_id)
+    except (TypeError, ValueError):
+        return None
+
+
+class GameSession:
+    __slots__ = ('player_name', 'dilemmas_answered', 'frameworks', 'categories', 'last_used')
+
+    def __init__(self, player_name, dilemmas_answered=0, frameworks=None, categories=None):
+        self.player_name = player_name
+        self.dilemmas_answered = dilemmas_answered
+        self.frameworks = dict(frameworks or {})
+        self.categories = dict(categories or {})
+        self.last_used = time.monotonic()
+
+    def as_stats(self):
+        """Mismo formato que GameRepository.get_game_stats"""
+        return {
+            'framework_stats': dict(self.frameworks),
+            'category_stats': dict(self.categories),
+            'total_decisions': sum(self.frameworks.values()),
+            'player_name': self.player_name,
+            'dilemmas_answered': self.dilemmas_answered
+        }
+
+
+class GameSessionStore:
+    """Sesiones por game_id con caducidad por inactividad (una copia por proceso)"""
+
+    def __init__(self, repository, ttl_seconds=1800, max_sessions=100000):
+        self.repository = repository
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._counters = {'hits': 0, 'misses': 0, 'reloads': 0, 'evictions': 0}
+
+    def _evict(self, now):
+        # Las sesiones menos usadas están al principio
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_sessions and now - oldest.last_used < self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def _put(self, game_id, session):
+        with self._lock:
+            self._sessions[game_id] = session
+            self._sessions.move_to_end(game_id)
+            self._evict(session.last_used)
+        return session
+
+    def _load(self, game_id):
+        """Reconstruye la sesión desde la base; None si la partida no existe"""
+        stats = self.repository.get_game_stats(game_id)
+        if stats['player_name'] is None:
+            return None
+        return self._put(game_id, GameSession(stats['player_name'], stats['dilemmas_answered'],
+                                              stats['framework_stats'], stats['category_stats']))
+
+    def _cached(self, game_id):
+        with self._lock:
+            session = self._sessions.get(game_id)
+            if session is not None:
+                session.last_used = time.monotonic()
+                self._sessions.move_to_end(game_id)
+                self._counters['hits'] += 1
+            else:
+                self._counters['misses'] += 1
+            return session
+
+    def start(self, game_id, player_name):
+        """Sesión nueva al crear la partida"""
+        self._put(_game_key(game_id), GameSession(player_name))
+
+    def get(self, game_id):
+        """Sesión de la partida (cargándola si hace falta) o None si no existe"""
+        game_id = _game_key(game_id)
+        if not game_id:
+            return None
+        return self._cached(game_id) or self._load(game_id)
+
+    def player_name(self, game_id):
+        session = self.get(game_id)
+        return session.player_name if session else None
+
+    def record(self, game_id, ethical_framework, dilemma_category):
+        """Refleja en la sesión una decisión ya guardada en la base"""
+        with self._lock:
+            session = self._sessions.get(_game_key(game_id))
+            if session is None:
+                return
+            session.dilemmas_answered += 1
+            session.frameworks[ethical_framework] = session.frameworks.get(ethical_framework, 0) + 1
+            session.categories[dilemma_category] = session.categories.get(dilemma_category, 0) + 1
+
+    def game_stats(self, game_id):
+        """Estadísticas de la partida desde memoria, validadas contra dilemas_answered"""
+        game_id = _game_key(game_id)
+        session = self._cached(game_id) if game_id else None
+        if session is not None:
+            if self.repository.get_game_answered(game_id) == session.dilemmas_answered:
+                with self._lock:
+                    return session.as_stats()
+            with self._lock:
+                self._counters['reloads'] += 1
+        session = self._load(game_id)
+        return session.as_stats() if session else self.repository.get_game_stats(game_id)
+
+    def end(self, game_id):
+        with self._lock:
+            self._sessions.pop(_game_key(game_id), None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return dict(self._counters, sessions=len(self._sessions), ttl_seconds=self.ttl_seconds,
+                        hit_rate=round(self._counters['hits'] / lookups, 4) if lookups else 0)
+
+
+class PlayerCoverageStore:
+    """Marcos y categorías elegidos por cada jugador, mantenidos de forma incremental.
+
+    Se cargan con get_achievement_metrics en el primer uso y se recargan tras
+    `ttl_seconds` (recoge las decisiones registradas por otros workers).
+    """
+
+    def __init__(self, repository, ttl_seconds=300, max_players=100000):
+        self.repository = repository
+        self.ttl_seconds = ttl_seconds
+        self.max_players = max_players
+        self._lock = threading.Lock()
+        self._players = OrderedDict()
+        self._counters = {'hits': 0, 'loads': 0, 'updates': 0}
+
+    def get(self, player_name):
+        """{'frameworks': {marco: n}, 'categories': {categorías}} del jugador (copia)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._players.get(player_name)
+            if entry is not None and now - entry[0] < self.ttl_seconds:
+                self._players.move_to_end(player_name)
+                self._counters['hits'] += 1
+                return {'frameworks': dict(entry[1]), 'categories': set(entry[2])}
+        metrics = self.repository.get_achievement_metrics(player_name)
+        frameworks, categories = dict(metrics['frameworks']), set(metrics['categories'])
+        with self._lock:
+            self._counters['loads'] += 1
+            self._players[player_name] = (now, frameworks, categories)
+            self._players.move_to_end(player_name)
+            while len(self._players) > self.max_players:
+                self._players.popitem(last=False)
+            return {'frameworks': dict(frameworks), 'categories': set(categories)}
+
+    def record(self, player_name, ethical_framework, dilemma_category):
+        """Refleja una decisión ya guardada (solo si el jugador está cargado)"""
+        with self._lock:
+            entry = self._players.get(player_name)
+            if entry is None:
+                return
+            _, frameworks, categories = entry
+            if ethical_framework:
+                frameworks[ethical_framework] = frameworks.get(ethical_framework, 0) + 1
+            if dilemma_category:
+                categories.add(dilemma_category)
+            self._counters['updates'] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, players=len(self._players), ttl_seconds=self.ttl_seconds)
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Simulación offline de jugadores sintéticos para planificar capacidad
+Juega partidas completas contra las rutas reales (cliente de pruebas de Flask, en el
+mismo proceso) con Gemini sustituido por un modelo falso determinista con latencia
+configurable. El comportamiento de los jugadores sigue distribuciones configurables:
+marco ético preferido, duración de la sesión y tiempo de reflexión.
+
+Informa del crecimiento de la base de datos por cada 1k sesiones, del coste de la
+comprobación de logros según el tamaño del historial y de la latencia por endpoint.
+
+Uso:
+    python simulate.py --players 10000 --concurrency 8
+    python simulate.py --players 2000 --ai-latency-ms 300 --time-scale 0.01 --json informe.json
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+FRAMEWORKS = ['utilitarianismo', 'deontologia', 'autonomia', 'paternalismo', 'ecocentrismo', 'antropocentrismo']
+
+
+# ==================== GEMINI SIMULADO ====================
+
+class FakeGenerativeModel:
+    """Sustituto determinista de genai.GenerativeModel con latencia configurable"""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def generate_content(self, prompt, generation_config=None):
+        engine = self.engine
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        rng = random.Random(digest)
+        if engine.latency_ms or engine.tail_ms:
+            time.sleep(engine.sample_latency())
+        with engine.lock:
+            engine.calls += 1
+            sequence = engine.calls
+
+        if 'Formato JSON' in prompt:
+            category = prompt.split("categoría '", 1)[-1].split("'", 1)[0]
+            first, second = rng.sample(FRAMEWORKS, 2)
+            text = json.dumps({
+                'category': category,
+                'scenario': f'Dilema simulado #{sequence} sobre {category}: ¿qué decisión tomas?',
+                'options': [
+                    {'text': f'Opción {first}', 'ethical_value': first},
+                    {'text': f'Opción {second}', 'ethical_value': second}
+                ]
+            }, ensure_ascii=False)
+            structured = (generation_config or {}).get('response_mime_type') == 'application/json'
+            return types.SimpleNamespace(text=engine.malform(text, structured))
+        return types.SimpleNamespace(text=f'Análisis simulado {digest.hex()[:12]}. ' + 'Reflexión. ' * 60)
+
+
+class FakeGemini:
+    """Módulo google.generativeai falso: solo GenerativeModel.
+
+    La latencia de cada llamada es normal(latency_ms, jitter_ms) y, con probabilidad
+    tail_probability, se le suma una cola exponencial de media tail_ms. Se sortea por
+    llamada (no por prompt): dos llamadas idénticas pueden tardar distinto.
+
+    Con malformed_probability una fracción de los dilemas generados llega mal formada
+    como en producción (markdown, texto extra, marcos con tildes, opciones largas o
+    JSON truncado); con salida estructurada solo quedan los truncamientos.
+    """
+
+    MALFORMATIONS = ('fences', 'prose', 'accent', 'long_option', 'unknown_framework', 'truncated')
+
+    def __init__(self, latency_ms=0, jitter_ms=0, tail_ms=0, tail_probability=0.0, seed=None,
+                 malformed_probability=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tail_ms = tail_ms
+        self.tail_probability = tail_probability
+        self.malformed_probability = malformed_probability
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def sample_latency(self):
+        """Segundos que tarda la siguiente llamada"""
+        with self.lock:
+            latency_ms = max(0.0, self.rng.gauss(self.latency_ms, self.jitter_ms))
+            if self.tail_ms and self.rng.random() < self.tail_probability:
+                latency_ms += self.rng.expovariate(1.0 / self.tail_ms)
+        return latency_ms / 1000
+
+    def malform(self, text, structured=False):
+        """Respuesta JSON tal cual o estropeada según malformed_probability"""
+        with self.lock:
+            if not self.malformed_probability or self.rng.random() >= self.malformed_probability:
+                return text
+            kind = self.rng.choice(self.MALFORMATIONS)
+            cut = self.rng.randint(len(text) // 2, len(text) - 2)
+        if structured and kind != 'truncated':
+            return text
+        if kind == 'fences':
+            return f'```json\n{text}\n```'
+        if kind == 'prose':
+            return f'Aquí tienes el dilema:\n{text}\nEspero que te sirva.'
+        if kind == 'accent':
+            return text.replace('"deontologia"', '"Deontología"').replace('"autonomia"', '"Autonomía"')
+        if kind == 'long_option':
+            return text.replace('"Opción ', '"Opción ' + 'muy detallada y larga ' * 8, 1)
+        if kind == 'unknown_framework':
+            return text.replace('"ethical_value": "', '"ethical_value": "virtud-', 1)
+        return text[:cut]
+
+    def GenerativeModel(self, name):
+        return FakeGenerativeModel(self)
+
+
+# ==================== JUGADORES SINTÉTICOS ====================
+
+def parse_mix(value):
+    """'utilitarianismo:3,deontologia:1' -> pesos por marco (los que faltan valen 0)"""
+    if not value:
+        return {framework: 1.0 for framework in FRAMEWORKS}
+    weights = {}
+    for part in value.split(','):
+        name, _, weight = part.partition(':')
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+class PlayerProfile:
+    """Preferencia ética de un jugador y distribuciones de su sesión"""
+
+    def __init__(self, rng, mix, consistency, mean_session_length, mean_think_time):
+        frameworks, weights = zip(*mix.items())
+        self.favourite = rng.choices(frameworks, weights)[0]
+        self.consistency = consistency
+        self.mean_session_length = mean_session_length
+        self.mean_think_time = mean_think_time
+
+    def session_length(self, rng):
+        # Geométrica: muchas sesiones cortas y unas pocas largas
+        return min(50, 1 + int(rng.expovariate(1 / max(self.mean_session_length - 1, 0.01))))
+
+    def think_time(self, rng):
+        return rng.expovariate(1 / self.mean_think_time) if self.mean_think_time > 0 else 0
+
+    def choose(self, rng, options):
+        preferred = [option for option in options if option['ethical_value'] == self.favourite]
+        if preferred and rng.random() < self.consistency:
+            return preferred[0]
+        return rng.choice(options)
+
+
+# ==================== MÉTRICAS ====================
+
+class Metrics:
+    """Latencias por endpoint y coste de logros, agrupados en tramos de 1k sesiones"""
+
+    def __init__(self, checkpoint_every, initial_bytes):
+        self.checkpoint_every = checkpoint_every
+        self.initial_bytes = initial_bytes
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.window = {}
+        self.achievement_window = []
+        self.errors = 0
+        self.sessions = 0
+        self.decisions = 0
+        self.checkpoints = []
+
+    def record(self, endpoint, seconds, ok):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            self.window.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors += 1
+            if endpoint == 'make_decision' and ok:
+                self.decisions += 1
+
+    def record_achievement_check(self, seconds):
+        with self.lock:
+            self.achievement_window.append(seconds)
+
+    def session_done(self, database_bytes):
+        """Cierra una sesión; cada checkpoint_every sesiones guarda un punto de la curva"""
+        with self.lock:
+            self.sessions += 1
+            if self.sessions % self.checkpoint_every:
+                return False
+            previous_bytes = self.checkpoints[-1]['db_bytes'] if self.checkpoints else self.initial_bytes
+            self.checkpoints.append({
+                'sessions': self.sessions,
+                'decisions': self.decisions,
+                'db_bytes': database_bytes(),
+                'achievement_check_ms': _mean_ms(self.achievement_window),
+                'endpoints': {endpoint: _percentiles(values) for endpoint, values in self.window.items()}
+            })
+            self.checkpoints[-1]['db_growth_bytes'] = self.checkpoints[-1]['db_bytes'] - previous_bytes
+            self.window = {}
+            self.achievement_window = []
+            return True
+
+
+def _mean_ms(values):
+    return round(statistics.fmean(values) * 1000, 3) if values else None
+
+
+def _percentiles(values):
+    values = sorted(values)
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 3)
+    return {'count': len(values), 'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99),
+            'max_ms': round(values[-1] * 1000, 3)}
+
+
+def database_size(repository):
+    """Bytes ocupados por la base de datos (archivos SQLite o pg_database_size)"""
+    if hasattr(repository, 'shard_paths'):
+        paths = dict.fromkeys(repository.shard_paths + [repository.logs_path])
+        return sum(os.path.getsize(path + suffix) for path in paths for suffix in ('', '-wal')
+                   if os.path.exists(path + suffix))
+    with repository.logs() as conn:
+        return repository.execute(conn.cursor(), 'SELECT pg_database_size(current_database())').fetchone()[0]
+
+
+# ==================== SIMULACIÓN ====================
+
+def play_session(app_module, client, metrics, profile, player_name, rng, time_scale):
+    """Una partida completa: start_game, N x (get_dilemma + make_decision), get_stats, end_game"""
+    def call(endpoint, method, url, **kwargs):
+        start = time.perf_counter()
+        response = getattr(client, method)(url, **kwargs)
+        metrics.record(endpoint, time.perf_counter() - start, response.status_code == 200)
+        return response
+
+    response = call('start_game', 'post', '/api/start_game', json={'player_name': player_name})
+    if response.status_code != 200:
+        return
+    game_id = response.get_json()['game_id']
+
+    for _ in range(profile.session_length(rng)):
+        dilemma = call('get_dilemma', 'get', f'/api/get_dilemma?game_id={game_id}').get_json()
+        if time_scale:
+            time.sleep(profile.think_time(rng) * time_scale)
+        option = profile.choose(rng, dilemma['options'])
+        call('make_decision', 'post', '/api/make_decision', json={
+            'game_id': game_id,
+            'dilemma_id': dilemma['id'],
+            'dilemma_text': dilemma['scenario'],
+            'dilemma_category': dilemma.get('category'),
+            'chosen_option': option['text'],
+            'ethical_framework': option['ethical_value'],
+            'full_dilemma': dilemma,
+        })
+
+    call('get_stats', 'get', f'/api/get_stats/{game_id}')
+    call('end_game', 'post', '/api/end_game', json={'game_id': game_id})
+    call('get_achievements', 'get', f'/api/get_achievements/{player_name}')
+
+
+def run_simulation(app_module, players=1000, sessions_per_player=1, concurrency=4, seed=42,
+                   framework_mix=None, consistency=0.75, mean_session_length=8, mean_think_time=5.0,
+                   time_scale=0.0, ai_latency_ms=0, ai_jitter_ms=0, ai_tail_ms=0, ai_tail_probability=0.0,
+                   ai_malformed_probability=0.0, use_ai=True, checkpoint_every=1000,
+                   progress=None):
+    """Ejecuta la simulación sobre un módulo app ya importado y devuelve el informe"""
+    repository = app_module.repository
+    metrics = Metrics(checkpoint_every, database_size(repository))
+
+    fake = FakeGemini(ai_latency_ms, ai_jitter_ms, ai_tail_ms, ai_tail_probability, seed, ai_malformed_probability)
+    if use_ai:
+        app_module._genai = fake
+        app_module.GOOGLE_API_KEY = 'simulated'
+
+    # Medir la comprobación de logros dentro de make_decision
+    original_check = app_module.check_and_unlock_achievements
+
+    def timed_check(player_name, game_id=None):
+        start = time.perf_counter()
+        try:
+            return original_check(player_name, game_id)
+        finally:
+            metrics.record_achievement_check(time.perf_counter() - start)
+
+    app_module.check_and_unlock_achievements = timed_check
+
+    mix = parse_mix(framework_mix)
+    local = threading.local()
+
+    def player_task(index):
+        if not hasattr(local, 'client'):
+            local.client = app_module.app.test_client()
+        rng = random.Random(seed * 1000003 + index)
+        profile = PlayerProfile(rng, mix, consistency, mean_session_length, mean_think_time)
+        for _ in range(sessions_per_player):
+            play_session(app_module, local.client, metrics, profile, f'sim-player-{index}', rng, time_scale)
+            if metrics.session_done(lambda: database_size(repository)) and progress:
+                progress(metrics.checkpoints[-1])
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(player_task, range(players)))
+    finally:
+        app_module.check_and_unlock_achievements = original_check
+    elapsed = time.perf_counter() - started
+
+    sessions = metrics.sessions
+    final_bytes = database_size(repository)
+    return {
+        'players': players,
+        'sessions': sessions,
+        'decisions': metrics.decisions,
+        'errors': metrics.errors,
+        'elapsed_seconds': round(elapsed, 2),
+        'sessions_per_second': round(sessions / elapsed, 2) if elapsed else None,
+        'ai_calls': fake.calls,
+        'db_bytes_start': metrics.initial_bytes,
+        'db_bytes_end': final_bytes,
+        'db_bytes_per_1k_sessions': round((final_bytes - metrics.initial_bytes) * 1000 / sessions) if sessions else None,
+        'endpoints': {endpoint: _percentiles(values) for endpoint, values in metrics.latencies.items()},
+        'checkpoints': metrics.checkpoints,
+    }
+
+
+def print_report(report):
+    print("=" * 72)
+    print("SIMULACIÓN DE CAPACIDAD")
+    print(f"jugadores={report['players']} sesiones={report['sessions']} decisiones={report['decisions']} "
+          f"errores={report['errors']} llamadas IA={report['ai_calls']}")
+    print(f"duración={report['elapsed_seconds']}s ({report['sessions_per_second']} sesiones/s)")
+    print(f"base de datos: {report['db_bytes_start']} -> {report['db_bytes_end']} bytes "
+          f"({report['db_bytes_per_1k_sessions']} bytes por 1k sesiones)")
+    print("=" * 72)
+    print(f"{'endpoint':<18}{'peticiones':>11}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for endpoint, stats in sorted(report['endpoints'].items()):
+        print(f"{endpoint:<18}{stats['count']:>11}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+              f"{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+    if report['checkpoints']:
+        print("-" * 72)
+        print(f"{'sesiones':>9}{'decisiones':>12}{'DB bytes':>13}{'+bytes':>11}{'logros ms':>11}{'decision p95':>14}")
+        for point in report['checkpoints']:
+            decision = point['endpoints'].get('make_decision', {})
+            print(f"{point['sessions']:>9}{point['decisions']:>12}{point['db_bytes']:>13}{point['db_growth_bytes']:>11}"
+                  f"{point['achievement_check_ms'] or '-':>11}{decision.get('p95_ms', '-'):>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulación de jugadores sintéticos contra las rutas reales')
+    parser.add_argument('--players', type=int, default=1000)
+    parser.add_argument('--sessions-per-player', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=4, help='Jugadores simultáneos (hilos)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--framework-mix', help="Pesos del marco favorito, p. ej. 'utilitarianismo:3,deontologia:1'")
+    parser.add_argument('--consistency', type=float, default=0.75,
+                        help='Probabilidad de elegir la opción del marco favorito cuando aparece')
+    parser.add_argument('--mean-session-length', type=float, default=8, help='Decisiones medias por partida')
+    parser.add_argument('--mean-think-time', type=float, default=5.0, help='Segundos medios de reflexión')
+    parser.add_argument('--time-scale', type=float, default=0.0,
+                        help='Fracción del tiempo de reflexión que se espera de verdad (0 = sin esperas)')
+    parser.add_argument('--ai-latency-ms', type=float, default=0)
+    parser.add_argument('--ai-jitter-ms', type=float, default=0)
+    parser.add_argument('--ai-tail-ms', type=float, default=0, help='Media de la cola exponencial de latencia')
+    parser.add_argument('--ai-tail-probability', type=float, default=0.0, help='Fracción de llamadas con cola')
+    parser.add_argument('--ai-malformed-probability', type=float, default=0.0,
+                        help='Fracción de dilemas generados que llegan mal formados')
+    parser.add_argument('--no-ai', action='store_true', help='Solo dilemas predefinidos, sin Gemini simulado')
+    parser.add_argument('--checkpoint-every', type=int, default=1000, help='Sesiones entre puntos de la curva')
+    parser.add_argument('--database', help='DATABASE_PATH a usar (por defecto uno temporal)')
+    parser.add_argument('--json', help='Guardar el informe completo en este archivo')
+    args = parser.parse_args()
+
+    # La simulación nunca escribe en la base de datos real salvo que se pida
+    os.environ['DATABASE_PATH'] = args.database or os.path.join(tempfile.mkdtemp(prefix='simulate_'), 'ethical_game.db')
+    os.environ.setdefault('ANALYTICS_REFRESH_SECONDS', '0')
+    os.environ.setdefault('MAINTENANCE_INTERVAL_SECONDS', '0')
+    # Todos los jugadores simulados comparten IP: el limitador de IA se activa explícitamente
+    os.environ.setdefault('AI_RATE_LIMIT_MODE', 'off')
+    os.environ['GOOGLE_API_KEY'] = ''
+    with contextlib.redirect_stdout(sys.stderr):
+        import app as app_module
+
+    print(f"[OK] Base de datos de la simulación: {os.environ['DATABASE_PATH']}", file=sys.stderr)
+    # Las rutas imprimen avisos por stdout: se desvían a stderr para dejar limpio el informe
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_simulation(
+            app_module, players=args.players, sessions_per_player=args.sessions_per_player,
+            concurrency=args.concurrency, seed=args.seed, framework_mix=args.framework_mix,
+            consistency=args.consistency, mean_session_length=args.mean_session_length,
+            mean_think_time=args.mean_think_time, time_scale=args.time_scale,
+            ai_latency_ms=args.ai_latency_ms, ai_jitter_ms=args.ai_jitter_ms,
+            ai_tail_ms=args.ai_tail_ms, ai_tail_probability=args.ai_tail_probability,
+            ai_malformed_probability=args.ai_malformed_probability, use_ai=not args.no_ai,
+            checkpoint_every=args.checkpoint_every,
+            progress=lambda point: print(f"... {point['sessions']} sesiones", file=sys.stderr, flush=True))
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"[OK] Informe guardado en {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Snapshots columnares (Parquet) del historial para análisis offline
+Copia de forma incremental decisions, games (solo partidas finalizadas) y
+player_achievements a archivos Parquet comprimidos con zstd, particionados por fecha
+(estilo Hive: <tabla>/date=YYYY-MM-DD/part-*.parquet). Solo se añaden archivos nuevos;
+_state.json guarda la marca de agua de cada tabla y fuente (shard).
+
+Requiere pyarrow (pip install pyarrow).
+
+Uso:
+    python snapshot.py                 # snapshot incremental
+    python snapshot.py --report        # marcos éticos por categoría desde el snapshot
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+from datetime import datetime
+
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots'))
+ROWS_PER_FILE = 100000
+CHUNK_SIZE = 5000
+
+# Marca de agua inicial para partidas (end_time, id): no puede ser '' en PostgreSQL
+_EPOCH = '0001-01-01 00:00:00'
+
+SNAPSHOT_TABLES = {
+    'decisions': {
+        'query': '''
+            SELECT d.id, d.game_id, g.player_name, d.dilemma_id, d.dilemma_category, d.dilemma_text,
+                   d.chosen_option, d.ethical_framework,
+                   CASE WHEN TRIM(COALESCE(d.analysis, '')) <> '' THEN 1 ELSE 0 END, d.timestamp
+            FROM decisions d
+            LEFT JOIN games g ON d.game_id = g.id
+            WHERE d.id > ?
+            ORDER BY d.id LIMIT ?
+        ''',
+        'columns': [('decision_id', 'int64'), ('game_id', 'int64'), ('player_name', 'string'),
+                    ('dilemma_id', 'int64'), ('dilemma_category', 'string'), ('dilemma_text', 'string'),
+                    ('chosen_option', 'string'), ('ethical_framework', 'string'),
+                    ('has_analysis', 'bool'), ('timestamp', 'timestamp')],
+        'date_column': 'timestamp',
+    },
+    'player_achievements': {
+        'query': '''
+            SELECT pa.id, pa.player_name, a.code, pa.unlocked_at
+            FROM player_achievements pa
+            JOIN achievements a ON pa.achievement_id = a.id
+            WHERE pa.id > ?
+            ORDER BY pa.id LIMIT ?
+        ''',
+        'columns': [('id', 'int64'), ('player_name', 'string'), ('achievement_code', 'string'),
+                    ('unlocked_at', 'timestamp')],
+        'date_column': 'unlocked_at',
+    },
+    # Las partidas cambian hasta que terminan: solo se copian las finalizadas, en orden
+    # de end_time. Si una partida se cierra dos veces aparece de nuevo (vale la última).
+    'games': {
+        'query': '''
+            SELECT id, player_name, start_time, end_time, dilemmas_answered
+            FROM games
+            WHERE end_time IS NOT NULL AND (end_time > ? OR (end_time = ? AND id > ?))
+            ORDER BY end_time, id LIMIT ?
+        ''',
+        'columns': [('game_id', 'int64'), ('player_name', 'string'), ('start_time', 'timestamp'),
+                    ('end_time', 'timestamp'), ('dilemmas_answered', 'int64')],
+        'date_column': 'end_time',
+    },
+}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("Los snapshots requieren pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def _to_datetime(value):
+    """SQLite devuelve timestamps como texto, PostgreSQL como datetime"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def _arrow_schema(pa, columns):
+    types = {'int64': pa.int64(), 'string': pa.string(), 'bool': pa.bool_(), 'timestamp': pa.timestamp('us')}
+    return pa.schema([('source', pa.int32())] + [(name, types[kind]) for name, kind in columns])
+
+
+def _load_state(snapshot_dir):
+    path = os.path.join(snapshot_dir, '_state.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_state(snapshot_dir, state):
+    path = os.path.join(snapshot_dir, '_state.json')
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _fetch_chunk(repository, index, table, watermark):
+    """Siguiente bloque de filas posteriores a la marca de agua y la nueva marca"""
+    spec = SNAPSHOT_TABLES[table]
+    if table == 'games':
+        end_time, last_id = watermark or (_EPOCH, 0)
+        params = (end_time, end_time, last_id, CHUNK_SIZE)
+    else:
+        params = (watermark or 0, CHUNK_SIZE)
+    with repository.source(index) as conn:
+        rows = repository.execute(conn.cursor(), spec['query'], params).fetchall()
+    if not rows:
+        return rows, watermark
+    last = rows[-1]
+    if table == 'games':
+        end_time = last[3]
+        return rows, [end_time if isinstance(end_time, str) else end_time.isoformat(sep=' '), last[0]]
+    return rows, last[0]
+
+
+def _write_partitions(pa, snapshot_dir, table, index, rows, run_stamp, part):
+    """Escribe las filas agrupadas por fecha, un archivo nuevo por partición"""
+    spec = SNAPSHOT_TABLES[table]
+    schema = _arrow_schema(pa, spec['columns'])
+    kinds = [kind for _, kind in spec['columns']]
+    date_position = [name for name, _ in spec['columns']].index(spec['date_column'])
+
+    by_date = {}
+    for row in rows:
+        values = [_to_datetime(v) if kind == 'timestamp' else (bool(v) if kind == 'bool' else v)
+                  for v, kind in zip(row, kinds)]
+        date = values[date_position]
+        by_date.setdefault(date.strftime('%Y-%m-%d') if date else 'unknown', []).append(values)
+
+    written = 0
+    for date, values in by_date.items():
+        columns = list(zip(*values))
+        arrays = [pa.array([index] * len(values), pa.int32())]
+        arrays += [pa.array(list(column), field.type) for column, field in zip(columns, list(schema)[1:])]
+        partition_dir = os.path.join(snapshot_dir, table, f'date={date}')
+        os.makedirs(partition_dir, exist_ok=True)
+        path = os.path.join(partition_dir, f'part-s{index}-{run_stamp}-{part:04d}.parquet')
+        pa.parquet.write_table(pa.Table.from_arrays(arrays, schema=schema), path + '.tmp', compression='zstd')
+        os.replace(path + '.tmp', path)
+        written += len(values)
+    return written
+
+
+def run_snapshot(repository, snapshot_dir=SNAPSHOT_DIR):
+    """Añade al snapshot las filas nuevas de cada tabla y fuente. Devuelve filas por tabla."""
+    pa = _require_pyarrow()
+    os.makedirs(snapshot_dir, exist_ok=True)
+    state = _load_state(snapshot_dir)
+    run_stamp = datetime.now().strftime('%Y%m%dT%H%M%S')
+    totals = {}
+
+    for table in SNAPSHOT_TABLES:
+        table_state = state.setdefault(table, {})
+        totals[table] = 0
+        for index in range(repository.source_count()):
+            watermark = table_state.get(str(index))
+            pending = []
+            part = 0
+            while True:
+                rows, next_watermark = _fetch_chunk(repository, index, table, watermark)
+                pending.extend(rows)
+                done = len(rows) < CHUNK_SIZE
+                if pending and (done or len(pending) >= ROWS_PER_FILE):
+                    totals[table] += _write_partitions(pa, snapshot_dir, table, index, pending, run_stamp, part)
+                    # La marca se guarda después de escribir: nunca se pierden filas
+                    table_state[str(index)] = next_watermark
+                    _save_state(snapshot_dir, state)
+                    pending = []
+                    part += 1
+                watermark = next_watermark
+                if done:
+                    break
+    return totals
+
+
+def read_snapshot(table, snapshot_dir=SNAPSHOT_DIR, columns=None, start_date=None, end_date=None):
+    """Lee un snapshot como tabla de Arrow, filtrando particiones por fecha (YYYY-MM-DD)"""
+    pa = _require_pyarrow()
+    ds = pa.dataset
+    partitioning = ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive')
+    dataset = ds.dataset(os.path.join(snapshot_dir, table), format='parquet', partitioning=partitioning)
+    condition = None
+    if start_date:
+        condition = ds.field('date') >= start_date
+    if end_date:
+        upper = ds.field('date') <= end_date
+        condition = upper if condition is None else condition & upper
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+def framework_by_category(snapshot_dir=SNAPSHOT_DIR, start_date=None, end_date=None):
+    """Conteo de decisiones por categoría y marco ético (agregación vectorizada)"""
+    table = read_snapshot('decisions', snapshot_dir, ['dilemma_category', 'ethical_framework'],
+                          start_date, end_date)
+    return table.group_by(['dilemma_category', 'ethical_framework']).aggregate([('ethical_framework', 'count')])
+
+
+def framework_by_date(snapshot_dir=SNAPSHOT_DIR, start_date=None, end_date=None):
+    """Conteo diario de decisiones por marco ético"""
+    table = read_snapshot('decisions', snapshot_dir, ['date', 'ethical_framework'], start_date, end_date)
+    return table.group_by(['date', 'ethical_framework']).aggregate([('ethical_framework', 'count')])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Snapshot Parquet incremental del historial de decisiones')
+    parser.add_argument('--dir', default=SNAPSHOT_DIR, help='Directorio del snapshot')
+    parser.add_argument('--report', action='store_true', help='Mostrar marcos éticos por categoría')
+    args = parser.parse_args()
+
+    if args.report:
+        table = framework_by_category(args.dir).sort_by([('dilemma_category', 'ascending'),
+                                                         ('ethical_framework_count', 'descending')])
+        for row in table.to_pylist():
+            print(f"{row['dilemma_category'] or '-':<16} {row['ethical_framework'] or '-':<18} {row['ethical_framework_count']}")
+        return
+
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import repository
+    totals = run_snapshot(repository, args.dir)
+    for table, count in totals.items():
+        print(f"[OK] {table}: {count} filas nuevas")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1027 @@
+"""
+Capa de almacenamiento del simulador
+Repositorios para partidas, decisiones, logros y cache de dilemas con dos backends:
+SQLite (archivo único o repartido en shards) y PostgreSQL (con pool de conexiones).
+"""
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Incrementar al cambiar tablas, columnas o índices: fuerza init_schema en el siguiente arranque
+SCHEMA_VERSION = 3
+
+GAMES_COLUMNS = 'id, player_name, start_time, end_time, total_score, dilemmas_answered'
+DECISIONS_COLUMNS = ('id, game_id, dilemma_id, dilemma_text, dilemma_category, '
+                     'chosen_option, ethical_framework, analysis, timestamp')
+
+# Columnas de la exportación de decisiones (decisions JOIN games)
+EXPORT_COLUMNS = [
+    ('decision_id', 'd.id'), ('game_id', 'd.game_id'), ('player_name', 'g.player_name'),
+    ('game_start_time', 'g.start_time'), ('game_end_time', 'g.end_time'),
+    ('dilemma_id', 'd.dilemma_id'), ('dilemma_category', 'd.dilemma_category'),
+    ('dilemma_text', 'd.dilemma_text'), ('chosen_option', 'd.chosen_option'),
+    ('ethical_framework', 'd.ethical_framework'), ('analysis', 'd.analysis'),
+    ('timestamp', 'd.timestamp'),
+]
+
+
+def compress_text(text):
+    """Comprime texto largo para guardarlo como BLOB (zlib)"""
+    return zlib.compress(text.encode('utf-8'), 9) if text is not None else None
+
+
+def decompress_text(blob):
+    """Inverso de compress_text (PostgreSQL devuelve memoryview)"""
+    return zlib.decompress(bytes(blob)).decode('utf-8') if blob is not None else None
+
+
+def _as_text(value):
+    """Normaliza timestamps: SQLite devuelve texto, PostgreSQL devuelve datetime"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def utc_now():
+    """Hora actual en UTC sin zona (mismo reloj que CURRENT_TIMESTAMP)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class PartialBatchError(Exception):
+    """record_decisions confirmó solo algunas fuentes.
+
+    players: jugador de cada posición confirmada (None en las fallidas).
+    failed: {posición: excepción} de las decisiones que no se guardaron.
+    """
+
+    def __init__(self, players, failed):
+        super().__init__(f"{len(failed)} de {len(players)} decisiones sin guardar: {next(iter(failed.values()))}")
+        self.players = players
+        self.failed = failed
+
+
+class GameRepository:
+    """Operaciones de datos del juego, independientes del motor de base de datos.
+
+    Las consultas usan SQL portable con placeholders '?'; cada backend aporta las
+    conexiones (gameplay, logs, all_gameplay), el esquema y la creación de partidas.
+    all_gameplay() expone las vistas all_games y all_decisions para lecturas globales.
+    """
+
+    placeholder = '?'
+
+    def execute(self, cursor, query, params=()):
+        """Ejecuta SQL escrito con '?' adaptando los placeholders al backend"""
+        if self.placeholder != '?':
+            query = query.replace('?', self.placeholder)
+        cursor.execute(query, params)
+        return cursor
+
+    def gameplay(self, player_name=None, game_id=None):
+        raise NotImplementedError
+
+    def logs(self):
+        raise NotImplementedError
+
+    def all_gameplay(self):
+        raise NotImplementedError
+
+    def source_count(self):
+        """Número de fuentes independientes de datos de juego (shards)"""
+        return 1
+
+    def source(self, index):
+        """Conexión a una fuente de datos de juego concreta"""
+        return self.gameplay()
+
+    def init_schema(self, achievements):
+        raise NotImplementedError
+
+    def create_game(self, player_name):
+        raise NotImplementedError
+
+    # ---------- Versión del esquema ----------
+
+    def get_schema_version(self):
+        """Versión registrada por set_schema_version o None si el esquema no existe"""
+        try:
+            with self.logs() as conn:
+                row = self.execute(conn.cursor(), 'SELECT version FROM schema_version').fetchone()
+        except Exception:
+            return None
+        return row[0] if row else None
+
+    def set_schema_version(self, version):
+        """Registra la versión del esquema recién creado o migrado"""
+        with self.logs() as conn:
+            cursor = conn.cursor()
+            self.execute(cursor, 'CREATE TABLE IF NOT EXISTS schema_version (version TEXT NOT NULL)')
+            self.execute(cursor, 'DELETE FROM schema_version')
+            self.execute(cursor, 'INSERT INTO schema_version (version) VALUES (?)', (version,))
+
+    # ---------- Partidas y decisiones ----------
+
+    def end_game(self, game_id):
+        """Marca el final de una partida (en UTC, como CURRENT_TIMESTAMP y el cierre de abandonadas)"""
+        with self.gameplay(game_id=game_id) as conn:
+            self.execute(conn.cursor(), 'UPDATE games SET end_time = ? WHERE id = ?',
+                          (utc_now(), game_id))
+
+    def get_game_player(self, game_id):
+        """Devuelve el nombre del jugador de una partida o None"""
+        with self.gameplay(game_id=game_id) as conn:
+            row = self.execute(conn.cursor(), 'SELECT player_name FROM games WHERE id = ?',
+                                (game_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_game_answered(self, game_id):
+        """dilemas_answered de una partida (None si no existe)"""
+        with self.gameplay(game_id=game_id) as conn:
+            row = self.execute(conn.cursor(), 'SELECT dilemmas_answered FROM games WHERE id = ?',
+                                (game_id,)).fetchone()
+        return row[0] if row else None
+
+    def record_decision(self, game_id, dilemma_id, dilemma_text, dilemma_category,
+                        chosen_option, ethical_framework, analysis, fetch_player=True):
+        """Guarda una decisión, incrementa el contador de la partida y devuelve el jugador
+        (con fetch_player=False no lo lee y devuelve None: el llamante ya lo conoce)"""
+        with self.gameplay(game_id=game_id) as conn:
+            cursor = conn.cursor()
+            self.execute(cursor, '''
+                INSERT INTO decisions (game_id, dilemma_id, dilemma_text, dilemma_category,
+                                       chosen_option, ethical_framework, analysis)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (game_id, dilemma_id, dilemma_text, dilemma_category,
+                  chosen_option, ethical_framework, analysis))
+            self.execute(cursor, 'UPDATE games SET dilemmas_answered = dilemmas_answered + 1 WHERE id = ?',
+                          (game_id,))
+            if not fetch_player:
+                return None
+            row = self.execute(cursor, 'SELECT player_name FROM games WHERE id = ?', (game_id,)).fetchone()
+        return row[0] if row else None
+
+    def source_for_game(self, game_id):
+        """Índice de la fuente (source) que contiene una partida"""
+        return 0
+
+    def record_decisions(self, decisions):
+        """Guarda un lote de decisiones con una transacción por fuente (group commit).
+
+        decisions: tuplas con los argumentos de record_decision. Devuelve el jugador de
+        cada una, en el mismo orden. Si alguna fuente falla, las demás se confirman igual
+        y se lanza PartialBatchError con las posiciones que no se guardaron.
+        """
+        by_source = {}
+        for position, decision in enumerate(decisions):
+            by_source.setdefault(self.source_for_game(decision[0]), []).append(position)
+        players = [None] * len(decisions)
+        failed = {}
+        for index, positions in by_source.items():
+            batch = [decisions[position] for position in positions]
+            answered = {}
+            for decision in batch:
+                answered[decision[0]] = answered.get(decision[0], 0) + 1
+            try:
+                with self.source(index) as conn:
+                    cursor = conn.cursor()
+                    for decision in batch:
+                        self.execute(cursor, '''
+                            INSERT INTO decisions (game_id, dilemma_id, dilemma_text, dilemma_category,
+                                                   chosen_option, ethical_framework, analysis)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ''', decision)
+                    names = {}
+                    for game_id, count in answered.items():
+                        self.execute(cursor, 'UPDATE games SET dilemmas_answered = dilemmas_answered + ? WHERE id = ?',
+                                      (count, game_id))
+                        row = self.execute(cursor, 'SELECT player_name FROM games WHERE id = ?', (game_id,)).fetchone()
+                        names[game_id] = row[0] if row else None
+            except Exception as e:
+                # La transacción de esta fuente se deshizo; las ya confirmadas no se repiten
+                failed.update((position, e) for position in positions)
+                continue
+            for position, decision in zip(positions, batch):
+                players[position] = names[decision[0]]
+        if failed:
+            raise PartialBatchError(players, failed)
+        return players
+
+    def get_game_stats(self, game_id):
+        """Estadísticas de una partida agrupadas por marco ético y categoría"""
+        with self.gameplay(game_id=game_id) as conn:
+            cursor = conn.cursor()
+            framework_stats = dict(self.execute(cursor, '''
+                SELECT ethical_framework, COUNT(*) FROM decisions
+                WHERE game_id = ? GROUP BY ethical_framework
+            ''', (game_id,)).fetchall())
+            category_stats = dict(self.execute(cursor, '''
+                SELECT dilemma_category, COUNT(*) FROM decisions
+                WHERE game_id = ? GROUP BY dilemma_category
+            ''', (game_id,)).fetchall())
+            game_info = self.execute(cursor, 'SELECT player_name, dilemmas_answered FROM games WHERE id = ?',
+                                      (game_id,)).fetchone()
+        return {
+            'framework_stats': framework_stats,
+            'category_stats': category_stats,
+            'total_decisions': sum(framework_stats.values()),
+            'player_name': game_info[0] if game_info else None,
+            'dilemmas_answered': game_info[1] if game_info else 0
+        }
+
+    def _export_query(self, since):
+        columns = ', '.join(expression for _, expression in EXPORT_COLUMNS)
+        query = f'''
+            SELECT {columns} FROM decisions d
+            LEFT JOIN games g ON d.game_id = g.id
+            WHERE d.id > ?'''
+        if since:
+            query += ' AND d.timestamp > ?'
+        return query + ' ORDER BY d.id'
+
+    def iter_decision_export(self, since_ids=None, since=None, chunk_size=500):
+        """Recorre decisions + games por bloques sin cargar la tabla en memoria.
+
+        Cada bloque es una consulta corta por clave (id > último), así una descarga
+        lenta no retiene el lock de lectura de SQLite entre bloques. since_ids indica
+        la última id exportada de cada fuente y since un timestamp mínimo.
+        Produce (fuente, fila) con las columnas de EXPORT_COLUMNS.
+        """
+        since_ids = since_ids or {}
+        query = self._export_query(since) + ' LIMIT ?'
+        for index in range(self.source_count()):
+            last_id = since_ids.get(index, 0)
+            while True:
+                params = (last_id, since, chunk_size) if since else (last_id, chunk_size)
+                with self.source(index) as conn:
+                    rows = self.execute(conn.cursor(), query, params).fetchall()
+                for row in rows:
+                    yield index, tuple(_as_text(value) for value in row)
+                if len(rows) < chunk_size:
+                    break
+                last_id = rows[-1][0]
+
+    def list_players(self):
+        """Nombres de todos los jugadores con alguna partida"""
+        with self.all_gameplay() as conn:
+            return [row[0] for row in self.execute(conn.cursor(), 'SELECT DISTINCT player_name FROM all_games').fetchall()]
+
+    # ---------- Logros ----------
+
+    def get_achievement_metrics(self, player_name, game_id=None):
+        """Agregados de las decisiones del jugador (o de una partida) en una sola consulta"""
+        query = '''
+            SELECT d.ethical_framework, d.dilemma_category, COUNT(*),
+                   SUM(CASE WHEN TRIM(COALESCE(d.analysis, '')) <> '' THEN 1 ELSE 0 END)
+            FROM decisions d
+            JOIN games g ON d.game_id = g.id
+            WHERE g.player_name = ?
+        '''
+        params = (player_name,)
+        if game_id:
+            query += ' AND d.game_id = ?'
+            params = (player_name, game_id)
+        query += ' GROUP BY d.ethical_framework, d.dilemma_category'
+
+        with self.gameplay(player_name=player_name) as conn:
+            rows = self.execute(conn.cursor(), query, params).fetchall()
+
+        metrics = {'total': 0, 'analyses': 0, 'frameworks': {}, 'categories': set()}
+        for framework, category, count, analyses in rows:
+            metrics['total'] += count
+            metrics['analyses'] += int(analyses or 0)
+            if framework:
+                metrics['frameworks'][framework] = metrics['frameworks'].get(framework, 0) + count
+            if category:
+                metrics['categories'].add(category)
+        return metrics
+
+    def get_locked_achievements(self, player_name):
+        """Logros que el jugador aún no ha desbloqueado"""
+        with self.gameplay(player_name=player_name) as conn:
+            return self.execute(conn.cursor(), '''
+                SELECT a.id, a.code, a.name, a.description, a.icon, a.achievement_type, a.condition_value
+                FROM achievements a
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM player_achievements pa
+                    WHERE pa.achievement_id = a.id AND pa.player_name = ?
+                )
+                ORDER BY a.id
+            ''', (player_name,)).fetchall()
+
+    def unlock_achievements(self, player_name, achievement_ids):
+        """Desbloquea logros y devuelve los ids realmente insertados (ignora carreras)"""
+        inserted = []
+        with self.gameplay(player_name=player_name) as conn:
+            cursor = conn.cursor()
+            for achievement_id in achievement_ids:
+                self.execute(cursor, '''
+                    INSERT INTO player_achievements (player_name, achievement_id)
+                    VALUES (?, ?) ON CONFLICT DO NOTHING
+                ''', (player_name, achievement_id))
+                if cursor.rowcount == 1:
+                    inserted.append(achievement_id)
+        return inserted
+
+    def get_player_achievements(self, player_name):
+        """Catálogo completo de logros con el estado de desbloqueo del jugador"""
+        with self.gameplay(player_name=player_name) as conn:
+            rows = self.execute(conn.cursor(), '''
+                SELECT a.code, a.name, a.description, a.icon, pa.unlocked_at
+                FROM achievements a
+                LEFT JOIN player_achievements pa
+                    ON pa.achievement_id = a.id AND pa.player_name = ?
+                ORDER BY a.id
+            ''', (player_name,)).fetchall()
+
+        unlocked = [{
+            'code': code,
+            'name': name,
+            'description': description,
+            'icon': icon,
+            'unlocked_at': _as_text(unlocked_at)
+        } for code, name, description, icon, unlocked_at in rows if unlocked_at is not None]
+        unlocked.sort(key=lambda a: a['unlocked_at'], reverse=True)
+
+        all_achievements_list = [{
+            'code': code,
+            'name': name,
+            'description': description,
+            'icon': icon,
+            'unlocked': unlocked_at is not None
+        } for code, name, description, icon, unlocked_at in rows]
+
+        return {
+            'unlocked': unlocked,
+            'all': all_achievements_list,
+            'total': len(all_achievements_list),
+            'unlocked_count': len(unlocked)
+        }
+
+    def get_unlocked_since(self, player_name, since, after_id=0):
+        """Códigos desbloqueados después del cursor (since, after_id), total desbloqueado y cursor siguiente.
+
+        El cursor es (unlocked_at, id de player_achievements): varios logros del mismo
+        segundo se entregan una sola vez. Con after_id=0 se incluye el segundo `since`.
+        """
+        with self.gameplay(player_name=player_name) as conn:
+            cursor = conn.cursor()
+            rows = self.execute(cursor, '''
+                SELECT a.code, pa.unlocked_at, pa.id FROM player_achievements pa
+                JOIN achievements a ON pa.achievement_id = a.id
+                WHERE pa.player_name = ?
+                  AND (pa.unlocked_at > ? OR (pa.unlocked_at = ? AND pa.id > ?))
+                ORDER BY pa.unlocked_at, pa.id
+            ''', (player_name, since, since, after_id)).fetchall()
+            unlocked_count = self.execute(cursor, 'SELECT COUNT(*) FROM player_achievements WHERE player_name = ?',
+                                          (player_name,)).fetchone()[0]
+        as_of, as_of_id = (_as_text(rows[-1][1]), rows[-1][2]) if rows else (since, after_id)
+        return [code for code, _, _ in rows], unlocked_count, as_of, as_of_id
+
+    def _seed_achievements(self, cursor, achievements):
+        for code, name, description, icon, achievement_type, condition_value in achievements:
+            self.execute(cursor, '''
+                INSERT INTO achievements (code, name, description, icon, achievement_type, condition_value)
+                VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (code) DO NOTHING
+            ''', (code, name, description, icon, achievement_type, condition_value))
+
+    # ---------- Cache de dilemas y logs ----------
+
+    def cache_dilemma(self, scenario, options_json, category, image_url):
+        """Guarda un dilema generado por IA (si ya existía solo completa la imagen) y devuelve su id"""
+        with self.logs() as conn:
+            cursor = conn.cursor()
+            self.execute(cursor, '''
+                INSERT INTO ai_dilemmas_cache (dilemma_text, scenario, options, category, image_url)
+                VALUES (?, ?, ?, ?, ?) ON CONFLICT (dilemma_text) DO NOTHING
+            ''', (scenario, scenario, options_json, category, image_url))
+            self.execute(cursor, 'UPDATE ai_dilemmas_cache SET image_url = ? WHERE dilemma_text = ? AND image_url IS NULL',
+                          (image_url, scenario))
+            row = self.execute(cursor, 'SELECT id FROM ai_dilemmas_cache WHERE dilemma_text = ?',
+                               (scenario,)).fetchone()
+        return row[0] if row else None
+
+    def get_cached_dilemma_image(self, scenario):
+        """URL de imagen guardada para un dilema cacheado o None"""
+        with self.logs() as conn:
+            row = self.execute(conn.cursor(), 'SELECT image_url FROM ai_dilemmas_cache WHERE dilemma_text = ?',
+                                (scenario,)).fetchone()
+        return row[0] if row and row[0] else None
+
+    def get_cached_dilemmas_since(self, last_id, limit=500):
+        """Dilemas IA cacheados con id > last_id en orden: [(id, dilema)] (el dilema lleva 'cache_id')"""
+        with self.logs() as conn:
+            rows = self.execute(conn.cursor(), '''
+                SELECT id, scenario, options, category, image_url FROM ai_dilemmas_cache
+                WHERE id > ? ORDER BY id LIMIT ?
+            ''', (last_id, limit)).fetchall()
+        return [(dilemma_id, {
+            'cache_id': dilemma_id,
+            'scenario': scenario,
+            'options': json.loads(options_json),
+            'category': category or 'general',
+            'image_url': image_url
+        }) for dilemma_id, scenario, options_json, category, image_url in rows]
+
+    def get_min_cached_dilemma_id(self):
+        """Id más antiguo que sigue en ai_dilemmas_cache (la retención borra los anteriores)"""
+        with self.logs() as conn:
+            return self.execute(conn.cursor(), 'SELECT MIN(id) FROM ai_dilemmas_cache').fetchone()[0]
+
+    def get_random_cached_dilemma(self):
+        """Un dilema IA cacheado al azar (salto aleatorio por id, sin ORDER BY RANDOM()) o None"""
+        with self.logs() as conn:
+            cursor = conn.cursor()
+            low, high = self.execute(cursor, 'SELECT MIN(id), MAX(id) FROM ai_dilemmas_cache').fetchone()
+            if low is None:
+                return None
+            row = self.execute(cursor, '''
+                SELECT id, scenario, options, category, image_url FROM ai_dilemmas_cache
+                WHERE id >= ? ORDER BY id LIMIT 1
+            ''', (random.randint(low, high),)).fetchone()
+        if not row:
+            return None
+        cache_id, scenario, options_json, category, image_url = row
+        return {
+            'cache_id': cache_id,
+            'scenario': scenario,
+            'options': json.loads(options_json),
+            'category': category or 'general',
+            'image_url': image_url
+        }
+
+    def set_dilemma_image(self, scenario, image_url):
+        """Actualiza la imagen de un dilema cacheado"""
+        with self.logs() as conn:
+            self.execute(conn.cursor(), 'UPDATE ai_dilemmas_cache SET image_url = ? WHERE dilemma_text = ?',
+                          (image_url, scenario))
+
+    def log_prompt(self, prompt, response):
+        """Registra un prompt fallido y su respuesta.
+
+        El prompt se deduplica por hash en prompt_texts (casi siempre es la misma
+        plantilla) y la respuesta se guarda comprimida con zlib.
+        """
+        with self.logs() as conn:
+            cursor = conn.cursor()
+            prompt_hash = self.store_prompt_text(cursor, prompt)
+            self.execute(cursor, 'INSERT INTO prompts_log (prompt_hash, response_zlib) VALUES (?, ?)',
+                         (prompt_hash, compress_text(response)))
+
+    def store_prompt_text(self, cursor, prompt):
+        """Guarda el texto del prompt una sola vez y devuelve su hash"""
+        if prompt is None:
+            return None
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        self.execute(cursor, '''
+            INSERT INTO prompt_texts (hash, prompt_zlib) VALUES (?, ?)
+            ON CONFLICT (hash) DO NOTHING
+        ''', (prompt_hash, compress_text(prompt)))
+        return prompt_hash
+
+    def get_prompt_logs(self, limit=50):
+        """Últimos registros de prompts_log con los textos descomprimidos"""
+        with self.logs() as conn:
+            rows = self.execute(conn.cursor(), '''
+                SELECT l.id, l.prompt_text, t.prompt_zlib, l.response_text, l.response_zlib, l.timestamp
+                FROM prompts_log l
+                LEFT JOIN prompt_texts t ON l.prompt_hash = t.hash
+                ORDER BY l.id DESC LIMIT ?
+            ''', (limit,)).fetchall()
+        return [{
+            'id': log_id,
+            'prompt': prompt_text if prompt_text is not None else decompress_text(prompt_zlib),
+            'response': response_text if response_text is not None else decompress_text(response_zlib),
+            'timestamp': _as_text(timestamp)
+        } for log_id, prompt_text, prompt_zlib, response_text, response_zlib, timestamp in rows]
+
+    def logs_size_bytes(self):
+        """Espacio ocupado por las tablas de logs y cache"""
+        raise NotImplementedError
+
+    def vacuum_logs(self, max_pages):
+        """Devuelve espacio libre al sistema sin bloquear el juego (trabajo acotado)"""
+        raise NotImplementedError
+
+
+# ==================== BACKEND SQLITE ====================
+
+# Bases adjuntables a la vez con ATTACH (SQLITE_MAX_ATTACHED por defecto)
+MAX_SHARDS = 10
+
+
+class SQLiteRepository(GameRepository):
+    """Backend SQLite.
+
+    mode='single': todas las tablas viven en un archivo.
+    mode='sharded': prompts_log y ai_dilemmas_cache van a <base>_logs.db y los datos
+    de juego se reparten en shard_count archivos <base>_shard<N>.db según el hash de
+    player_name, para que escritores de distintos jugadores no compartan lock.
+    """
+
+    def __init__(self, database, mode='single', shard_count=4, connection_factory=sqlite3.Connection):
+        self.database = database
+        self.mode = mode
+        # all_gameplay() adjunta los shards con ATTACH (máximo 10 por defecto en SQLite).
+        # No se recorta: cambiar el número de shards cambia el reparto jugador -> shard
+        if mode == 'sharded' and not 1 <= shard_count <= MAX_SHARDS:
+            raise ValueError(f"SHARD_COUNT={shard_count} no válido: debe estar entre 1 y {MAX_SHARDS} "
+                             f"(límite de ATTACH de SQLite)")
+        self.shard_count = shard_count if mode == 'sharded' else 1
+        # Clase de conexión (p. ej. query_profiler.ProfiledConnection para perfilar consultas)
+        self.connection_factory = connection_factory
+
+    def _connect(self, path):
+        return sqlite3.connect(path, factory=self.connection_factory)
+
+    def is_sharded(self):
+        """Indica si el almacenamiento está repartido en varios archivos"""
+        return self.mode == 'sharded'
+
+    def _storage_file(self, suffix):
+        """Ruta de un archivo auxiliar junto a la base (ej. ethical_game_logs.db)"""
+        base, ext = os.path.splitext(self.database)
+        return f"{base}_{suffix}{ext or '.db'}"
+
+    @property
+    def logs_path(self):
+        """Archivo que contiene prompts_log y ai_dilemmas_cache"""
+        return self._storage_file('logs') if self.is_sharded() else self.database
+
+    @property
+    def shard_paths(self):
+        """Archivos con los datos de juego, en orden de índice de shard"""
+        if not self.is_sharded():
+            return [self.database]
+        return [self._storage_file(f'shard{i}') for i in range(self.shard_count)]
+
+    def shard_for_player(self, player_name):
+        """Shard estable de un jugador (crc32: hash() cambia entre procesos)"""
+        return zlib.crc32((player_name or '').encode('utf-8')) % self.shard_count
+
+    def shard_for_game(self, game_id):
+        """Shard de una partida: los ids se asignan intercalados (id - 1) % shard_count"""
+        return (int(game_id) - 1) % self.shard_count
+
+    def connect_gameplay(self, player_name=None, game_id=None):
+        """Conexión al archivo con los datos del jugador o partida indicados"""
+        if player_name is not None:
+            index = self.shard_for_player(player_name)
+        elif game_id is not None:
+            index = self.shard_for_game(game_id)
+        else:
+            index = 0
+        return self._connect(self.shard_paths[index])
+
+    def connect_logs(self):
+        """Conexión al archivo de logs y cache de dilemas"""
+        return self._connect(self.logs_path)
+
+    def connect_all(self):
+        """Conexión con todos los shards adjuntos (ATTACH) y las vistas all_games/all_decisions"""
+        paths = self.shard_paths
+        conn = self._connect(paths[0])
+        schemas = ['main']
+        for index, path in enumerate(paths[1:], start=1):
+            conn.execute(f'ATTACH DATABASE ? AS shard{index}', (path,))
+            schemas.append(f'shard{index}')
+        for view, table, columns in (('all_games', 'games', GAMES_COLUMNS),
+                                     ('all_decisions', 'decisions', DECISIONS_COLUMNS)):
+            union = ' UNION ALL '.join(f'SELECT {columns} FROM {schema}.{table}' for schema in schemas)
+            conn.execute(f'CREATE TEMP VIEW IF NOT EXISTS {view} AS {union}')
+        return conn
+
+    @contextmanager
+    def _transaction(self, conn):
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def gameplay(self, player_name=None, game_id=None):
+        return self._transaction(self.connect_gameplay(player_name, game_id))
+
+    def logs(self):
+        return self._transaction(self.connect_logs())
+
+    def all_gameplay(self):
+        return self._transaction(self.connect_all())
+
+    def source_count(self):
+        return len(self.shard_paths)
+
+    def source_for_game(self, game_id):
+        return self.shard_for_game(game_id) if self.is_sharded() else 0
+
+    def source(self, index):
+        return self._transaction(self._connect(self.shard_paths[index]))
+
+    def get_schema_version(self):
+        # Un archivo borrado (p. ej. /tmp en serverless) obliga a recrear el esquema
+        if not all(os.path.exists(path) for path in self.shard_paths + [self.logs_path]):
+            return None
+        return super().get_schema_version()
+
+    def logs_size_bytes(self):
+        """Tamaño del archivo de logs (page_count * page_size)"""
+        with self.logs() as conn:
+            page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        return page_count * page_size
+
+    def vacuum_logs(self, max_pages):
+        """Libera hasta max_pages páginas (incremental_vacuum) y actualiza estadísticas.
+
+        Cada llamada toma el lock de escritura solo lo necesario para mover esas
+        páginas; PRAGMA optimize ejecuta ANALYZE únicamente donde hace falta.
+        """
+        conn = self.connect_logs()
+        try:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+                # executescript ejecuta el PRAGMA hasta el final (execute solo libera una página)
+                conn.executescript(f'PRAGMA incremental_vacuum({int(max_pages)});')
+            conn.execute('PRAGMA analysis_limit = 1000')
+            conn.execute('PRAGMA optimize')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def full_vacuum_logs(self):
+        """VACUUM completo que activa auto_vacuum incremental (bloquea: usar fuera de horario)"""
+        conn = self.connect_logs()
+        try:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
+
+    def create_game(self, player_name):
+        """Inserta una partida y devuelve su id.
+
+        En modo sharded cada shard asigna ids del tipo shard + 1 + k * shard_count, así
+        el id es único globalmente y shard_for_game() sabe dónde buscarlo.
+        """
+        with self.gameplay(player_name=player_name) as conn:
+            cursor = conn.cursor()
+            if not self.is_sharded():
+                cursor.execute('INSERT INTO games (player_name) VALUES (?)', (player_name,))
+            else:
+                index = self.shard_for_player(player_name)
+                cursor.execute(
+                    'INSERT INTO games (id, player_name) VALUES ((SELECT COALESCE(MAX(id), ?) + ? FROM games), ?)',
+                    (index + 1 - self.shard_count, self.shard_count, player_name)
+                )
+            return cursor.lastrowid
+
+    def init_schema(self, achievements):
+        """Crea tablas, aplica migraciones y siembra el catálogo de logros en cada archivo"""
+        shard_paths = self.shard_paths
+        logs_path = self.logs_path
+        for path in dict.fromkeys(shard_paths + [logs_path]):
+            conn = self._connect(path)
+            cursor = conn.cursor()
+
+            if path == logs_path:
+                # Solo tiene efecto en archivos nuevos; maintenance.py --full-vacuum convierte los existentes
+                cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            if path in shard_paths:
+                self._create_gameplay_tables(cursor)
+            if path == logs_path:
+                self._create_log_tables(cursor)
+
+            # Migración: Agregar columnas faltantes si no existen
+            self._migrate(cursor)
+
+            if path in shard_paths:
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_games_player_name ON games (player_name)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_decisions_game_id ON decisions (game_id)')
+                # Índice parcial: solo partidas abiertas, para encontrar las abandonadas sin recorrer todas
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_games_open ON games (start_time) WHERE end_time IS NULL')
+                # Cada shard tiene su copia del catálogo de logros
+                self._seed_achievements(cursor, achievements)
+
+            conn.commit()
+            conn.close()
+
+    def _create_gameplay_tables(self, cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS games (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                player_name TEXT NOT NULL,
+                start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                end_time TIMESTAMP,
+                total_score INTEGER DEFAULT 0,
+                dilemmas_answered INTEGER DEFAULT 0
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS decisions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                game_id INTEGER,
+                dilemma_id INTEGER,
+                dilemma_text TEXT,
+                dilemma_category TEXT,
+                chosen_option TEXT,
+                ethical_framework TEXT,
+                analysis TEXT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (game_id) REFERENCES games (id)
+            )
+        ''')
+
+        # Tabla para logros disponibles
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS achievements (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                code TEXT UNIQUE NOT NULL,
+                name TEXT NOT NULL,
+                description TEXT NOT NULL,
+                icon TEXT NOT NULL,
+                achievement_type TEXT NOT NULL,
+                condition_value TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Tabla para logros desbloqueados por jugadores
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS player_achievements (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                player_name TEXT NOT NULL,
+                achievement_id INTEGER NOT NULL,
+                unlocked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (achievement_id) REFERENCES achievements (id),
+                UNIQUE(player_name, achievement_id)
+            )
+        ''')
+
+    def _create_log_tables(self, cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS prompts_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                prompt_text TEXT,
+                response_text TEXT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                prompt_hash TEXT,
+                response_zlib BLOB
+            )
+        ''')
+
+        # Textos de prompt deduplicados por hash y comprimidos
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS prompt_texts (
+                hash TEXT PRIMARY KEY,
+                prompt_zlib BLOB
+            )
+        ''')
+
+        # Tabla para cache de dilemas generados por IA
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_dilemmas_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                dilemma_text TEXT UNIQUE,
+                scenario TEXT,
+                options TEXT,
+                category TEXT,
+                image_url TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+    def _migrate(self, cursor):
+        """Migrate database schema to add new columns if they don't exist"""
+        # En modo sharded cada archivo tiene solo parte de las tablas: las ausentes se omiten
+        try:
+            # Verificar columnas existentes en decisions
+            cursor.execute('PRAGMA table_info(decisions)')
+            existing_columns = [col[1] for col in cursor.fetchall()]
+
+            # Agregar dilemma_category si no existe
+            if existing_columns and 'dilemma_category' not in existing_columns:
+                cursor.execute('ALTER TABLE decisions ADD COLUMN dilemma_category TEXT')
+                print("✅ Agregada columna 'dilemma_category' a la tabla decisions")
+
+            # Agregar analysis si no existe
+            if existing_columns and 'analysis' not in existing_columns:
+                cursor.execute('ALTER TABLE decisions ADD COLUMN analysis TEXT')
+                print("✅ Agregada columna 'analysis' a la tabla decisions")
+
+            # Verificar columnas existentes en games
+            cursor.execute('PRAGMA table_info(games)')
+            existing_columns_games = [col[1] for col in cursor.fetchall()]
+
+            # Agregar dilemmas_answered si no existe
+            if existing_columns_games and 'dilemmas_answered' not in existing_columns_games:
+                cursor.execute('ALTER TABLE games ADD COLUMN dilemmas_answered INTEGER DEFAULT 0')
+                print("✅ Agregada columna 'dilemmas_answered' a la tabla games")
+
+            # Verificar columnas existentes en prompts_log
+            cursor.execute('PRAGMA table_info(prompts_log)')
+            existing_columns_log = [col[1] for col in cursor.fetchall()]
+
+            # Agregar columnas de almacenamiento comprimido si no existen
+            for column, column_type in (('prompt_hash', 'TEXT'), ('response_zlib', 'BLOB')):
+                if existing_columns_log and column not in existing_columns_log:
+                    cursor.execute(f'ALTER TABLE prompts_log ADD COLUMN {column} {column_type}')
+                    print(f"✅ Agregada columna '{column}' a la tabla prompts_log")
+
+            # Verificar columnas existentes en ai_dilemmas_cache
+            cursor.execute('PRAGMA table_info(ai_dilemmas_cache)')
+            existing_columns_cache = [col[1] for col in cursor.fetchall()]
+
+            # Agregar image_url si no existe
+            if existing_columns_cache and 'image_url' not in existing_columns_cache:
+                cursor.execute('ALTER TABLE ai_dilemmas_cache ADD COLUMN image_url TEXT')
+                print("✅ Agregada columna 'image_url' a la tabla ai_dilemmas_cache")
+
+        except Exception as e:
+            print(f"⚠️ Error durante la migración: {e}")
+            # No lanzar excepción, solo registrar el error
+
+
+# ==================== BACKEND POSTGRESQL ====================
+
+class PostgresRepository(GameRepository):
+    """Backend PostgreSQL con pool de conexiones compartido entre hilos.
+
+    Requiere psycopg2 (pip install psycopg2-binary). Las vistas all_games y
+    all_decisions se crean sobre las tablas para compartir consultas con SQLite.
+    """
+
+    placeholder = '%s'
+
+    def __init__(self, dsn, min_connections=1, max_connections=10):
+        try:
+            from psycopg2.pool import ThreadedConnectionPool
+        except ImportError as e:
+            raise RuntimeError("STORAGE_BACKEND=postgres requiere psycopg2 (pip install psycopg2-binary)") from e
+        self.dsn = dsn
+        self.pool = ThreadedConnectionPool(min_connections, max_connections, dsn)
+
+    @contextmanager
+    def _pooled(self):
+        conn = self.pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            # Incluye GeneratorExit: una exportación interrumpida no deja la transacción abierta
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def gameplay(self, player_name=None, game_id=None):
+        return self._pooled()
+
+    def logs(self):
+        return self._pooled()
+
+    def all_gameplay(self):
+        return self._pooled()
+
+    def iter_decision_export(self, since_ids=None, since=None, chunk_size=500):
+        """Recorre la exportación con un cursor de servidor (named cursor) y fetchmany.
+
+        Con MVCC la lectura no bloquea a los escritores, así que se usa una sola
+        consulta con snapshot consistente en lugar de paginar por clave.
+        """
+        since_ids = since_ids or {}
+        params = (since_ids.get(0, 0), since) if since else (since_ids.get(0, 0),)
+        with self._pooled() as conn:
+            cursor = conn.cursor(name='decisions_export')
+            cursor.itersize = chunk_size
+            cursor.execute(self._export_query(since).replace('?', '%s'), params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield 0, tuple(_as_text(value) for value in row)
+            cursor.close()
+
+    def logs_size_bytes(self):
+        """Tamaño total (tabla + índices + TOAST) de las tablas de logs y cache"""
+        with self._pooled() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COALESCE(SUM(pg_total_relation_size(c)), 0)
+                FROM unnest(ARRAY['prompts_log', 'prompt_texts', 'ai_dilemmas_cache']::regclass[]) AS c
+            ''')
+            return int(cursor.fetchone()[0])
+
+    def vacuum_logs(self, max_pages):
+        """VACUUM ANALYZE de las tablas de logs (no bloquea lecturas ni escrituras)"""
+        conn = self.pool.getconn()
+        try:
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute('VACUUM (ANALYZE) prompts_log, prompt_texts, ai_dilemmas_cache')
+        finally:
+            conn.autocommit = False
+            self.pool.putconn(conn)
+
+    def close(self):
+        """Cierra todas las conexiones del pool"""
+        self.pool.closeall()
+
+    def create_game(self, player_name):
+        """Inserta una partida y devuelve su id"""
+        with self._pooled() as conn:
+            cursor = conn.cursor()
+            cursor.execute('INSERT INTO games (player_name) VALUES (%s) RETURNING id', (player_name,))
+            return cursor.fetchone()[0]
+
+    def init_schema(self, achievements):
+        """Crea tablas, índices y vistas y siembra el catálogo de logros"""
+        with self._pooled() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS games (
+                    id SERIAL PRIMARY KEY,
+                    player_name TEXT NOT NULL,
+                    start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    end_time TIMESTAMP,
+                    total_score INTEGER DEFAULT 0,
+                    dilemmas_answered INTEGER DEFAULT 0
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS decisions (
+                    id SERIAL PRIMARY KEY,
+                    game_id INTEGER REFERENCES games (id),
+                    dilemma_id INTEGER,
+                    dilemma_text TEXT,
+                    dilemma_category TEXT,
+                    chosen_option TEXT,
+                    ethical_framework TEXT,
+                    analysis TEXT,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS prompts_log (
+                    id SERIAL PRIMARY KEY,
+                    prompt_text TEXT,
+                    response_text TEXT,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    prompt_hash TEXT,
+                    response_zlib BYTEA
+                )
+            ''')
+            cursor.execute('ALTER TABLE prompts_log ADD COLUMN IF NOT EXISTS prompt_hash TEXT')
+            cursor.execute('ALTER TABLE prompts_log ADD COLUMN IF NOT EXISTS response_zlib BYTEA')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS prompt_texts (
+                    hash TEXT PRIMARY KEY,
+                    prompt_zlib BYTEA
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS ai_dilemmas_cache (
+                    id SERIAL PRIMARY KEY,
+                    dilemma_text TEXT UNIQUE,
+                    scenario TEXT,
+                    options TEXT,
+                    category TEXT,
+                    image_url TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS achievements (
+                    id SERIAL PRIMARY KEY,
+                    code TEXT UNIQUE NOT NULL,
+                    name TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    icon TEXT NOT NULL,
+                    achievement_type TEXT NOT NULL,
+                    condition_value TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS player_achievements (
+                    id SERIAL PRIMARY KEY,
+                    player_name TEXT NOT NULL,
+                    achievement_id INTEGER NOT NULL REFERENCES achievements (id),
+                    unlocked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (player_name, achievement_id)
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_games_player_name ON games (player_name)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_decisions_game_id ON decisions (game_id)')
+            # Índice parcial: solo partidas abiertas, para encontrar las abandonadas sin recorrer todas
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_games_open ON games (start_time) WHERE end_time IS NULL')
+            cursor.execute(f'CREATE OR REPLACE VIEW all_games AS SELECT {GAMES_COLUMNS} FROM games')
+            cursor.execute(f'CREATE OR REPLACE VIEW all_decisions AS SELECT {DECISIONS_COLUMNS} FROM decisions')
+            self._seed_achievements(cursor, achievements)
@@ -0,0 +1,35 @@
+"""
+Configuración común de las pruebas: app.py se importa una sola vez por sesión con una
+base de datos temporal, sin hilos de fondo y sin Gemini
+"""
+import contextlib
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+APP_ENVIRONMENT = {
+    'ANALYTICS_REFRESH_SECONDS': '0',
+    'MAINTENANCE_INTERVAL_SECONDS': '0',
+    'GAME_REAPER_INTERVAL_SECONDS': '0',
+    'BANDIT_PERSIST_SECONDS': '0',
+}
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    """Módulo app con su base de datos en un directorio temporal"""
+    data_dir = tempfile.mkdtemp(prefix='ethical_tests_')
+    os.environ.update(APP_ENVIRONMENT, DATABASE_PATH=os.path.join(data_dir, 'game.db'))
+    with contextlib.redirect_stdout(sys.stderr):
+        import app
+    app.GOOGLE_API_KEY = ''
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,83 @@
+"""
+Logros con agregados en SQL: desbloquean lo mismo que el recorrido decisión a decisión
+que hacía check_and_unlock_achievements antes del repositorio
+"""
+import random
+
+import pytest
+
+from storage import SQLiteRepository
+
+CATEGORIES = ['clásico', 'medicina', 'tecnología', 'medio ambiente', 'negocios', 'sociedad', None]
+FRAMEWORKS = ['utilitarianismo', 'deontologia', 'autonomia', 'paternalismo', 'ecocentrismo',
+              'antropocentrismo', None]
+ANALYSES = ['Buen razonamiento', '   ', '', None]
+
+
+def legacy_unlocked(decisions, achievements, game_decisions=None):
+    """Códigos que desbloqueaba el bucle original sobre (marco, categoría, análisis)"""
+    unlocked = set()
+    for code, _, _, _, achievement_type, condition_value in achievements:
+        if achievement_type == 'quantity':
+            ok = len(decisions) >= int(condition_value)
+        elif achievement_type == 'diversity_categories':
+            ok = {'clásico', 'medicina', 'tecnología', 'medio ambiente', 'negocios',
+                  'sociedad'}.issubset({d[1] for d in decisions if d[1]})
+        elif achievement_type == 'diversity_frameworks':
+            ok = {'utilitarianismo', 'deontologia', 'autonomia', 'paternalismo', 'ecocentrismo',
+                  'antropocentrismo'}.issubset({d[0] for d in decisions if d[0]})
+        elif achievement_type == 'consistency':
+            framework, count = condition_value.split(':')
+            ok = sum(1 for d in decisions if d[0] == framework) >= int(count)
+        elif condition_value.startswith('analyses:'):
+            ok = sum(1 for d in decisions if d[2] and d[2].strip()) >= int(condition_value.split(':')[1])
+        else:
+            ok = game_decisions is not None and game_decisions >= int(condition_value.split(':')[1])
+        if ok:
+            unlocked.add(code)
+    return unlocked
+
+
+def sql_unlocked(app_module, repository, player_name, game_id=None):
+    metrics = repository.get_achievement_metrics(player_name, game_id)
+    if not metrics['total']:
+        return set()
+    return {code for code, _, _, _, achievement_type, condition_value in app_module.ACHIEVEMENTS
+            if app_module.is_achievement_unlocked(achievement_type, condition_value, metrics, game_id)}
+
+
+@pytest.mark.parametrize('mode', ['single', 'sharded'])
+@pytest.mark.parametrize('seed', range(6))
+def test_sql_metrics_match_legacy_loop(app_module, tmp_path, mode, seed):
+    rng = random.Random(seed)
+    repository = SQLiteRepository(str(tmp_path / 'game.db'), mode=mode, shard_count=3)
+    repository.init_schema(app_module.ACHIEVEMENTS)
+    decisions_by_game = {}
+    for player_name in ('ana', 'bob', 'carla'):
+        for _ in range(rng.randint(1, 3)):
+            game_id = repository.create_game(player_name)
+            decisions_by_game[game_id] = (player_name, [])
+            for _ in range(rng.randint(0, 40)):
+                decision = (rng.choice(FRAMEWORKS), rng.choice(CATEGORIES), rng.choice(ANALYSES))
+                repository.record_decision(game_id, rng.randint(1, 20), 'texto', decision[1],
+                                           'opción', decision[0], decision[2])
+                decisions_by_game[game_id][1].append(decision)
+
+    for player_name in ('ana', 'bob', 'carla', 'nadie'):
+        player_decisions = [d for owner, rows in decisions_by_game.values() if owner == player_name for d in rows]
+        expected = legacy_unlocked(player_decisions, app_module.ACHIEVEMENTS) if player_decisions else set()
+        assert sql_unlocked(app_module, repository, player_name) == expected
+
+    for game_id, (player_name, rows) in decisions_by_game.items():
+        expected = legacy_unlocked(rows, app_module.ACHIEVEMENTS, game_decisions=len(rows)) if rows else set()
+        assert sql_unlocked(app_module, repository, player_name, game_id) == expected
+
+
+def test_unlock_is_idempotent(app_module, tmp_path):
+    repository = SQLiteRepository(str(tmp_path / 'game.db'))
+    repository.init_schema(app_module.ACHIEVEMENTS)
+    locked = [row[0] for row in repository.get_locked_achievements('ana')]
+    assert len(locked) == len(app_module.ACHIEVEMENTS)
+    assert repository.unlock_achievements('ana', locked[:3]) == locked[:3]
+    assert repository.unlock_achievements('ana', locked[:4]) == locked[3:4]
+    assert [row[0] for row in repository.get_locked_achievements('ana')] == locked[4:]
@@ -0,0 +1,85 @@
+"""
+Rollups de analítica: acumulación con ON CONFLICT, marca de agua compare-and-set y
+ids estables de los dilemas IA
+"""
+import pytest
+
+import analytics
+from storage import SQLiteRepository
+
+
+def make_repository(tmp_path, mode='single'):
+    repository = SQLiteRepository(str(tmp_path / 'game.db'), mode=mode, shard_count=2)
+    repository.init_schema([])
+    analytics.init_rollups(repository)
+    return repository
+
+
+def record(repository, game_id, dilemma_id, framework, category='medicina'):
+    repository.record_decision(game_id, dilemma_id, 'texto', category, 'A', framework, None, fetch_player=False)
+
+
+def dilemma_frameworks(repository):
+    return {entry['dilemma_id']: entry['frameworks'] for entry in analytics.get_dilemma_frameworks(repository)['dilemmas']}
+
+
+@pytest.mark.parametrize('mode', ['single', 'sharded'])
+def test_refreshes_accumulate(tmp_path, mode):
+    repository = make_repository(tmp_path, mode)
+    ana, bob = repository.create_game('ana'), repository.create_game('bob')
+    record(repository, ana, 1, 'deontologia')
+    record(repository, bob, 1, 'deontologia')
+    assert analytics.refresh_rollups(repository) == 2
+    assert analytics.refresh_rollups(repository) == 0
+
+    record(repository, ana, 1, 'deontologia')
+    record(repository, ana, 2, 'autonomia', 'negocios')
+    assert analytics.refresh_rollups(repository) == 2
+
+    assert dilemma_frameworks(repository) == {1: {'deontologia': 3}, 2: {'autonomia': 1}}
+    assert analytics.get_category_frameworks(repository)['categories'] == {
+        'medicina': {'deontologia': 3}, 'negocios': {'autonomia': 1}}
+    leaderboard = analytics.get_leaderboard(repository)
+    assert [(p['player_name'], p['decisions']) for p in leaderboard['players']] == [('ana', 3), ('bob', 1)]
+    assert leaderboard['refreshed_at']
+
+
+def test_concurrent_refresh_does_not_double_count(tmp_path, monkeypatch):
+    repository = make_repository(tmp_path)
+    game_id = repository.create_game('ana')
+    for _ in range(3):
+        record(repository, game_id, 1, 'utilitarianismo')
+
+    read_deltas = analytics._read_deltas
+    calls = []
+
+    def racing_read_deltas(repository, index, since_id):
+        result = read_deltas(repository, index, since_id)
+        if not calls:
+            # Otro worker refresca entre la lectura de las deltas y el compare-and-set
+            calls.append(since_id)
+            assert analytics.refresh_rollups(repository) == 3
+        return result
+
+    monkeypatch.setattr(analytics, '_read_deltas', racing_read_deltas)
+    assert analytics.refresh_rollups(repository) == 0
+    assert dilemma_frameworks(repository) == {1: {'utilitarianismo': 3}}
+    with repository.logs() as conn:
+        assert conn.execute('SELECT last_decision_id FROM rollup_state').fetchall() == [(3,)]
+
+
+def test_ai_dilemma_ids_are_stable(app_module, client, monkeypatch):
+    scenario = 'Un dilema generado por la IA para la prueba de rollups'
+    cache_id = app_module.repository.cache_dilemma(scenario, '[{"text": "A", "ethical_value": "autonomia"}]',
+                                                   'sociedad', 'https://example.com/a.jpg')
+    assert app_module.repository.cache_dilemma(scenario, '[]', 'sociedad', None) == cache_id
+
+    cached = [dilemma for _, dilemma in app_module.repository.get_cached_dilemmas_since(cache_id - 1, 1)]
+    monkeypatch.setattr(app_module, 'get_random_cached_dilemma', lambda: dict(cached[0]))
+    monkeypatch.setattr(app_module.dilemma_policy, 'choose', lambda: app_module.serving_policy.CACHE)
+    monkeypatch.setattr(app_module, 'GOOGLE_API_KEY', 'x')
+    monkeypatch.setattr(app_module, 'bandit_scheduler', None)
+    monkeypatch.setattr(app_module, 'DILEMMA_SELECTION', 'random')
+    served = [client.get('/api/get_dilemma').json for _ in range(3)]
+    assert {dilemma['id'] for dilemma in served} == {app_module.AI_DILEMMA_ID_OFFSET + cache_id}
+    assert not any('cache_id' in dilemma for dilemma in served)
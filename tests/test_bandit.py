@@ -0,0 +1,97 @@
+"""
+Bandit de dilemas: recompensas de served/answered/finished, cierre de partidas
+inactivas y guardado acumulativo entre procesos
+"""
+import random
+
+import pytest
+
+import bandit
+from bandit import BanditScheduler
+from storage import SQLiteRepository
+
+A, B, C = bandit.predefined_arm(1), bandit.ai_arm(7), bandit.LIVE_ARM
+
+
+def outcome(scheduler):
+    """{brazo: (éxitos, fallos)} leídos del estado"""
+    return {arm: (stats[0], stats[1]) for arm, stats in scheduler._arms.items()}
+
+
+@pytest.fixture
+def scheduler():
+    return BanditScheduler(rng=random.Random(1))
+
+
+def test_answer_then_continue_rewards_one(scheduler):
+    scheduler.served(1, 101, A)
+    scheduler.answered(1, 101)
+    assert outcome(scheduler) == {}
+    # Responder el siguiente dilema confirma que siguió jugando tras el primero
+    scheduler.served(1, 102, B)
+    scheduler.answered(1, 102)
+    assert outcome(scheduler) == {A: (1.0, 0.0)}
+    scheduler.finished(1)
+    assert outcome(scheduler) == {A: (1.0, 0.0), B: (0.0, 1.0)}
+    assert scheduler.stats()['games_tracked'] == 0
+
+
+def test_skipped_dilemma_rewards_zero(scheduler):
+    scheduler.served(1, 101, A)
+    scheduler.served(1, 102, B)
+    assert outcome(scheduler) == {A: (0.0, 1.0)}
+    # Una respuesta a un dilema que no es el pendiente no cuenta
+    scheduler.answered(1, 101)
+    assert outcome(scheduler) == {A: (0.0, 1.0)}
+    scheduler.finished(1)
+    assert outcome(scheduler) == {A: (0.0, 1.0), B: (0.0, 1.0)}
+
+
+def test_finished_without_pending_and_unknown_games(scheduler):
+    scheduler.answered(99, 1)
+    scheduler.finished(99)
+    assert outcome(scheduler) == {}
+    scheduler.served(1, 101, C)
+    scheduler.answered(1, 101)
+    scheduler.finished(1)
+    assert outcome(scheduler) == {C: (0.0, 1.0)}
+
+
+def test_idle_games_are_closed_with_zero(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(bandit.time, 'monotonic', lambda: now[0])
+    scheduler = BanditScheduler(pending_ttl=60, rng=random.Random(1))
+    scheduler.served(1, 101, A)
+    now[0] += 61
+    scheduler.served(2, 201, B)
+    assert outcome(scheduler) == {A: (0.0, 1.0)}
+    assert scheduler.stats()['games_tracked'] == 1
+
+
+def test_choose_prefers_engaging_arms(scheduler):
+    for _ in range(50):
+        scheduler.update(A, 1.0)
+        scheduler.update(B, 0.0)
+    picks = [scheduler.choose([A, B]) for _ in range(100)]
+    assert picks.count(A) > 95
+    assert scheduler.choose([]) is None
+    # El coste de 'live' pesa frente a un brazo sin datos
+    live = BanditScheduler(live_cost=1.0, rng=random.Random(2))
+    assert all(live.choose([C, A]) == A for _ in range(50))
+
+
+def test_save_accumulates_deltas_from_several_processes(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / 'game.db'))
+    repository.init_schema([])
+    bandit.init_tables(repository)
+    first, second = BanditScheduler(), BanditScheduler()
+    first.update(A, 1.0)
+    second.update(A, 0.0)
+    second.update(A, 1.0)
+    first.save(repository)
+    second.save(repository)
+    first.save(repository)
+
+    fresh = BanditScheduler()
+    assert fresh.load(repository) == 1
+    assert outcome(fresh) == {A: (2.0, 1.0)}
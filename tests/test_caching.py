@@ -0,0 +1,136 @@
+"""
+Modos de la cache: LRU por proceso, tabla hash en mmap compartida y Redis (fakeredis)
+"""
+import time
+
+import pytest
+
+import caching
+
+
+def test_lru_evicts_least_recently_used():
+    cache = caching.LRUCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    stats = cache.stats()
+    assert stats['mode'] == 'lru'
+    assert (stats['hits'], stats['misses'], stats['sets'], stats['evictions'], stats['entries']) == (3, 1, 3, 1, 2)
+    assert stats['hit_rate'] == 0.75
+
+
+def test_lru_ttl_and_get_or_set(monkeypatch):
+    cache = caching.LRUCache()
+    now = [1000.0]
+    monkeypatch.setattr(caching.time, 'time', lambda: now[0])
+    cache.set('k', {'v': 1}, ttl=10)
+    assert cache.get('k') == {'v': 1}
+    now[0] += 11
+    assert cache.get('k', 'caducado') == 'caducado'
+    calls = []
+    assert cache.get_or_set('x', lambda: calls.append(1) or 'valor') == 'valor'
+    assert cache.get_or_set('x', lambda: calls.append(1) or 'otro') == 'valor'
+    assert cache.get_or_set('nada', lambda: None) is None
+    assert calls == [1] and cache.get('nada') is None
+
+
+@pytest.fixture
+def shared_path(tmp_path):
+    return str(tmp_path / 'cache.bin')
+
+
+def test_shared_cache_is_visible_across_instances(shared_path):
+    writer = caching.SharedMemoryCache(shared_path, size_bytes=64 * 1024, slot_size=512)
+    reader = caching.SharedMemoryCache(shared_path, size_bytes=64 * 1024, slot_size=512)
+    assert writer.set('clave', {'análisis': 'texto'})
+    assert reader.get('clave') == {'análisis': 'texto'}
+    reader.delete('clave')
+    assert writer.get('clave') is None
+    stats = writer.stats()
+    assert (stats['hits'], stats['misses'], stats['sets'], stats['entries']) == (1, 1, 1, 0)
+    assert stats['capacity'] == writer.slots
+
+
+def test_shared_cache_ttl_and_oversized_values(shared_path, monkeypatch):
+    cache = caching.SharedMemoryCache(shared_path, size_bytes=64 * 1024, slot_size=256)
+    assert not cache.set('grande', 'x' * 300)
+    now = [1000.0]
+    monkeypatch.setattr(caching.time, 'time', lambda: now[0])
+    cache.set('k', 1, ttl=5)
+    assert cache.get('k') == 1
+    now[0] += 6
+    assert cache.get('k') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_shared_cache_evicts_least_recently_used_in_bucket(shared_path, monkeypatch):
+    # Una sola cubeta de WAYS slots: la clave menos usada es la expulsada
+    cache = caching.SharedMemoryCache(shared_path, size_bytes=caching.SharedMemoryCache.WAYS * 256 + 64,
+                                      slot_size=256)
+    assert cache.slots == cache.WAYS
+    now = [1000.0]
+    monkeypatch.setattr(caching.time, 'time', lambda: now[0])
+    for index in range(cache.WAYS):
+        now[0] += 1
+        cache.set(f'k{index}', index)
+    now[0] += 1
+    assert cache.get('k0') == 0
+    now[0] += 1
+    cache.set('nueva', 'v')
+    assert cache.get('k1') is None
+    assert cache.get('k0') == 0 and cache.get('nueva') == 'v'
+    stats = cache.stats()
+    assert (stats['evictions'], stats['entries']) == (1, cache.WAYS)
+
+
+def test_shared_cache_resets_on_geometry_change(shared_path):
+    caching.SharedMemoryCache(shared_path, size_bytes=64 * 1024, slot_size=512).set('k', 1)
+    assert caching.SharedMemoryCache(shared_path, size_bytes=64 * 1024, slot_size=512).get('k') == 1
+    resized = caching.SharedMemoryCache(shared_path, size_bytes=128 * 1024, slot_size=512)
+    assert resized.get('k') is None
+    assert resized.stats()['sets'] == 0
+
+
+@pytest.fixture
+def redis_cache(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    redis = pytest.importorskip('redis')
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, 'from_url', classmethod(lambda cls, url: fakeredis.FakeRedis(server=server)))
+    return caching.create_cache('redis', redis_url='redis://prueba')
+
+
+def test_redis_counters_without_scanning(redis_cache, monkeypatch):
+    redis_cache.set('a', [1, 2])
+    redis_cache.set('a', [1, 2, 3])
+    redis_cache.set('b', 'x', ttl=60)
+    assert redis_cache.get('a') == [1, 2, 3]
+    assert redis_cache.get('c') is None
+    monkeypatch.setattr(redis_cache.client, 'scan_iter', lambda *a, **k: pytest.fail('stats recorre el keyspace'))
+    stats = redis_cache.stats()
+    assert stats['mode'] == 'redis'
+    assert (stats['hits'], stats['misses'], stats['sets'], stats['entries']) == (1, 1, 3, 2)
+    assert 'server_evicted_keys' in stats and 'evictions' not in stats
+
+    redis_cache.delete('a')
+    assert redis_cache.stats()['entries'] == 1
+    now = time.time()
+    monkeypatch.setattr(caching.time, 'time', lambda: now + 61)
+    assert redis_cache.stats()['entries'] == 0
+
+
+def test_redis_clear_keeps_stats(redis_cache):
+    redis_cache.set('a', 1)
+    redis_cache.get('a')
+    redis_cache.clear()
+    assert redis_cache.get('a') is None
+    stats = redis_cache.stats()
+    assert (stats['hits'], stats['entries']) == (1, 0)
+
+
+def test_create_cache_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        caching.create_cache('memcached')
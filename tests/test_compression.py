@@ -0,0 +1,99 @@
+"""
+Compresión de respuestas: negociación con Accept-Encoding, umbral de tamaño y
+respuestas en streaming sin tocar
+"""
+import gzip
+import json
+
+import pytest
+from flask import Flask, Response, jsonify, stream_with_context
+from werkzeug.http import parse_accept_header
+
+import compression
+
+
+def accept(header):
+    return parse_accept_header(header)
+
+
+class FakeBrotli:
+    @staticmethod
+    def compress(data, quality):
+        return b'br:' + data
+
+
+@pytest.fixture
+def without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, '_brotli', False)
+
+
+@pytest.fixture
+def with_brotli(monkeypatch):
+    monkeypatch.setattr(compression, '_brotli', FakeBrotli)
+
+
+def test_negotiation_prefers_brotli(with_brotli):
+    assert compression.negotiate_encoding(accept('gzip, deflate, br')) == 'br'
+    assert compression.negotiate_encoding(accept('br;q=0, gzip')) == 'gzip'
+    assert compression.negotiate_encoding(accept('identity')) is None
+    assert compression.negotiate_encoding(accept('')) is None
+
+
+def test_negotiation_without_brotli(without_brotli):
+    assert compression.available_encodings() == ['gzip']
+    assert compression.negotiate_encoding(accept('br')) is None
+    assert compression.negotiate_encoding(accept('br, gzip;q=0.5')) == 'gzip'
+    assert compression.negotiate_encoding(accept('*')) == 'gzip'
+    assert compression.negotiate_encoding(accept('gzip;q=0')) is None
+
+
+@pytest.fixture
+def flask_app():
+    return Flask(__name__)
+
+
+def test_compresses_large_json(flask_app, without_brotli):
+    payload = {'items': ['dilema'] * 500}
+    with flask_app.test_request_context():
+        response = compression.compress_response(jsonify(payload), accept('gzip'), 1024)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.vary
+    assert json.loads(gzip.decompress(response.get_data())) == payload
+    # mtime=0: la misma entrada produce los mismos bytes
+    with flask_app.test_request_context():
+        again = compression.compress_response(jsonify(payload), accept('gzip'), 1024)
+    assert again.get_data() == response.get_data()
+
+
+def test_skips_small_or_unacceptable_responses(flask_app, without_brotli):
+    with flask_app.test_request_context():
+        small = compression.compress_response(jsonify({'ok': True}), accept('gzip'), 1024)
+        identity = compression.compress_response(jsonify({'items': ['x'] * 1000}), accept('identity'), 1024)
+        image = compression.compress_response(Response(b'\xff' * 4096, mimetype='image/jpeg'), accept('gzip'), 1024)
+        not_modified = compression.compress_response(Response(b'', status=304), accept('gzip'), 0)
+    for response in (small, identity, image, not_modified):
+        assert 'Content-Encoding' not in response.headers
+
+
+def test_skips_streamed_responses(flask_app, without_brotli):
+    def generate():
+        for _ in range(100):
+            yield 'x' * 100 + '\n'
+
+    with flask_app.test_request_context():
+        response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        response = compression.compress_response(response, accept('gzip'), 0)
+        assert response.is_streamed
+        assert 'Content-Encoding' not in response.headers
+        assert b''.join(response.iter_encoded()) == (b'x' * 100 + b'\n') * 100
+
+
+def test_app_compression(client, app_module, without_brotli):
+    response = client.get('/api/get_achievements/compresion', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert len(json.loads(gzip.decompress(response.get_data()))['all']) == len(app_module.ACHIEVEMENTS)
+    assert 'Content-Encoding' not in client.get('/api/get_achievements/compresion').headers
+
+    export = client.get('/api/export_decisions', headers={'Accept-Encoding': 'gzip'})
+    assert export.is_streamed
+    assert 'Content-Encoding' not in export.headers
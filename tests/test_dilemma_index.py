@@ -0,0 +1,108 @@
+"""
+Índice de dilemas: selección dirigida por marcos y categorías que le faltan al jugador
+y descarte de los dilemas IA borrados por la retención
+"""
+import random
+
+import pytest
+
+from dilemma_index import AI, PREDEFINED, DilemmaIndex
+
+FRAMEWORKS = {'utilitarianismo', 'deontologia', 'autonomia'}
+CATEGORIES = {'medicina', 'negocios', 'sociedad'}
+
+
+def dilemma(dilemma_id, category, *frameworks):
+    return {'id': dilemma_id, 'category': category,
+            'options': [{'text': framework, 'ethical_value': framework} for framework in frameworks]}
+
+
+PREDEFINED_DILEMMAS = [
+    dilemma(1, 'medicina', 'utilitarianismo', 'deontologia'),
+    dilemma(2, 'medicina', 'utilitarianismo', 'deontologia'),
+    dilemma(3, 'negocios', 'autonomia', 'utilitarianismo'),
+    dilemma(4, 'sociedad', 'deontologia', 'utilitarianismo'),
+]
+
+
+def metrics(frameworks=(), categories=()):
+    return {'frameworks': dict.fromkeys(frameworks, 1), 'categories': set(categories)}
+
+
+@pytest.fixture
+def index():
+    return DilemmaIndex(PREDEFINED_DILEMMAS, rng=random.Random(5))
+
+
+def select_ids(index, strategy, player_metrics, times=50, pool=PREDEFINED):
+    return {index.select(pool, strategy, player_metrics, FRAMEWORKS, CATEGORIES)['id'] for _ in range(times)}
+
+
+def test_missing_framework(index):
+    assert select_ids(index, 'frameworks', metrics({'utilitarianismo', 'deontologia'})) == {3}
+
+
+def test_missing_category(index):
+    assert select_ids(index, 'categories', metrics(categories={'medicina', 'negocios'})) == {4}
+    assert select_ids(index, 'categories', metrics(categories={'medicina'})) == {3, 4}
+
+
+def test_coverage_prefers_categories_then_frameworks(index):
+    assert select_ids(index, 'coverage', metrics({'utilitarianismo'}, {'medicina', 'sociedad'})) == {3}
+    # Todas las categorías cubiertas: pasa a los marcos que faltan
+    assert select_ids(index, 'coverage', metrics({'utilitarianismo', 'deontologia'}, CATEGORIES)) == {3}
+
+
+def test_falls_back_to_any_dilemma(index):
+    complete = metrics(FRAMEWORKS, CATEGORIES)
+    assert select_ids(index, 'coverage', complete, times=200) == {1, 2, 3, 4}
+    assert select_ids(index, 'random', None, times=200) == {1, 2, 3, 4}
+    assert select_ids(index, 'frameworks', None, times=200) == {1, 2, 3, 4}
+    assert index.select(AI, 'coverage', complete, FRAMEWORKS, CATEGORIES) is None
+
+
+def test_ai_pool_is_separate(index):
+    index.add_ai_dilemmas([(10, dilemma(None, 'sociedad', 'autonomia')), (11, dilemma(None, 'medicina', 'deontologia'))])
+    assert index.count(AI) == 2 and index.count(PREDEFINED) == 4
+    assert index.last_ai_id == 11
+    assert index.select(AI, 'frameworks', metrics({'deontologia'}), FRAMEWORKS, CATEGORIES)['category'] == 'sociedad'
+    assert select_ids(index, 'frameworks', metrics({'utilitarianismo', 'deontologia'})) == {3}
+
+
+def test_drop_ai_before_rebuilds_lists(index):
+    index.add_ai_dilemmas([(ai_id, dilemma(None, 'negocios', 'autonomia')) for ai_id in (5, 6, 7)])
+    assert index.drop_ai_before(5) == 0
+    assert index.drop_ai_before(7) == 2
+    assert [ai_id for ai_id, _ in index.ai_items()] == [7]
+    assert index.count(PREDEFINED) == 4
+    # Las listas por marco y categoría ya no apuntan a los descartados
+    assert len(index.by_framework[(AI, 'autonomia')]) == 1
+    assert len(index.by_category[(AI, 'negocios')]) == 1
+    assert select_ids(index, 'frameworks', metrics({'utilitarianismo', 'deontologia'})) == {3}
+    assert index.drop_ai_before(100) == 1
+    assert index.count(AI) == 0 and index.last_ai_id == 7
+
+
+class CacheRepository:
+    """Lo que usa DilemmaIndex.sync() de ai_dilemmas_cache"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get_min_cached_dilemma_id(self):
+        return min((ai_id for ai_id, _ in self.rows), default=None)
+
+    def get_cached_dilemmas_since(self, last_id, limit=500):
+        return [row for row in self.rows if row[0] > last_id][:limit]
+
+
+def test_sync_is_incremental_and_follows_retention(index):
+    repository = CacheRepository([(ai_id, dilemma(None, 'medicina', 'autonomia')) for ai_id in (1, 2, 3)])
+    assert index.sync(repository) == 3
+    assert index.sync(repository) == 0
+    repository.rows = repository.rows[2:] + [(4, dilemma(None, 'sociedad', 'deontologia'))]
+    assert index.sync(repository) == 1
+    assert [ai_id for ai_id, _ in index.ai_items()] == [3, 4]
+    repository.rows = []
+    index.sync(repository)
+    assert index.count(AI) == 0
@@ -0,0 +1,97 @@
+"""
+Validación y reparación de los dilemas generados: respuestas válidas, reparables
+(markdown, JSON truncado, marcos con tildes, opciones largas o de más) y rechazadas
+"""
+import json
+
+import pytest
+
+from dilemma_schema import DilemmaValidator, GenerationStats, InvalidDilemma, close_truncated_json
+
+SCENARIO = 'Un hospital debe decidir a quién asigna el último respirador disponible esta noche.'
+
+
+def dilemma(**overrides):
+    data = {
+        'category': 'medicina',
+        'scenario': SCENARIO,
+        'options': [
+            {'text': 'Al paciente con más probabilidades de sobrevivir', 'ethical_value': 'utilitarianismo'},
+            {'text': 'Al primero que llegó', 'ethical_value': 'deontologia'}
+        ]
+    }
+    data.update(overrides)
+    return data
+
+
+@pytest.fixture
+def validator():
+    return DilemmaValidator()
+
+
+def test_valid_response_is_not_repaired(validator):
+    parsed, repaired = validator.parse(json.dumps(dilemma()))
+    assert parsed == dilemma()
+    assert repaired is False
+
+
+def test_markdown_and_surrounding_text_are_stripped(validator):
+    text = 'Aquí tienes el dilema:\n```json\n' + json.dumps(dilemma(), ensure_ascii=False) + '\n```\nSuerte'
+    parsed, repaired = validator.parse(text)
+    assert parsed == dilemma()
+    assert repaired is True
+
+
+def test_truncated_json_is_closed(validator):
+    text = json.dumps(dilemma(), ensure_ascii=False)
+    # Cortado tras el último valor: quedan abiertos la opción, la lista y el objeto
+    truncated = text[:text.rindex('"deontologia"') + len('"deontologia"')]
+    parsed, repaired = validator.parse(truncated)
+    assert repaired is True
+    assert parsed == dilemma()
+    assert json.loads(close_truncated_json('{"a": [1, 2, {"b": "c')) == {'a': [1, 2, {'b': 'c'}]}
+    assert json.loads(close_truncated_json('{"a": 1, "b"')) == {'a': 1}
+
+
+def test_framework_aliases_and_option_repairs(validator):
+    long_text = 'Repartir ' + 'los recursos disponibles entre todos ' * 5
+    data = dilemma(category='', options=[
+        {'text': long_text, 'ethical_value': 'Deontología'},
+        {'text': '  Esperar   instrucciones ', 'ethical_value': 'AUTONOMÍA'},
+        {'text': 'Una tercera opción', 'ethical_value': 'paternalismo'}
+    ])
+    parsed, repaired = validator.validate(data, category='salud')
+    assert repaired is True
+    assert parsed['category'] == 'salud'
+    assert [option['ethical_value'] for option in parsed['options']] == ['deontologia', 'autonomia']
+    first = parsed['options'][0]['text']
+    assert len(first) <= 100 and first.endswith('…') and long_text.startswith(first[:-1])
+    assert parsed['options'][1]['text'] == 'Esperar instrucciones'
+
+
+@pytest.mark.parametrize('text, reason', [
+    ('', 'empty'),
+    ('Lo siento, no puedo generar eso.', 'json'),
+    ('{"category": "x", "scenario": ', 'schema'),
+    (json.dumps(dilemma(scenario='Muy corto')), 'schema'),
+    (json.dumps(dilemma(options=[{'text': 'Sola', 'ethical_value': 'deontologia'}])), 'schema'),
+    (json.dumps(dilemma(options=[{'text': 'A', 'ethical_value': 'hedonismo'},
+                                 {'text': 'B', 'ethical_value': 'deontologia'}])), 'schema'),
+    (json.dumps(dilemma(options=[{'text': '   ', 'ethical_value': 'deontologia'},
+                                 {'text': 'B', 'ethical_value': 'deontologia'}])), 'schema'),
+    (json.dumps(['no', 'es', 'un', 'objeto']), 'schema'),
+])
+def test_rejected_responses(validator, text, reason):
+    with pytest.raises(InvalidDilemma) as error:
+        validator.parse(text)
+    assert error.value.reason == reason
+
+
+def test_generation_stats():
+    stats = GenerationStats()
+    stats.record()
+    stats.record(repaired=True)
+    stats.record(failure='json')
+    stats.record(failure='json', repaired=True)
+    assert stats.stats() == {'calls': 4, 'valid': 1, 'repaired': 1, 'failed': 2,
+                             'failures': {'json': 2}, 'parse_failure_rate': 0.5}
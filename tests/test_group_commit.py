@@ -0,0 +1,109 @@
+"""
+Escritura agrupada con shards: si falla una fuente solo se reintentan sus decisiones, y
+un escritor atascado no bloquea a los llamantes más allá del tiempo de espera
+"""
+import os
+import sqlite3
+import sys
+import threading
+from concurrent.futures import TimeoutError
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from group_commit import GroupCommitWriter
+from storage import SQLiteRepository
+
+
+class FlakyShardRepository(SQLiteRepository):
+    """La transacción del shard 1 falla como un lock ocupado (el resto funciona)"""
+
+    fail_shard = 1
+
+    def source(self, index):
+        if index == self.fail_shard:
+            raise sqlite3.OperationalError('database is locked')
+        return super().source(index)
+
+
+def test_failed_shard_only_retries_its_decisions(tmp_path):
+    repository = FlakyShardRepository(str(tmp_path / 'game.db'), mode='sharded', shard_count=2)
+    repository.init_schema([])
+    game_ids = [repository.create_game(f'jugador{i}') for i in range(6)]
+    assert {repository.source_for_game(game_id) for game_id in game_ids} == {0, 1}
+
+    writer = GroupCommitWriter(repository, max_delay_ms=1000, max_rows=len(game_ids))
+    futures = [writer.submit(game_id, 1, 'Dilema', 'clásico', 'Opción', 'deontologia', None)
+               for game_id in game_ids]
+    players = [future.result(timeout=10) for future in futures]
+
+    assert players == [f'jugador{i}' for i in range(6)]
+    assert writer.stats()['groups'] == 1
+    assert writer.stats()['retried_groups'] == 1
+    # Una sola fila por decisión y un solo incremento por partida, también en el shard 0
+    for path in repository.shard_paths:
+        conn = sqlite3.connect(path)
+        try:
+            decisions = conn.execute('SELECT COUNT(*) FROM decisions').fetchone()[0]
+            answered = conn.execute('SELECT SUM(dilemmas_answered) FROM games').fetchone()[0]
+            games = conn.execute('SELECT COUNT(*) FROM games').fetchone()[0]
+        finally:
+            conn.close()
+        assert decisions == games
+        assert answered == games
+
+
+class StuckWriterRepository(SQLiteRepository):
+    """El primer grupo se queda bloqueado hasta que la prueba lo libera"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def record_decisions(self, decisions):
+        self.started.set()
+        self.release.wait(10)
+        return super().record_decisions(decisions)
+
+
+def count_decisions(repository, game_id):
+    with repository.gameplay(game_id=game_id) as conn:
+        return conn.execute('SELECT COUNT(*) FROM decisions WHERE game_id = ?', (game_id,)).fetchone()[0]
+
+
+def test_queued_decision_falls_back_to_direct_write(tmp_path):
+    repository = StuckWriterRepository(str(tmp_path / 'game.db'))
+    repository.init_schema([])
+    stuck_game, waiting_game = repository.create_game('ana'), repository.create_game('bob')
+    writer = GroupCommitWriter(repository, max_delay_ms=0, max_rows=1, timeout=0.2)
+    stuck = writer.submit(stuck_game, 1, 'Dilema', 'clásico', 'Opción', 'deontologia', None)
+    assert repository.started.wait(5)
+
+    # El escritor no llega a tomarla: se cancela en la cola y se guarda directamente
+    assert writer.record_decision(waiting_game, 1, 'Dilema', 'clásico', 'Opción', 'autonomia', None) == 'bob'
+    assert count_decisions(repository, waiting_game) == 1
+    assert writer.stats()['direct_fallbacks'] == 1
+
+    repository.release.set()
+    assert stuck.result(timeout=5) == 'ana'
+    # El escritor descarta la cancelada en lugar de guardarla otra vez
+    follow_up = writer.submit(stuck_game, 2, 'Dilema', 'clásico', 'Opción', 'deontologia', None)
+    assert follow_up.result(timeout=5) == 'ana'
+    assert count_decisions(repository, waiting_game) == 1
+    assert count_decisions(repository, stuck_game) == 2
+
+
+def test_decision_in_running_group_is_not_duplicated(tmp_path):
+    repository = StuckWriterRepository(str(tmp_path / 'game.db'))
+    repository.init_schema([])
+    game_id = repository.create_game('ana')
+    writer = GroupCommitWriter(repository, max_delay_ms=0, max_rows=1, timeout=0.1)
+    with pytest.raises(TimeoutError):
+        writer.record_decision(game_id, 1, 'Dilema', 'clásico', 'Opción', 'deontologia', None)
+    assert writer.stats()['direct_fallbacks'] == 0
+
+    repository.release.set()
+    writer.submit(game_id, 2, 'Dilema', 'clásico', 'Opción', 'deontologia', None).result(timeout=5)
+    assert count_decisions(repository, game_id) == 2
@@ -0,0 +1,83 @@
+"""
+Peticiones de respaldo: el presupuesto limita los respaldos y gana la primera respuesta
+"""
+import threading
+import time
+
+import pytest
+
+import hedging
+
+
+def warm_up(hedger, calls=200):
+    for _ in range(calls):
+        assert hedger.call(lambda: 'rápida') == 'rápida'
+    assert hedger.stats()['delay_ms'] is not None
+
+
+@pytest.fixture
+def hedger():
+    hedger = hedging.Hedger(budget=0.10, percentile=50, min_samples=20, window=1000)
+    yield hedger
+    hedger.shutdown()
+
+
+def test_no_hedge_without_samples(hedger):
+    assert hedger.call(lambda: time.sleep(0.01) or 'ok') == 'ok'
+    assert hedger.stats()['hedges'] == 0
+
+
+def test_budget_caps_hedges(hedger):
+    warm_up(hedger)
+    assert hedger.stats()['hedges'] == 0
+    slow_calls = 30
+    for _ in range(slow_calls):
+        assert hedger.call(lambda: time.sleep(0.01) or 'lenta') == 'lenta'
+
+    stats = hedger.stats()
+    # Cubo lleno (BURST) al empezar más `budget` fichas por llamada lenta
+    assert hedging.BURST <= stats['hedges'] <= hedging.BURST + hedger.budget * slow_calls
+    assert stats['hedges'] + stats['hedges_skipped_budget'] == slow_calls
+    assert stats['calls'] == 200 + slow_calls
+    assert stats['hedge_rate'] <= (hedging.BURST + hedger.budget * stats['calls']) / stats['calls']
+
+
+def test_first_response_wins(hedger):
+    warm_up(hedger)
+    release = threading.Event()
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            # La primaria se queda colgada hasta que termina la prueba
+            release.wait(5)
+            return 'primaria'
+        return 'respaldo'
+
+    start = time.perf_counter()
+    assert hedger.call(flaky) == 'respaldo'
+    assert time.perf_counter() - start < 1
+    release.set()
+    assert hedger.stats()['hedge_wins'] == 1
+
+
+def test_error_only_when_both_fail(hedger):
+    warm_up(hedger)
+    attempts = []
+
+    def primary_fails_late():
+        attempts.append(1)
+        if len(attempts) == 1:
+            time.sleep(0.05)
+            raise RuntimeError('primaria')
+        return 'respaldo'
+
+    assert hedger.call(primary_fails_late) == 'respaldo'
+
+    def always_fails():
+        time.sleep(0.01)
+        raise RuntimeError('Gemini caído')
+
+    with pytest.raises(RuntimeError):
+        hedger.call(always_fails)
@@ -0,0 +1,94 @@
+"""
+Claves de idempotencia: repetición de la respuesta guardada, 422 con otro cuerpo, 409
+mientras la original sigue en curso y caducidad de las claves
+"""
+import hashlib
+
+import pytest
+
+import idempotency
+from idempotency import MISMATCH, NEW, PENDING, REPLAY, IdempotencyStore
+from storage import SQLiteRepository
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(idempotency.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def store(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / 'game.db'))
+    repository.init_schema([])
+    idempotency.init_tables(repository)
+    return IdempotencyStore(repository, ttl_seconds=3600, wait_seconds=0.2, pending_timeout=120)
+
+
+def test_replay_of_stored_response(store):
+    assert store.begin('k', 'huella') == (NEW, None, None)
+    store.complete('k', 200, '{"game_id": 7}')
+    assert store.begin('k', 'huella') == (REPLAY, 200, '{"game_id": 7}')
+    assert store.begin('k', 'otra huella') == (MISMATCH, None, None)
+    assert store.stats()[REPLAY] == 1
+
+
+def test_pending_then_released(store):
+    assert store.begin('k', 'huella')[0] == NEW
+    assert store.begin('k', 'huella')[0] == PENDING
+    # Un 5xx libera la clave: el reintento se procesa de nuevo
+    store.release('k')
+    assert store.begin('k', 'huella')[0] == NEW
+
+
+def test_abandoned_reservation_can_be_taken_over(store, clock):
+    assert store.begin('k', 'huella')[0] == NEW
+    clock[0] += 121
+    assert store.begin('k', 'huella')[0] == NEW
+
+
+def test_ttl_expiry(store, clock):
+    store.begin('vieja', 'huella')
+    store.complete('vieja', 200, '{}')
+    clock[0] += 1800
+    store.begin('nueva', 'huella')
+    store.complete('nueva', 200, '{}')
+    assert store.begin('vieja', 'huella')[0] == REPLAY
+    clock[0] += 1801
+    # Caducada: la misma clave vuelve a ser nueva, incluso con otro cuerpo
+    assert store.begin('vieja', 'otra huella')[0] == NEW
+    clock[0] += 1800
+    # Solo 'nueva' (reservada hace más de una hora) se borra; 'vieja' se renovó al reservarla
+    assert store.purge() == 1
+    assert store.stats()['purged'] == 1
+    assert store.begin('nueva', 'huella')[0] == NEW
+
+
+def test_endpoints_replay_and_reject(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module.idempotency_store, 'wait_seconds', 0.2)
+    headers = {'Idempotency-Key': 'inicio-1'}
+    first = client.post('/api/start_game', json={'player_name': 'idempotente'}, headers=headers)
+    again = client.post('/api/start_game', json={'player_name': 'idempotente'}, headers=headers)
+    assert first.status_code == again.status_code == 200
+    assert again.json['game_id'] == first.json['game_id']
+    assert again.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+
+    mismatch = client.post('/api/start_game', json={'player_name': 'otro'}, headers=headers)
+    assert mismatch.status_code == 422
+
+    # La misma clave en otro endpoint es independiente
+    game_id = first.json['game_id']
+    decision = {'game_id': game_id, 'dilemma_id': 1, 'dilemma_text': 'Dilema', 'dilemma_category': 'clásico',
+                'chosen_option': 'Opción', 'ethical_framework': 'deontologia'}
+    assert client.post('/api/make_decision', json=decision, headers=headers).status_code == 200
+    assert client.post('/api/make_decision', json=decision, headers=headers).status_code == 200
+    assert client.get(f'/api/get_stats/{game_id}').json['dilemmas_answered'] == 1
+
+    # Reservada por una petición que sigue en curso
+    body = b'{"player_name": "en curso"}'
+    app_module.idempotency_store.begin('start_game:en-curso', hashlib.sha256(body).hexdigest())
+    pending = client.post('/api/start_game', data=body, content_type='application/json',
+                          headers={'Idempotency-Key': 'en-curso'})
+    assert pending.status_code == 409
@@ -0,0 +1,87 @@
+"""
+Proxy de imágenes sin red: originales precargados en un directorio temporal, variantes
+direccionadas por contenido, ETag/304 y ancho de las variantes
+"""
+import io
+import os
+
+import pytest
+
+import image_proxy
+
+PIL = pytest.importorskip('PIL.Image')
+
+SEEDED = 'photo-1500000000000-abcdef123456'
+MISSING = 'photo-1600000000000-0123456789ab'
+
+
+def write_jpeg(path, width, height, color):
+    PIL.new('RGB', (width, height), color).save(path, 'JPEG')
+
+
+def image_width(data):
+    with PIL.open(io.BytesIO(data)) as image:
+        return image.width
+
+
+@pytest.fixture
+def image_dirs(tmp_path, monkeypatch):
+    source_dir, cache_dir = tmp_path / 'source', tmp_path / 'cache'
+    source_dir.mkdir()
+    write_jpeg(source_dir / f'{SEEDED}.jpg', 1200, 600, (200, 30, 30))
+    monkeypatch.setattr(image_proxy, 'IMAGE_SOURCE_DIR', str(source_dir))
+    monkeypatch.setattr(image_proxy, 'IMAGE_CACHE_DIR', str(cache_dir))
+    monkeypatch.setattr(image_proxy, '_source_digests', {})
+    return source_dir, cache_dir
+
+
+def test_snap_width():
+    assert [image_proxy.snap_width(width) for width in (None, 0, 1, 320, 321, 800, 5000)] == [
+        800, 800, 320, 320, 480, 800, 800]
+
+
+def test_variants_are_content_addressed(image_dirs):
+    source_dir, cache_dir = image_dirs
+    path, key = image_proxy.get_variant(SEEDED, 480)
+    assert path.startswith(str(cache_dir)) and os.path.basename(path) == f'{key}.jpg'
+    with open(path, 'rb') as f:
+        assert image_width(f.read()) == 480
+    assert image_proxy.get_variant(SEEDED, 480) == (path, key)
+    assert image_proxy.get_variant(SEEDED, 320)[1] != key
+
+    # Otro contenido con el mismo id da otra clave (y otro ETag)
+    write_jpeg(source_dir / f'{SEEDED}.jpg', 1000, 500, (10, 10, 200))
+    os.utime(source_dir / f'{SEEDED}.jpg', ns=(1, 1))
+    assert image_proxy.get_variant(SEEDED, 480)[1] != key
+    assert image_proxy.get_variant(MISSING, 480) is None
+    assert image_proxy.get_variant('../secreto', 480) is None
+
+
+def test_urls_only_for_seeded_images(image_dirs):
+    seeded_url = f'https://images.unsplash.com/{SEEDED}?w=800'
+    missing_url = f'https://images.unsplash.com/{MISSING}?w=800'
+    assert image_proxy.has_sources()
+    assert image_proxy.proxy_url(seeded_url, 500) == f'/img/{SEEDED}?w=800'
+    assert image_proxy.proxy_url(missing_url) == missing_url
+    assert image_proxy.srcset(seeded_url).split(', ') == [
+        f'/img/{SEEDED}?w={width} {width}w' for width in image_proxy.IMAGE_WIDTHS]
+    assert image_proxy.srcset(missing_url) is None
+
+
+def test_route_etag_and_width(client, image_dirs):
+    response = client.get(f'/img/{SEEDED}?w=400')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert image_width(response.get_data()) == 480
+    assert response.cache_control.immutable and response.cache_control.public
+    etag = response.headers['ETag']
+    assert etag.strip('"') == image_proxy.get_variant(SEEDED, 480)[1]
+
+    not_modified = client.get(f'/img/{SEEDED}?w=400', headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304
+    assert client.get(f'/img/{SEEDED}?w=800', headers={'If-None-Match': etag}).status_code == 200
+
+    redirect = client.get(f'/img/{MISSING}?w=320')
+    assert redirect.status_code == 302
+    assert redirect.headers['Location'] == image_proxy.remote_url(MISSING, 320)
+    assert client.get('/img/..%2Fapp.py').status_code == 404
@@ -0,0 +1,16 @@
+"""
+Presupuesto de arranque en frío de app.py (la misma medición que bench_import.py)
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bench_import
+
+
+def test_import_within_budget():
+    _, median_ms, eager = bench_import.run_benchmark(runs=3)
+    assert not eager, f"google.generativeai se importa al arrancar: {eager[:5]}"
+    assert median_ms <= bench_import.BUDGET_MS, (
+        f"import app tarda {median_ms:.1f} ms (presupuesto {bench_import.BUDGET_MS} ms)")
@@ -0,0 +1,129 @@
+"""
+Cola de trabajos: orden de reclamación, concesiones caducadas, reintentos con espera
+exponencial, deduplicación y cobro del presupuesto de IA solo al encolar
+"""
+import pytest
+
+import jobs
+from jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue, Worker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(jobs.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return JobQueue(str(tmp_path / 'jobs.db'), visibility_timeout=30, max_attempts=2, retry_base_seconds=4)
+
+
+def test_claim_by_priority_then_available_at(queue, clock):
+    late = queue.enqueue('tarea', {'n': 1})
+    clock[0] += 1
+    later = queue.enqueue('tarea', {'n': 2})
+    urgent = queue.enqueue('tarea', {'n': 3}, priority=10)
+    delayed = queue.enqueue('tarea', {'n': 4}, priority=20, delay=60)
+    other = queue.enqueue('otra', priority=30)
+
+    claimed = [queue.claim('w', ('tarea',))[0] for _ in range(3)]
+    assert claimed == [urgent, late, later]
+    assert queue.claim('w', ('tarea',)) is None
+    clock[0] += 60
+    assert queue.claim('w', ('tarea',))[:3] == (delayed, 'tarea', {'n': 4})
+    assert queue.get(other)['status'] == QUEUED
+
+
+def test_expired_lease_is_reclaimed(queue, clock):
+    job_id = queue.enqueue('tarea')
+    assert queue.claim('w1', ('tarea',))[3] == 1
+    assert queue.claim('w2', ('tarea',)) is None
+    clock[0] += 31
+    assert queue.claim('w2', ('tarea',)) == (job_id, 'tarea', {}, 2)
+    # El primer worker ya no puede completarlo ni renovar la concesión
+    assert not queue.complete(job_id, 'w1', 'tarde')
+    assert not queue.extend(job_id, 'w1')
+    assert queue.complete(job_id, 'w2', {'ok': True})
+    assert queue.get(job_id)['result'] == {'ok': True}
+
+
+def test_fail_backs_off_then_fails(queue, clock):
+    job_id = queue.enqueue('tarea')
+    queue.claim('w', ('tarea',))
+    assert queue.fail(job_id, 'w', 'error 1')
+    job = queue.get(job_id)
+    assert (job['status'], job['error'], job['attempts']) == (QUEUED, 'error 1', 1)
+    clock[0] += 3.9
+    assert queue.claim('w', ('tarea',)) is None
+    clock[0] += 0.1
+    assert queue.claim('w', ('tarea',))[3] == 2
+    assert queue.fail(job_id, 'w', 'error 2')
+    assert queue.get(job_id)['status'] == FAILED
+
+
+def test_max_attempts_then_expire(queue, clock):
+    job_id = queue.enqueue('tarea')
+    for _ in range(2):
+        assert queue.claim('w', ('tarea',))[0] == job_id
+        clock[0] += 31
+    # Sin más intentos no se reclama: expire lo marca como fallido
+    assert queue.claim('w', ('tarea',)) is None
+    assert queue.get(job_id)['status'] == RUNNING
+    assert queue.expire() == 1
+    job = queue.get(job_id)
+    assert job['status'] == FAILED and job['error']
+
+
+def test_dedupe_revives_failed_but_keeps_done(queue, clock):
+    failed = queue.enqueue('tarea', {'v': 1}, dedupe_key='fallido', max_attempts=1)
+    queue.claim('w', ('tarea',))
+    queue.fail(failed, 'w', 'error')
+    assert queue.find('fallido')['status'] == FAILED
+    assert queue.enqueue('tarea', {'v': 2}, dedupe_key='fallido') == failed
+    job = queue.get(failed)
+    assert (job['status'], job['attempts'], job['error']) == (QUEUED, 0, None)
+    assert queue.claim('w', ('tarea',))[2] == {'v': 2}
+
+    done = queue.enqueue('tarea', dedupe_key='hecho')
+    queue.claim('w', ('tarea',))
+    queue.complete(done, 'w', {'resultado': 1})
+    assert queue.enqueue('tarea', {'v': 3}, dedupe_key='hecho') == done
+    assert queue.get(done)['status'] == DONE
+    assert queue.get(done)['result'] == {'resultado': 1}
+    assert queue.find('no existe') is None
+
+
+def test_worker_completes_none_results(queue):
+    job_id = queue.enqueue('tarea')
+    worker = Worker(queue, {'tarea': lambda payload: None})
+    assert worker.run_once()
+    assert queue.get(job_id)['status'] == DONE
+    assert queue.get(job_id)['result'] is None
+    assert not worker.run_once()
+
+
+def test_queued_analysis_charges_admission_once(app_module, tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / 'analisis.db'), max_attempts=1)
+    admitted = []
+    monkeypatch.setattr(app_module, 'job_queue', queue)
+    monkeypatch.setattr(app_module, 'AI_JOB_WAIT_SECONDS', 0)
+    monkeypatch.setattr(app_module, 'admit_ai_request', lambda game_id: admitted.append(game_id) or True)
+    dilemma = {'scenario': 'Escenario único para la prueba de la cola', 'category': 'prueba'}
+
+    assert app_module.queued_analysis(dilemma, 'Opción A', 'deontologia', game_id=1) is None
+    assert app_module.queued_analysis(dilemma, 'Opción A', 'deontologia', game_id=2) is None
+    assert admitted == [1]
+
+    # Fallido: el siguiente jugador lo vuelve a encolar y paga
+    job_id, _, _, _ = queue.claim('w', ('analyze_decision',))
+    queue.fail(job_id, 'w', 'error')
+    assert app_module.queued_analysis(dilemma, 'Opción A', 'deontologia', game_id=3) is None
+    assert admitted == [1, 3]
+
+    # Terminado: se devuelve el resultado sin cobrar
+    job_id, _, _, _ = queue.claim('w', ('analyze_decision',))
+    queue.complete(job_id, 'w', 'Análisis de la cola')
+    assert app_module.queued_analysis(dilemma, 'Opción A', 'deontologia', game_id=4) == 'Análisis de la cola'
+    assert admitted == [1, 3]
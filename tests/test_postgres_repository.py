@@ -0,0 +1,95 @@
+"""
+Backend PostgreSQL: placeholders '%s', exportación con cursor de servidor y upserts
+ON CONFLICT. Las pruebas contra la base de datos necesitan DATABASE_URL (un esquema
+temporal que se borra al terminar); sin ella solo corre la de placeholders.
+"""
+import os
+import uuid
+
+import pytest
+
+from storage import PostgresRepository
+
+DATABASE_URL = os.getenv('DATABASE_URL', '')
+needs_postgres = pytest.mark.skipif(not DATABASE_URL.startswith(('postgres://', 'postgresql://')),
+                                    reason='DATABASE_URL de PostgreSQL no configurada')
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.queries = []
+
+    def execute(self, query, params=()):
+        self.queries.append((query, params))
+
+
+def test_execute_rewrites_placeholders():
+    repository = PostgresRepository.__new__(PostgresRepository)
+    cursor = RecordingCursor()
+    assert repository.execute(cursor, 'SELECT * FROM games WHERE id = ? AND player_name = ?', (1, 'ana')) is cursor
+    assert cursor.queries == [('SELECT * FROM games WHERE id = %s AND player_name = %s', (1, 'ana'))]
+
+
+@pytest.fixture
+def repository(app_module):
+    psycopg2 = pytest.importorskip('psycopg2')
+    from psycopg2.extensions import make_dsn
+    schema = f'test_{uuid.uuid4().hex[:12]}'
+    admin = psycopg2.connect(DATABASE_URL)
+    admin.autocommit = True
+    admin.cursor().execute(f'CREATE SCHEMA {schema}')
+    repository = PostgresRepository(make_dsn(DATABASE_URL, options=f'-c search_path={schema}'),
+                                    max_connections=4)
+    repository.init_schema(app_module.ACHIEVEMENTS)
+    try:
+        yield repository
+    finally:
+        repository.close()
+        admin.cursor().execute(f'DROP SCHEMA {schema} CASCADE')
+        admin.close()
+
+
+@needs_postgres
+def test_games_decisions_and_metrics(repository):
+    game_id = repository.create_game('ana')
+    assert repository.record_decision(game_id, 1, 'texto', 'medicina', 'A', 'deontologia', 'Análisis') == 'ana'
+    assert repository.record_decision(game_id, 2, 'texto', 'negocios', 'B', 'deontologia', '  ',
+                                      fetch_player=False) is None
+    assert repository.get_game_answered(game_id) == 2
+    metrics = repository.get_achievement_metrics('ana', game_id)
+    assert metrics['total'] == 2 and metrics['analyses'] == 1
+    assert metrics['frameworks'] == {'deontologia': 2}
+    assert metrics['categories'] == {'medicina', 'negocios'}
+    assert repository.list_players() == ['ana']
+
+
+@needs_postgres
+def test_on_conflict_upserts(app_module, repository):
+    # Sembrar el catálogo dos veces no duplica logros
+    repository.init_schema(app_module.ACHIEVEMENTS)
+    locked = [row[0] for row in repository.get_locked_achievements('ana')]
+    assert len(locked) == len(app_module.ACHIEVEMENTS)
+    assert repository.unlock_achievements('ana', locked[:2]) == locked[:2]
+    assert repository.unlock_achievements('ana', locked[:3]) == locked[2:3]
+
+    # Un dilema repetido no se duplica; solo se completa la imagen si faltaba
+    repository.cache_dilemma('Escenario', '[]', 'medicina', None)
+    repository.cache_dilemma('Escenario', '[]', 'medicina', 'https://example.com/a.jpg')
+    repository.cache_dilemma('Escenario', '[]', 'medicina', 'https://example.com/b.jpg')
+    cached = repository.get_cached_dilemmas_since(0)
+    assert len(cached) == 1
+    assert repository.get_cached_dilemma_image('Escenario') == 'https://example.com/a.jpg'
+
+
+@needs_postgres
+def test_export_uses_named_cursor_and_resumes(repository):
+    game_id = repository.create_game('bob')
+    for index in range(7):
+        repository.record_decision(game_id, index, f'dilema {index}', 'sociedad', 'A', 'autonomia', None,
+                                   fetch_player=False)
+    rows = list(repository.iter_decision_export(chunk_size=3))
+    assert [source for source, _ in rows] == [0] * 7
+    decision_ids = [int(row[0]) for _, row in rows]
+    assert decision_ids == sorted(decision_ids)
+    resumed = list(repository.iter_decision_export(since_ids={0: decision_ids[3]}, chunk_size=2))
+    assert [int(row[0]) for _, row in resumed] == decision_ids[4:]
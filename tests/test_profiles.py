@@ -0,0 +1,109 @@
+"""
+Perfiles éticos: jugadores parecidos (coseno + top-k), percentiles por marco y carga
+incremental desde las decisiones
+"""
+import math
+import random
+
+import pytest
+
+import profiles
+from profiles import FRAMEWORK_INDEX, FRAMEWORKS, ProfileEngine
+from storage import SQLiteRepository
+
+
+def engine_with(decisions):
+    """decisions: {jugador: {marco: número}}"""
+    engine = ProfileEngine()
+    names, columns, counts = [], [], []
+    for player_name, frameworks in decisions.items():
+        for framework, count in frameworks.items():
+            names.append(player_name)
+            columns.append(FRAMEWORK_INDEX[framework])
+            counts.append(count)
+    engine.add_counts(names, columns, counts)
+    return engine
+
+
+@pytest.fixture
+def engine():
+    return engine_with({
+        'ana': {'utilitarianismo': 3, 'deontologia': 1},
+        'bob': {'utilitarianismo': 1, 'deontologia': 3},
+        'carla': {'utilitarianismo': 4},
+        'dani': {'ecocentrismo': 2},
+    })
+
+
+def test_similar_orders_by_cosine(engine):
+    similar = engine.similar('ana', k=3)
+    assert [entry['player_name'] for entry in similar] == ['carla', 'bob', 'dani']
+    assert similar[0]['similarity'] == pytest.approx(3 / math.sqrt(10), abs=1e-4)
+    assert similar[1]['similarity'] == pytest.approx(0.6, abs=1e-4)
+    assert similar[2]['similarity'] == 0
+    assert [entry['player_name'] for entry in engine.similar('ana', k=10, min_decisions=3)] == ['carla', 'bob']
+    assert engine.similar('nadie') is None
+    assert engine_with({'solo': {'autonomia': 1}}).similar('solo') == []
+
+
+def test_profile_percentiles(engine):
+    profile = engine.profile('ana')
+    assert profile['decisions'] == 4
+    assert profile['profile']['utilitarianismo'] == 0.75
+    assert profile['profile']['deontologia'] == 0.25
+    # % de jugadores con proporción estrictamente menor en cada marco
+    assert profile['percentiles']['utilitarianismo'] == 50.0   # bob y dani
+    assert profile['percentiles']['deontologia'] == 50.0       # carla y dani
+    assert profile['percentiles']['ecocentrismo'] == 0.0
+    assert engine.profile('carla')['percentiles']['utilitarianismo'] == 75.0
+    assert engine.profile('nadie') is None
+
+
+def test_percentiles_follow_new_counts(engine):
+    assert engine.profile('dani')['percentiles']['ecocentrismo'] == 75.0
+    engine.add_counts(['ana'], [FRAMEWORK_INDEX['ecocentrismo']], [12])
+    assert engine.profile('dani')['percentiles']['ecocentrismo'] == 75.0
+    assert engine.profile('ana')['percentiles']['ecocentrismo'] == 50.0
+
+
+def test_similar_matches_brute_force_after_growth():
+    rng = random.Random(3)
+    decisions = {f'jugador{i}': {framework: rng.randint(0, 5) for framework in rng.sample(FRAMEWORKS, 3)}
+                 for i in range(profiles.INITIAL_CAPACITY + 300)}
+    engine = engine_with(decisions)
+    assert engine.size == len(decisions)
+
+    def vector(name):
+        return [decisions[name].get(framework, 0) for framework in FRAMEWORKS]
+
+    def cosine(a, b):
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(x * x for x in b))
+        return sum(x * y for x, y in zip(a, b)) / norm if norm else 0.0
+
+    for name in ('jugador0', 'jugador1100', 'jugador1323'):
+        expected = sorted((cosine(vector(name), vector(other)) for other in decisions if other != name),
+                          reverse=True)[:5]
+        assert [entry['similarity'] for entry in engine.similar(name, k=5)] == pytest.approx(expected, abs=1e-4)
+
+
+def test_refresh_is_incremental(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / 'game.db'), mode='sharded', shard_count=2)
+    repository.init_schema([])
+    games = {name: repository.create_game(name) for name in ('ana', 'bob', 'carla')}
+
+    def decide(name, framework, times=1):
+        for _ in range(times):
+            repository.record_decision(games[name], 1, 'texto', 'medicina', 'A', framework, None, fetch_player=False)
+
+    decide('ana', 'autonomia', 2)
+    decide('bob', 'paternalismo')
+    decide('carla', 'otro marco')
+    engine = ProfileEngine()
+    assert engine.refresh(repository) == 3
+    assert engine.refresh(repository) == 0
+    decide('ana', 'paternalismo')
+    assert engine.refresh(repository) == 1
+    profile = engine.profile('ana')
+    assert profile['decisions'] == 3
+    assert profile['profile']['paternalismo'] == pytest.approx(1 / 3, abs=1e-4)
+    assert engine.profile('carla') is None
@@ -0,0 +1,52 @@
+"""
+Perfilado de consultas: huellas normalizadas y agregado por endpoint
+"""
+import sqlite3
+
+import pytest
+
+import query_profiler
+from query_profiler import fingerprint
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ('SELECT * FROM games WHERE id = 42', 'SELECT * FROM games WHERE id = ?'),
+    ('SELECT * FROM t WHERE a = 5 AND b = -3.5', 'SELECT * FROM t WHERE a = ? AND b = ?'),
+    ("SELECT * FROM t WHERE name = 'O''Brien' AND city = 'Lima'", 'SELECT * FROM t WHERE name = ? AND city = ?'),
+    ('SELECT player_name FROM shard1.games g2 WHERE x2 = ?', 'SELECT player_name FROM shard1.games g2 WHERE x2 = ?'),
+    ('SELECT * FROM t WHERE id IN (1, 2,3)', 'SELECT * FROM t WHERE id IN (?, ...)'),
+    ('SELECT * FROM t WHERE id IN (?, ?, ?, ?)', 'SELECT * FROM t WHERE id IN (?, ...)'),
+    ('SELECT * FROM t WHERE id IN (?)', 'SELECT * FROM t WHERE id IN (?)'),
+    ("INSERT INTO t (id, name) VALUES (7, 'a')", 'INSERT INTO t (id, name) VALUES (?, ...)'),
+    ('UPDATE  games\n   SET total_score=10\n WHERE id = ?', 'UPDATE games SET total_score=? WHERE id = ?'),
+    ('SELECT a-1 FROM t LIMIT 10 OFFSET 20', 'SELECT a-? FROM t LIMIT ? OFFSET ?'),
+])
+def test_fingerprint(sql, expected):
+    assert fingerprint(sql) == expected
+
+
+def test_same_statement_different_values_share_fingerprint():
+    assert fingerprint("SELECT * FROM t WHERE a = 'x' AND b IN (1, 2)") == \
+        fingerprint("SELECT  *  FROM t WHERE a = 'yy' AND b IN (7, 8, 9)")
+
+
+def test_profiled_connection_groups_by_endpoint(monkeypatch):
+    profiler = query_profiler.QueryProfiler(slow_ms=10_000)
+    monkeypatch.setattr(query_profiler, 'profiler', profiler)
+    conn = sqlite3.connect(':memory:', factory=query_profiler.ProfiledConnection)
+    conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT)')
+    profiler.set_endpoint('make_decision')
+    for index in range(3):
+        conn.execute('INSERT INTO t (id, name) VALUES (?, ?)', (index, f'n{index}'))
+    conn.commit()
+    profiler.set_endpoint('get_stats')
+    assert conn.execute('SELECT name FROM t WHERE id = 1').fetchone() == ('n1',)
+    conn.execute('SELECT name FROM t WHERE id = 2').fetchall()
+
+    report = profiler.report()
+    inserts = {s['statement']: s['count'] for s in report['make_decision']}
+    assert inserts['INSERT INTO t (id, name) VALUES (?, ...)'] == 3
+    assert [(s['statement'], s['count']) for s in profiler.report('get_stats')['get_stats']] == [
+        ('SELECT name FROM t WHERE id = ?', 2)]
+    profiler.reset()
+    assert profiler.report() == {}
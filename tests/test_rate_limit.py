@@ -0,0 +1,55 @@
+"""
+Admisión de llamadas a la IA: si un scope posterior deniega, se devuelven las fichas
+ya tomadas en los anteriores
+"""
+import pytest
+
+import rate_limit
+
+# Sin relleno apreciable durante la prueba
+SLOW = 0.0001
+
+
+@pytest.fixture(params=rate_limit.LIMITER_MODES)
+def buckets(request, tmp_path):
+    return rate_limit.create_buckets(request.param, str(tmp_path / 'ratelimit.db'))
+
+
+def test_refund_when_a_later_scope_denies(buckets):
+    admission = rate_limit.AdmissionControl(buckets, {'player': (SLOW, 2), 'ip': (SLOW, 2), 'global': (SLOW, 1)})
+    assert admission.admit(player='ana', ip='10.0.0.1')
+    # El cubo global está vacío: las fichas de jugador e IP se devuelven
+    assert not admission.admit(player='ana', ip='10.0.0.1')
+    assert not admission.admit(player='ana', ip='10.0.0.1')
+
+    per_player = rate_limit.AdmissionControl(buckets, {'player': (SLOW, 2), 'ip': (SLOW, 2)})
+    assert per_player.admit(player='ana', ip='10.0.0.1')
+    assert not per_player.admit(player='ana', ip='10.0.0.1')
+
+    stats = admission.stats()
+    assert stats['mode'] == buckets.mode
+    assert stats['admitted'] == 1
+    assert stats['denied'] == {'player': 0, 'ip': 0, 'global': 2}
+
+
+def test_refund_never_exceeds_capacity(buckets):
+    assert buckets.acquire('player:bob', SLOW, 2)
+    buckets.refund('player:bob', 2)
+    buckets.refund('player:bob', 2)
+    assert buckets.acquire('player:bob', SLOW, 2)
+    assert buckets.acquire('player:bob', SLOW, 2)
+    assert not buckets.acquire('player:bob', SLOW, 2)
+
+
+def test_unlimited_scopes_and_missing_keys(buckets):
+    admission = rate_limit.AdmissionControl(buckets, {'player': (0, 5), 'ip': (SLOW, 1), 'global': (SLOW, 3)})
+    assert set(admission.limits) == {'ip', 'global'}
+    assert admission.admit(player='ana', ip=None)
+    assert admission.admit(player='ana', ip='10.0.0.2')
+    assert not admission.admit(player='ana', ip='10.0.0.2')
+    assert admission.stats()['denied']['ip'] == 1
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        rate_limit.create_buckets('redis')
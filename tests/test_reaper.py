@@ -0,0 +1,83 @@
+"""
+Cierre de partidas abandonadas: límite de inactividad, presupuesto de lotes por shard
+y liberación del estado en memoria de las partidas cerradas
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import maintenance
+from sessions import GameSessionStore
+from storage import SQLiteRepository
+
+
+def age_game(repository, game_id, minutes):
+    started = (datetime.now(timezone.utc) - timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M:%S')
+    with repository.gameplay(game_id=game_id) as conn:
+        conn.execute('UPDATE games SET start_time = ? WHERE id = ?', (started, game_id))
+
+
+def record(repository, game_id):
+    repository.record_decision(game_id, 1, 'Dilema', 'clásico', 'Opción', 'utilitarismo', 'Análisis')
+
+
+def is_open(repository, game_id):
+    with repository.gameplay(game_id=game_id) as conn:
+        return conn.execute('SELECT end_time FROM games WHERE id = ?', (game_id,)).fetchone()[0] is None
+
+
+@pytest.fixture
+def repository(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / 'game.db'))
+    repository.init_schema([])
+    return repository
+
+
+def test_idle_cutoff(repository):
+    idle = repository.create_game('ana')
+    age_game(repository, idle, 45)
+    recent = repository.create_game('bea')
+    age_game(repository, recent, 10)
+    # Empezada hace mucho pero con una decisión reciente: sigue activa
+    active = repository.create_game('carla')
+    age_game(repository, active, 45)
+    record(repository, active)
+
+    assert maintenance.reap_idle_games(repository, idle_minutes=30) == [idle]
+    assert not is_open(repository, idle)
+    assert is_open(repository, recent) and is_open(repository, active)
+    assert maintenance.reap_idle_games(repository, idle_minutes=30) == []
+    assert sorted(maintenance.reap_idle_games(repository, idle_minutes=5)) == [recent]
+
+
+def test_batch_budget_is_per_shard(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / 'game.db'), mode='sharded', shard_count=2)
+    repository.init_schema([])
+    by_shard = {0: [], 1: []}
+    player = 0
+    while len(by_shard[0]) < 6 or len(by_shard[1]) < 2:
+        name = f'jugador{player}'
+        player += 1
+        index = repository.shard_for_player(name)
+        if len(by_shard[index]) < (6 if index == 0 else 2):
+            game_id = repository.create_game(name)
+            age_game(repository, game_id, 60)
+            by_shard[index].append(game_id)
+
+    reaped = maintenance.reap_idle_games(repository, idle_minutes=30, batch_size=2, max_batches=2)
+    # El shard 0 agota sus dos lotes sin quitarle el turno al shard 1
+    assert len(set(reaped) & set(by_shard[0])) == 4
+    assert set(by_shard[1]) <= set(reaped)
+
+
+def test_reaped_games_release_session_state(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'game_sessions', GameSessionStore(app_module.repository))
+    game_id = client.post('/api/start_game', json={'player_name': 'abandona'}).json['game_id']
+    assert client.get(f'/api/get_stats/{game_id}').status_code == 200
+    assert app_module.game_sessions.stats()['sessions'] == 1
+    age_game(app_module.repository, game_id, 120)
+
+    game_ids = maintenance.reap_idle_games(app_module.repository, idle_minutes=30)
+    assert game_id in game_ids
+    app_module.release_games(game_ids)
+    assert app_module.game_sessions.stats()['sessions'] == 0
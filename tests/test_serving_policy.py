@@ -0,0 +1,99 @@
+"""
+Política adaptativa de dilemas: fracción en vivo según el presupuesto de error del SLO
+"""
+import random
+
+import pytest
+
+import serving_policy
+from serving_policy import CACHE, LIVE, ServingPolicy
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(serving_policy.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def make_policy(**kwargs):
+    options = dict(slo_ms=300, slo_percentile=95, window_seconds=60, min_probe=0.02, refresh_seconds=1.0,
+                   rng=random.Random(7))
+    options.update(kwargs)
+    return ServingPolicy(**options)
+
+
+def record(policy, fast, slow=0, failed=0):
+    for _ in range(fast):
+        policy.record_live(0.1, True)
+    for _ in range(slow):
+        policy.record_live(0.9, True)
+    for _ in range(failed):
+        policy.record_live(0.05, False)
+
+
+def live_fraction(policy, clock):
+    clock[0] += policy.refresh_seconds
+    policy.choose()
+    return policy.stats()['live_fraction']
+
+
+@pytest.mark.parametrize('fast, slow, failed, expected', [
+    (100, 0, 0, 1.0),
+    (95, 5, 0, 1.0),     # justo en el presupuesto del p95
+    (80, 20, 0, 0.25),   # 0.05 / 0.20
+    (80, 10, 10, 0.25),  # los errores cuentan como lentos
+    (50, 50, 0, 0.1),
+    (0, 0, 100, 0.05),
+])
+def test_live_fraction_under_budget(clock, fast, slow, failed, expected):
+    policy = make_policy()
+    record(policy, fast, slow, failed)
+    assert live_fraction(policy, clock) == pytest.approx(expected)
+
+
+def test_min_probe_floor(clock):
+    policy = make_policy(slo_percentile=99, min_probe=0.05)
+    record(policy, 0, failed=50)
+    # 0.01 / 1.0 queda por debajo del sondeo mínimo
+    assert live_fraction(policy, clock) == pytest.approx(0.05)
+
+
+def test_window_expiry_restores_live(clock):
+    policy = make_policy()
+    record(policy, 0, slow=10)
+    assert live_fraction(policy, clock) == pytest.approx(0.05)
+    clock[0] += 61
+    assert live_fraction(policy, clock) == 1.0
+
+
+def test_fraction_is_recomputed_every_refresh_seconds(clock):
+    policy = make_policy(refresh_seconds=5.0)
+    policy.choose()
+    record(policy, 0, slow=10)
+    clock[0] += 1
+    policy.choose()
+    assert policy.stats()['live_fraction'] == 1.0
+    clock[0] += 4
+    policy.choose()
+    assert policy.stats()['live_fraction'] == pytest.approx(0.05)
+
+
+def test_choices_follow_live_fraction(clock):
+    policy = make_policy()
+    record(policy, 80, slow=20)
+    clock[0] += 1
+    choices = [policy.choose() for _ in range(4000)]
+    assert choices.count(LIVE) / len(choices) == pytest.approx(0.25, abs=0.03)
+    assert policy.stats()['choices'] == {LIVE: choices.count(LIVE), CACHE: choices.count(CACHE)}
+
+
+def test_served_stats(clock):
+    policy = make_policy()
+    for seconds in (0.1, 0.2, 0.5):
+        policy.record_served(serving_policy.CACHE, seconds)
+    policy.record_served(serving_policy.PREDEFINED, 0.01, fallback=True)
+    stats = policy.stats()
+    assert stats['served_from'] == {LIVE: 0, CACHE: 3, serving_policy.PREDEFINED: 1}
+    assert (stats['requests'], stats['requests_over_slo'], stats['fallbacks']) == (4, 1, 1)
+    assert stats['budget_used'] == pytest.approx(1 / (0.05 * 4))
@@ -0,0 +1,58 @@
+"""
+Sesiones de partida en memoria: claves normalizadas y recarga cuando otro worker
+registró decisiones de la misma partida
+"""
+import pytest
+
+from sessions import GameSessionStore
+from storage import SQLiteRepository
+
+
+@pytest.fixture
+def repository(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / 'game.db'))
+    repository.init_schema([])
+    return repository
+
+
+def record(repository, game_id, framework='utilitarismo', category='clásico'):
+    repository.record_decision(game_id, 1, 'Dilema', category, 'Opción', framework, 'Análisis')
+
+
+def test_string_and_int_game_ids_share_the_session(repository):
+    store = GameSessionStore(repository)
+    game_id = repository.create_game('ana')
+    store.start(str(game_id), 'ana')
+    record(repository, game_id)
+    store.record(str(game_id), 'utilitarismo', 'clásico')
+
+    assert store.player_name(game_id) == 'ana'
+    assert store.game_stats(game_id)['dilemmas_answered'] == 1
+    assert store.stats()['sessions'] == 1
+    assert store.stats()['misses'] == 0
+
+    store.end(str(game_id))
+    assert store.stats()['sessions'] == 0
+    assert store.get('no es un id') is None
+
+
+def test_answered_mismatch_forces_reload(repository):
+    store = GameSessionStore(repository)
+    game_id = repository.create_game('ana')
+    store.start(game_id, 'ana')
+    record(repository, game_id)
+    store.record(game_id, 'utilitarismo', 'clásico')
+    assert store.game_stats(game_id)['framework_stats'] == {'utilitarismo': 1}
+    assert store.stats()['reloads'] == 0
+
+    # Otro worker registra una decisión que esta sesión no ha visto
+    record(repository, game_id, framework='deontologia', category='tecnología')
+    stats = store.game_stats(game_id)
+    assert store.stats()['reloads'] == 1
+    assert stats['dilemmas_answered'] == 2
+    assert stats['framework_stats'] == {'utilitarismo': 1, 'deontologia': 1}
+    assert stats['category_stats'] == {'clásico': 1, 'tecnología': 1}
+
+    # Ya recargada: la siguiente lectura sale de memoria
+    assert store.game_stats(game_id) == stats
+    assert store.stats()['reloads'] == 1
@@ -0,0 +1,64 @@
+"""
+Almacenamiento sharded: ids intercalados entre shards, enrutado por partida y
+consultas sobre todos los shards con ATTACH
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import MAX_SHARDS, SQLiteRepository
+
+
+def test_game_ids_interleave_across_shards(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / 'game.db'), mode='sharded', shard_count=3)
+    repository.init_schema([])
+    players = [f'jugador{i}' for i in range(12)]
+    ids_by_shard = {}
+    for player in players * 2:
+        game_id = repository.create_game(player)
+        index = repository.shard_for_player(player)
+        # Cada shard asigna shard + 1 + k * shard_count
+        assert (game_id - 1) % 3 == index
+        assert repository.shard_for_game(game_id) == index
+        ids_by_shard.setdefault(index, []).append(game_id)
+
+    for index, ids in ids_by_shard.items():
+        assert ids == [index + 1 + k * 3 for k in range(len(ids))]
+    all_ids = [game_id for ids in ids_by_shard.values() for game_id in ids]
+    assert len(all_ids) == len(set(all_ids)) == 24
+
+
+def test_game_is_stored_in_its_shard(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / 'game.db'), mode='sharded', shard_count=4)
+    repository.init_schema([])
+    game_id = repository.create_game('ana')
+    with repository.gameplay(game_id=game_id) as conn:
+        row = conn.execute('SELECT player_name FROM games WHERE id = ?', (game_id,)).fetchone()
+    assert row == ('ana',)
+
+
+@pytest.mark.parametrize('shard_count', [0, -1, MAX_SHARDS + 1])
+def test_shard_count_out_of_range(tmp_path, shard_count):
+    with pytest.raises(ValueError):
+        SQLiteRepository(str(tmp_path / 'game.db'), mode='sharded', shard_count=shard_count)
+
+
+@pytest.mark.parametrize('shard_count', [1, MAX_SHARDS])
+def test_shard_count_limits_are_valid(tmp_path, shard_count):
+    repository = SQLiteRepository(str(tmp_path / 'game.db'), mode='sharded', shard_count=shard_count)
+    assert len(repository.shard_paths) == shard_count
+
+
+def test_list_players_spans_all_shards(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / 'game.db'), mode='sharded', shard_count=4)
+    repository.init_schema([])
+    players = {f'jugador{i}' for i in range(20)}
+    for player in players:
+        repository.create_game(player)
+    repository.create_game('jugador0')
+    assert {repository.shard_for_player(player) for player in players} == {0, 1, 2, 3}
+    listed = repository.list_players()
+    assert sorted(listed) == sorted(players)
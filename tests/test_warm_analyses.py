@@ -0,0 +1,67 @@
+"""
+Calentamiento de análisis: solo se generan las variantes que faltan, un prompt nuevo
+no regenera los demás y --prune borra las claves obsoletas
+"""
+import random
+
+import pytest
+
+import warm_analyses
+from storage import SQLiteRepository
+from warm_analyses import WarmAnalyses, analysis_key, prune, warm
+
+
+@pytest.fixture
+def repository(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / 'game.db'))
+    repository.init_schema([])
+    warm_analyses.init_tables(repository)
+    return repository
+
+
+class Generator:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.calls = []
+
+    def __call__(self, prompt):
+        self.calls.append(prompt)
+        if prompt in self.fail:
+            return None
+        return f'Análisis {len(self.calls)} de {prompt}'
+
+
+def test_second_warm_skips_existing_variants(repository):
+    prompts = ['prompt a', 'prompt b', 'prompt a']
+    first = Generator()
+    assert warm(repository, prompts, first, variants=3, concurrency=2) == {
+        'prompts': 2, 'generated': 6, 'failed': 0, 'skipped': 0}
+    assert sorted(set(first.calls)) == ['prompt a', 'prompt b']
+
+    second = Generator()
+    assert warm(repository, prompts, second, variants=3) == {
+        'prompts': 2, 'generated': 0, 'failed': 0, 'skipped': 6}
+    assert second.calls == []
+
+
+def test_only_missing_variants_and_new_prompts_are_generated(repository):
+    warm(repository, ['prompt a', 'prompt b'], Generator(fail={'prompt b'}), variants=2)
+
+    # Más variantes y un prompt cambiado: solo lo que falta
+    generator = Generator()
+    report = warm(repository, ['prompt a', 'prompt b', 'prompt c'], generator, variants=3)
+    assert report == {'prompts': 3, 'generated': 7, 'failed': 0, 'skipped': 2}
+    assert generator.calls.count('prompt a') == 1
+    assert generator.calls.count('prompt b') == 3
+    assert generator.calls.count('prompt c') == 3
+
+
+def test_prune_and_lookup(repository):
+    warm(repository, ['prompt a', 'prompt b'], Generator(), variants=2)
+    assert prune(repository, ['prompt a']) == 2
+    assert set(warm_analyses.existing_variants(repository)) == {analysis_key('prompt a')}
+
+    cache = WarmAnalyses(repository, rng=random.Random(0))
+    assert cache.lookup('prompt a').endswith('de prompt a')
+    assert cache.lookup('prompt b') is None
+    assert cache.stats() == {'keys': 1, 'variants': 2, 'hits': 1, 'misses': 1}
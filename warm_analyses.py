@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Análisis precalculados de los dilemas predefinidos
+Los dilemas predefinidos son el contenido más servido cuando Gemini está desactivado o
+lento, y aun así su análisis se generaba en vivo en cada respuesta. Este trabajo genera
+K variantes del análisis de cada (dilema, opción, marco ético) en paralelo, con
+concurrencia acotada, y las guarda en la tabla warm_analyses. make_decision consulta
+primero esa tabla (cargada en memoria) y solo llama a Gemini si no hay variante.
+
+La clave de cada análisis es el hash del prompt completo: si cambia el texto de un
+dilema, una opción o la plantilla del prompt, la clave cambia y el siguiente
+calentamiento solo genera lo que falta (incremental). --prune borra las claves que ya
+no corresponden a ningún dilema.
+
+Uso:
+    python warm_analyses.py                     # 3 variantes por opción, 4 llamadas a la vez
+    python warm_analyses.py --variants 5 --concurrency 8 --prune
+"""
+import argparse
+import contextlib
+import hashlib
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+WARM_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS warm_analyses (
+        key TEXT NOT NULL,
+        variant INTEGER NOT NULL,
+        analysis TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (key, variant)
+    )
+    ''',
+]
+
+
+def init_tables(repository):
+    """Crea warm_analyses junto a los logs"""
+    with repository.logs() as conn:
+        cursor = conn.cursor()
+        for statement in WARM_TABLES:
+            repository.execute(cursor, statement)
+
+
+def analysis_key(prompt):
+    """Clave estable de un análisis: hash del prompt completo"""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:32]
+
+
+class WarmAnalyses:
+    """Variantes precalculadas en memoria, recargadas como mucho cada `refresh_seconds`"""
+
+    def __init__(self, repository, refresh_seconds=60, rng=None):
+        self.repository = repository
+        self.refresh_seconds = refresh_seconds
+        self.rng = rng or random
+        self._lock = threading.Lock()
+        self._variants = {}
+        self._loaded_at = None
+        self.hits = 0
+        self.misses = 0
+
+    def reload(self):
+        variants = {}
+        with self.repository.logs() as conn:
+            for key, analysis in self.repository.execute(conn.cursor(), '''
+                SELECT key, analysis FROM warm_analyses ORDER BY key, variant
+            ''').fetchall():
+                variants.setdefault(key, []).append(analysis)
+        with self._lock:
+            self._variants = variants
+            self._loaded_at = time.monotonic()
+        return sum(len(analyses) for analyses in variants.values())
+
+    def lookup(self, prompt):
+        """Una variante al azar del análisis de este prompt o None"""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_seconds:
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"⚠️ Error cargando los análisis precalculados: {e}")
+                self._loaded_at = time.monotonic()
+        with self._lock:
+            analyses = self._variants.get(analysis_key(prompt))
+            if analyses:
+                self.hits += 1
+                return self.rng.choice(analyses)
+            self.misses += 1
+            return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'keys': len(self._variants),
+                'variants': sum(len(analyses) for analyses in self._variants.values()),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+def existing_variants(repository):
+    """{clave: {variantes ya guardadas}}"""
+    with repository.logs() as conn:
+        rows = repository.execute(conn.cursor(), 'SELECT key, variant FROM warm_analyses').fetchall()
+    existing = {}
+    for key, variant in rows:
+        existing.setdefault(key, set()).add(variant)
+    return existing
+
+
+def warm(repository, prompts, generate, variants=3, concurrency=4):
+    """Genera las variantes que faltan de cada prompt con como mucho `concurrency` llamadas a la vez.
+
+    generate(prompt) devuelve el texto del análisis o None. Devuelve un informe.
+    """
+    existing = existing_variants(repository)
+    pending = [(analysis_key(prompt), variant, prompt)
+               for prompt in dict.fromkeys(prompts)
+               for variant in range(variants)
+               if variant not in existing.get(analysis_key(prompt), set())]
+    report = {'prompts': len(set(prompts)), 'generated': 0, 'failed': 0,
+              'skipped': len(set(prompts)) * variants - len(pending)}
+
+    def store(key, variant, analysis):
+        with repository.logs() as conn:
+            repository.execute(conn.cursor(), '''
+                INSERT INTO warm_analyses (key, variant, analysis) VALUES (?, ?, ?)
+                ON CONFLICT (key, variant) DO NOTHING
+            ''', (key, variant, analysis))
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(generate, prompt): (key, variant) for key, variant, prompt in pending}
+        for future in as_completed(futures):
+            key, variant = futures[future]
+            try:
+                analysis = future.result()
+            except Exception as e:
+                print(f"⚠️ Error generando el análisis {key}#{variant}: {e}")
+                analysis = None
+            if analysis:
+                store(key, variant, analysis)
+                report['generated'] += 1
+            else:
+                report['failed'] += 1
+    return report
+
+
+def prune(repository, prompts):
+    """Borra los análisis cuyos prompts ya no existen. Devuelve cuántas filas."""
+    keep = {analysis_key(prompt) for prompt in prompts}
+    stale = [key for key in existing_variants(repository) if key not in keep]
+    deleted = 0
+    with repository.logs() as conn:
+        cursor = conn.cursor()
+        for key in stale:
+            deleted += repository.execute(cursor, 'DELETE FROM warm_analyses WHERE key = ?', (key,)).rowcount
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precalcula análisis de las opciones de los dilemas predefinidos')
+    parser.add_argument('--variants', type=int, default=3, help='Variantes por dilema y opción')
+    parser.add_argument('--concurrency', type=int, default=4, help='Llamadas a Gemini simultáneas')
+    parser.add_argument('--prune', action='store_true', help='Borrar análisis de dilemas que ya no existen')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):
+        import app
+    if not app.GOOGLE_API_KEY:
+        print("[ERROR] GOOGLE_API_KEY no configurada: no se pueden generar análisis")
+        sys.exit(1)
+
+    prompts = app.predefined_analysis_prompts()
+    model = app.get_genai().GenerativeModel('gemini-2.5-flash')
+
+    def generate(prompt):
+        response = app.generate_content(model, prompt)
+        return response.text.strip() if response and response.text else None
+
+    start = time.perf_counter()
+    report = warm(app.repository, prompts, generate, args.variants, args.concurrency)
+    print(f"[OK] {report['generated']} análisis generados, {report['skipped']} ya existían, "
+          f"{report['failed']} fallidos ({report['prompts']} opciones, {time.perf_counter() - start:.1f} s)")
+    if args.prune:
+        print(f"[OK] {prune(app.repository, prompts)} análisis obsoletos borrados")
+    if report['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Workers de la cola de trabajos de IA (jobs.py)
+Con AI_JOB_QUEUE=sqlite los procesos web solo encolan trabajos y leen sus resultados;
+estos procesos los ejecutan fuera del ciclo de las peticiones:
+
+- generate_dilemma: genera un dilema con Gemini y lo guarda en ai_dilemmas_cache
+- analyze_decision: analiza una decisión (make_decision espera el resultado)
+- cache_maintenance: retención, compactación y vacuum de logs y cache (maintenance.py)
+- retroactive_achievements: recalcula los logros de todos los jugadores
+
+El rendimiento de la IA escala con --processes, independiente de los workers HTTP. Un
+proceso que muere a mitad de un trabajo no lo pierde: su concesión caduca y otro lo
+reintenta. --schedule-* encola los trabajos periódicos una sola vez por intervalo
+aunque haya varias máquinas con workers.
+
+Uso:
+    python worker.py                                    # 1 proceso, todos los tipos de trabajo
+    python worker.py --processes 4 --schedule-maintenance 3600 --schedule-achievements 86400
+    python worker.py --kinds analyze_decision --processes 8
+    python worker.py --enqueue cache_maintenance        # encolar un trabajo (cron) y salir
+    python worker.py --stats
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+
+KINDS = ('generate_dilemma', 'analyze_decision', 'cache_maintenance', 'retroactive_achievements')
+RETENTION_HOURS = 24
+
+# Los workers no sirven peticiones: sin los hilos de fondo de la web ni el estado del bandit
+WORKER_ENVIRONMENT = {
+    'ANALYTICS_REFRESH_SECONDS': '0',
+    'MAINTENANCE_INTERVAL_SECONDS': '0',
+    'GAME_REAPER_INTERVAL_SECONDS': '0',
+    'DILEMMA_SCHEDULER': 'policy',
+}
+
+
+def load_app():
+    os.environ.update(WORKER_ENVIRONMENT)
+    with contextlib.redirect_stdout(sys.stderr):
+        import app
+    # Los límites por jugador, IP y global ya se cobraron al encolar; aquí la
+    # concurrencia la fija el número de procesos
+    app.ai_admission = None
+    return app
+
+
+def build_handlers(app):
+    """{tipo: función(payload) -> resultado}. Una excepción hace que el trabajo se reintente;
+    una respuesta de Gemini inválida no (ya se contó en las métricas de generación)."""
+    import maintenance
+
+    def generate_dilemma(payload):
+        dilemma = app.generate_dilemma_with_gemini()
+        if dilemma is None:
+            return None
+        return {'category': dilemma['category'], 'scenario': dilemma['scenario']}
+
+    def analyze_decision(payload):
+        analysis = app.analyze_decision_with_ai(payload['dilemma'], payload['chosen_option'],
+                                                payload['ethical_framework'])
+        if not analysis:
+            raise RuntimeError('Gemini no devolvió el análisis')
+        return analysis
+
+    def cache_maintenance(payload):
+        return maintenance.run_maintenance(app.repository)
+
+    def retroactive_achievements(payload):
+        return {'unlocked': app.calculate_retroactive_achievements()}
+
+    return {
+        'generate_dilemma': generate_dilemma,
+        'analyze_decision': analyze_decision,
+        'cache_maintenance': cache_maintenance,
+        'retroactive_achievements': retroactive_achievements,
+    }
+
+
+def schedule(queue, kind, interval, now=None):
+    """Encola `kind` una vez por intervalo: la clave de deduplicación es el intervalo"""
+    return queue.enqueue(kind, dedupe_key=f'{kind}:{int((now or time.time()) // interval)}')
+
+
+def start_scheduler(queue, periodic, retention_hours=RETENTION_HOURS):
+    """Encola los trabajos periódicos y purga los terminados en un hilo daemon"""
+    tick = min([interval for _, interval in periodic] + [60])
+
+    def _loop():
+        while True:
+            try:
+                for kind, interval in periodic:
+                    schedule(queue, kind, interval)
+                queue.purge(retention_hours * 3600)
+            except Exception as e:
+                print(f"⚠️ Error programando trabajos periódicos: {e}")
+            time.sleep(tick)
+
+    thread = threading.Thread(target=_loop, name='job-scheduler', daemon=True)
+    thread.start()
+    return thread
+
+
+def _stop_on_signals(stop):
+    # Al recibir la señal se termina el trabajo en curso y se sale
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+
+def run_worker(kinds, poll_interval, stop):
+    """Cuerpo de cada proceso worker"""
+    _stop_on_signals(stop)
+    app = load_app()
+    import jobs
+    handlers = build_handlers(app)
+    worker = jobs.Worker(app.open_job_queue(), {kind: handlers[kind] for kind in kinds},
+                         poll_interval=poll_interval)
+    worker.run(stop)
+    print(f"[OK] Worker {worker.owner}: {worker.processed['done']} trabajos completados, "
+          f"{worker.processed['failed']} fallidos")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Procesos worker de la cola de trabajos de IA')
+    parser.add_argument('--processes', type=int, default=1, help='Procesos worker')
+    parser.add_argument('--kinds', default=','.join(KINDS),
+                        help=f'Tipos de trabajo que se consumen, separados por comas ({", ".join(KINDS)})')
+    parser.add_argument('--poll-interval', type=float, default=0.5, help='Segundos entre consultas con la cola vacía')
+    parser.add_argument('--schedule-maintenance', type=int, metavar='SEGUNDOS',
+                        help='Encolar cache_maintenance cada SEGUNDOS')
+    parser.add_argument('--schedule-achievements', type=int, metavar='SEGUNDOS',
+                        help='Encolar retroactive_achievements cada SEGUNDOS')
+    parser.add_argument('--retention-hours', type=float, default=RETENTION_HOURS,
+                        help='Horas que se conservan los trabajos terminados')
+    parser.add_argument('--enqueue', choices=KINDS, help='Encolar un trabajo y salir')
+    parser.add_argument('--stats', action='store_true', help='Mostrar los trabajos por tipo y estado y salir')
+    args = parser.parse_args()
+
+    kinds = [kind.strip() for kind in args.kinds.split(',') if kind.strip()]
+    unknown = sorted(set(kinds) - set(KINDS))
+    if unknown or not kinds:
+        print(f"[ERROR] Tipos de trabajo desconocidos: {', '.join(unknown) or '(ninguno)'}")
+        sys.exit(1)
+
+    app = load_app()
+    queue = app.open_job_queue()
+    if args.stats:
+        print(json.dumps(queue.stats(), ensure_ascii=False, indent=2))
+        return
+    if args.enqueue:
+        print(f"[OK] Trabajo {queue.enqueue(args.enqueue)} encolado ({args.enqueue}) en {queue.path}")
+        return
+    if app.AI_JOB_QUEUE != 'sqlite':
+        print("[WARN] AI_JOB_QUEUE no es 'sqlite': la web seguirá llamando a Gemini en vivo")
+    if not app.GOOGLE_API_KEY and {'generate_dilemma', 'analyze_decision'} & set(kinds):
+        print("[WARN] GOOGLE_API_KEY no configurada: los trabajos de IA fallarán")
+
+    periodic = [(kind, interval) for kind, interval in (
+        ('cache_maintenance', args.schedule_maintenance),
+        ('retroactive_achievements', args.schedule_achievements)
+    ) if interval]
+    start_scheduler(queue, periodic, args.retention_hours)
+
+    print(f"[OK] {args.processes} proceso(s) consumiendo {', '.join(kinds)} de {queue.path}")
+    if args.processes <= 1:
+        run_worker(kinds, args.poll_interval, threading.Event())
+        return
+
+    stop = multiprocessing.Event()
+    processes = [multiprocessing.Process(target=run_worker, args=(kinds, args.poll_interval, stop),
+                                         name=f'job-worker-{index}')
+                 for index in range(args.processes)]
+    for process in processes:
+        process.start()
+    _stop_on_signals(stop)
+    while any(process.is_alive() for process in processes):
+        for process in processes:
+            process.join(timeout=0.5)
+
+
+if __name__ == '__main__':
+    main()